@@ -1,62 +1,92 @@
-import os
+"""Application factory.
+
+``create_app(config)`` builds a configured app; nothing here runs at import
+time, so importing it neither configures logging nor touches the database.
+Create the tables with ``flask --app main schema create`` (or ``schema
+upgrade`` on an existing database).
+"""
 import logging
+import os
+
 from flask import Flask
-from extensions import db   #added
-'''from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase'''
+from sqlalchemy import event
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+import expiry
+import feeds
+import fulltext  # noqa: F401 - creates the donor text search index along with the tables
+import geo
+import imports
+import instrumentation
+import inventory
+import migrations
+import notifications
+import push
+import stats
+from extensions import db, moment
+from utils import calculate_age, can_donate, days_since_last_donation, days_until_eligible, format_urgency_level
+from views import register_blueprints
+
+DEFAULT_LOG_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+
+def configure_sqlite(dbapi_connection, connection_record):
+    """Let SQLite readers and writers run concurrently (stock reservations, push polling)"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def configure_logging(app):
+    """Log at ``LOG_LEVEL`` (default INFO) in ``LOG_FORMAT``; DEBUG is verbose, for development.
+
+    A root handler set up by the server (or a test runner) is kept; only the
+    level is applied to it.
+    """
+    level = app.config.setdefault('LOG_LEVEL', os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    log_format = app.config.setdefault('LOG_FORMAT', os.environ.get('LOG_FORMAT', DEFAULT_LOG_FORMAT))
+    logging.basicConfig(format=log_format)
+    logging.getLogger().setLevel(level)
+
+
+def create_app(config=None):
+    """Build the app; ``config`` (a mapping) overrides settings read from the environment"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///blood_donation.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if config:
+        app.config.from_mapping(config)
+
+    configure_logging(app)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    db.init_app(app)
+    moment.init_app(app)
+    with app.app_context():
+        # Creating an engine does not connect, so this still leaves the database alone
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', configure_sqlite)
+
+    # Per-request SQL timing, Server-Timing headers and N+1 warnings; first, so every later hook is timed
+    instrumentation.init_app(app)
+
+    app.jinja_env.globals.update(can_donate=can_donate, days_until_eligible=days_until_eligible,
+                                 days_since_last_donation=days_since_last_donation,
+                                 calculate_age=calculate_age, format_urgency_level=format_urgency_level)
+
+    # Notification fan-out, schema CLI, cached statistics and dashboard feeds, request
+    # expiry, blood stock, server push, PIN code centroids and bulk donor import
+    for module in (notifications, migrations, stats, feeds, expiry, inventory, push, geo, imports):
+        module.init_app(app)
+
+    register_blueprints(app)
+    return app
 
 
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
-'''class Base(DeclarativeBase):
-    pass
-
-#db = SQLAlchemy(model_class=Base)'''
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///blood_donation.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-from flask_moment import Moment
-
-moment = Moment(app)
-
-
-# Initialize the app with the extension
-db.init_app(app)
-
-from utils import can_donate  # Import it first
-
-app.jinja_env.globals['can_donate'] = can_donate  # Register it globally
-
-from utils import calculate_age  # ✅ Import the function
-
-app.jinja_env.globals['calculate_age'] = calculate_age  # ✅ Register as template global
-
-from utils import format_urgency_level  # Import the function
-
-app.jinja_env.globals['format_urgency_level'] = format_urgency_level  # Register as template global
-
-
-with app.app_context():
-    # Import models to create tables
-    import models
-    db.create_all()
-
-# Import routes
-from routes import *
-
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
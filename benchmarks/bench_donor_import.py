@@ -0,0 +1,108 @@
+"""Benchmark the bulk donor import.
+
+Writes a CSV of N donors to a temp file, with some invalid rows, rows repeated
+within the file, and rows clashing with existing accounts. Imports it into a
+scratch SQLite database (or DATABASE_URL if set), then reports throughput and
+checks that exactly the expected rows were rejected.
+
+Password hashing dominates with the default hasher (scrypt, about 0.1 s per
+row per core), so the wall time is roughly N * 0.1 s / --workers. Pass
+--password-method to measure everything else on its own.
+
+    python benchmarks/bench_donor_import.py
+    python benchmarks/bench_donor_import.py --rows 20000 --password-method pbkdf2:sha256:1
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'import.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from imports import COLUMNS, import_donors  # noqa: E402
+from models import DonorProfile, User  # noqa: E402
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+EXISTING = 100
+
+
+def write_csv(path, rows):
+    """Returns how many rows should be rejected"""
+    rejected = 0
+    with open(path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        for i in range(rows):
+            row = [f'donor{i}', f'donor{i}@example.com', 'secret1', f'Donor {i}', BLOOD_TYPES[i % 8],
+                   '9999999999', f'{i} Main Road', 'Chennai', 'Tamil Nadu', '600001', '1990-01-01', '']
+            if i % 1000 == 1:
+                row[1] = 'not-an-email'
+                rejected += 1
+            elif i % 1000 == 2:
+                row[4] = 'Z+'
+                rejected += 1
+            elif i % 1000 == 3:
+                row[0], row[1] = 'donor0', 'other0@example.com'
+                rejected += 1
+            elif 4 <= i < EXISTING:
+                rejected += 1
+            writer.writerow(row)
+    return rejected
+
+
+def seed_existing():
+    """Accounts that clash with the first rows of the file"""
+    db.session.execute(insert(User), [
+        {'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x', 'role': 'donor',
+         'created_at': datetime.utcnow(), 'is_active': True, 'unread_notifications': 0}
+        for i in range(4, EXISTING)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help='hashing processes (default: one per CPU)')
+    parser.add_argument('--password-method', default=None,
+                        help='werkzeug hash method, e.g. pbkdf2:sha256:1 (default: same as registration)')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    path = os.path.join(tempfile.mkdtemp(), 'donors.csv')
+    expected_rejected = write_csv(path, args.rows)
+
+    with app.app_context():
+        db.create_all()
+        seed_existing()
+        started = time.perf_counter()
+        with open(path, newline='') as lines:
+            report = import_donors(lines, batch_size=args.batch_size, workers=args.workers,
+                                   password_method=args.password_method)
+        elapsed = time.perf_counter() - started
+        profiles = db.session.scalar(db.select(func.count(DonorProfile.id)))
+
+    print(f'imported {report.imported:,} of {args.rows:,} rows in {elapsed:.1f} s '
+          f'= {args.rows / elapsed:,.0f} rows/s ({args.password_method or "default"} hashing, '
+          f'{args.workers or os.cpu_count()} worker(s))')
+    print(f'rejected {len(report.errors):,} (expected {expected_rejected:,}); {profiles:,} profiles in the database')
+    for line, username, message in sorted(report.errors)[:4]:
+        print(f'  line {line} ({username}): {message}')
+    ok = len(report.errors) == expected_rejected and report.imported == profiles == args.rows - expected_rejected
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
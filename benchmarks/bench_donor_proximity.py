@@ -0,0 +1,148 @@
+"""Benchmark donor search and request matching near a PIN code.
+
+Seeds a scratch SQLite database (or DATABASE_URL if set) with synthetic PIN
+code centroids spread over India, denser around a set of cities as the real
+ones are. It then adds N donors spread over those PIN codes and times:
+
+* the first page (and the next) of a proximity search for O- donors within
+  several radii of a city-centre PIN, all blood types near a rural PIN, and a
+  search whose filters match almost nobody, so every PIN in range is walked
+* ranking candidates for a request with and without a radius limit
+
+    python benchmarks/bench_donor_proximity.py
+    python benchmarks/bench_donor_proximity.py --donors 1000000 --pins 19000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'proximity.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from geo import get_pin_directory  # noqa: E402
+from matching import DonorSnapshot  # noqa: E402
+from models import DonorProfile, PinCode, User  # noqa: E402
+from search import donor_search_query, proximity_page  # noqa: E402
+
+CITIES = [(13.08, 80.27), (19.08, 72.88), (28.61, 77.21), (12.97, 77.59), (22.57, 88.36), (17.39, 78.49),
+          (18.52, 73.86), (23.02, 72.57), (26.91, 75.79), (26.85, 80.95), (11.02, 76.96), (9.93, 76.27)]
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+
+def seed_pins(count, rng):
+    """Returns ``(city_centre_pin, rural_pin)``"""
+    pins = rng.sample(range(110001, 855999), count)
+    rows = []
+    for i, pin in enumerate(pins):
+        if i % 5 < 3:
+            # Three in five PIN codes within ~40 km of a city
+            lat, lon = CITIES[i % len(CITIES)]
+            lat, lon = lat + rng.gauss(0, 0.15), lon + rng.gauss(0, 0.15)
+        else:
+            lat, lon = rng.uniform(8.5, 31.0), rng.uniform(70.0, 88.0)
+        rows.append({'pin': f'{pin:06d}', 'latitude': lat, 'longitude': lon})
+    rows[0].update(latitude=CITIES[0][0], longitude=CITIES[0][1])
+    db.session.execute(insert(PinCode), rows)
+    db.session.commit()
+    return rows[0]['pin'], rows[3]['pin'], [row['pin'] for row in rows]
+
+
+def seed_donors(donors, pins, rng, batch=20000):
+    now = datetime.utcnow()
+    for start in range(1, donors + 1, batch):
+        ids = range(start, min(start + batch, donors + 1))
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x',
+             'role': 'donor', 'created_at': now, 'is_active': True, 'unread_notifications': 0}
+            for i in ids
+        ])
+        db.session.execute(insert(DonorProfile), [
+            {'id': i, 'user_id': i, 'full_name': f'Donor {i}', 'blood_type': rng.choice(BLOOD_TYPES),
+             'phone': '9999999999', 'address': f'{i} Main Road', 'city': 'Somewhere', 'state': 'Tamil Nadu',
+             'zip_code': rng.choice(pins), 'date_of_birth': date(1990, 1, 1), 'is_available': True,
+             'updated_at': now}
+            for i in ids
+        ])
+        db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=1_000_000)
+    parser.add_argument('--pins', type=int, default=19_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=100.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    rng = random.Random(11)
+
+    with app.app_context():
+        print(f'database: {db.engine.dialect.name}')
+        db.create_all()
+        started = time.perf_counter()
+        city_pin, rural_pin, pins = seed_pins(args.pins, rng)
+        seed_donors(args.donors, pins, rng)
+        print(f'seeded {args.pins:,} PIN codes and {args.donors:,} donors in {time.perf_counter() - started:.1f} s')
+        get_pin_directory()
+
+        def page(pin, radius_km, pages=1, **filters):
+            cursor, donors = None, []
+            for _ in range(pages):
+                rows, cursor = proximity_page(donor_search_query(**filters), pin, radius_km, cursor=cursor)
+                donors += rows
+            return donors
+
+        cases = [
+            ('O- within 5 km of a city', lambda: page(city_pin, 5, blood_type='O-')),
+            ('O- within 25 km of a city', lambda: page(city_pin, 25, blood_type='O-')),
+            ('O- within 25 km, pages 1-2', lambda: page(city_pin, 25, pages=2, blood_type='O-')),
+            ('O- within 100 km of a city', lambda: page(city_pin, 100, blood_type='O-')),
+            ('any type within 25 km, rural', lambda: page(rural_pin, 25)),
+            ('no match within 25 km (walks all)', lambda: page(city_pin, 25, blood_type='O-', text='nobody')),
+            ('no match within 100 km (walks all)', lambda: page(city_pin, 100, blood_type='O-', text='nobody')),
+        ]
+        slow = 0
+        print(f'{"proximity search":<36} {"median":>9}')
+        for label, fn in cases:
+            elapsed, rows = timed(fn, args.repeats)
+            slow += elapsed > args.target_ms
+            farthest = max((donor.distance_km for donor in rows), default=0)
+            print(f'{label:<36} {elapsed:>7.2f}ms  ({len(rows)} rows, farthest {farthest:.1f} km)')
+
+        started = time.perf_counter()
+        snapshot = DonorSnapshot.load(get_pin_directory())
+        print(f'matching snapshot loaded in {time.perf_counter() - started:.1f} s')
+        for label, radius_km in [('rank, distance scored', None), ('rank within 25 km', 25)]:
+            elapsed, ranked = timed(lambda: snapshot.rank('O-', 'critical', 'Chennai', 'Tamil Nadu', city_pin,
+                                                          radius_km=radius_km), args.repeats)
+            slow += elapsed > args.target_ms
+            print(f'{label:<36} {elapsed:>7.2f}ms  (best at {ranked[0][3] if ranked else "-"} km)')
+
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == '__main__':
+    main()
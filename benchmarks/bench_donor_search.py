@@ -0,0 +1,140 @@
+"""Benchmark indexed donor text search against the old ILIKE filters.
+
+Seeds N donors across a set of cities into a scratch SQLite database (or
+DATABASE_URL if set). The text search index is kept up to date by the same
+triggers or generated column as in production. Then it times the first
+result page of several searches both ways:
+
+* ilike: ``ILIKE '%x%'`` on city, state, name or PIN code, as search filtered
+  before; a leading wildcard scans every profile
+* indexed: the normalised ``city_key`` lookup and the full-text search, ranked
+  for several words and in name order for one, as the search page does
+
+Every 100th donor lives at PIN code 560123, so the PIN code search has a
+page of results to fetch.
+
+    python benchmarks/bench_donor_search.py
+    python benchmarks/bench_donor_search.py --donors 1000000 --repeats 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import DonorProfile, User  # noqa: E402
+from search import RELEVANCE, donor_search_query, keyset_page  # noqa: E402
+
+CITIES = [('Chennai', 'Tamil Nadu', '600'), ('Coimbatore', 'Tamil Nadu', '641'), ('Madurai', 'Tamil Nadu', '625'),
+          ('Mumbai', 'Maharashtra', '400'), ('Pune', 'Maharashtra', '411'), ('Nagpur', 'Maharashtra', '440'),
+          ('Bengaluru', 'Karnataka', '560'), ('Mysuru', 'Karnataka', '570'), ('New Delhi', 'Delhi', '110'),
+          ('Kolkata', 'West Bengal', '700'), ('Hyderabad', 'Telangana', '500'), ('Jaipur', 'Rajasthan', '302')]
+CITIES += [(f'Town {i}', 'Uttar Pradesh', f'{200 + i}') for i in range(200)]
+FIRST_NAMES = ['Priya', 'Arun', 'Lakshmi', 'Rahul', 'Anjali', 'Vikram', 'Meena', 'Suresh', 'Kavya', 'Imran']
+LAST_NAMES = ['Raman', 'Kumar', 'Sharma', 'Iyer', 'Reddy', 'Khan', 'Nair', 'Patel', 'Das', 'Singh']
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+
+def seed(donors, batch=20000):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    for start in range(1, donors + 1, batch):
+        ids = range(start, min(start + batch, donors + 1))
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x',
+             'role': 'donor', 'created_at': now, 'is_active': True, 'unread_notifications': 0}
+            for i in ids
+        ])
+        rows = []
+        for i in ids:
+            if i % 100 == 0:
+                city, state, zip_code = 'Bengaluru', 'Karnataka', '560123'
+            else:
+                city, state, pin = rng.choice(CITIES)
+                zip_code = f'{pin}{rng.randrange(1000):03d}'
+            rows.append({'id': i, 'user_id': i,
+                         'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+                         'blood_type': rng.choice(BLOOD_TYPES), 'phone': '9999999999', 'address': f'{i} Main Road',
+                         'city': city, 'state': state, 'zip_code': zip_code,
+                         'date_of_birth': date(1990, 1, 1), 'is_available': True, 'updated_at': now})
+        db.session.execute(insert(DonorProfile), rows)
+        db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def ilike_page(city=None, state=None, name=None, pin=None):
+    """First page the way search filtered before the text index"""
+    query = DonorProfile.query.join(User).filter(User.is_active == True)
+    if city:
+        query = query.filter(DonorProfile.city.ilike(f'%{city}%'))
+    if state:
+        query = query.filter(DonorProfile.state.ilike(f'%{state}%'))
+    if name:
+        query = query.filter(DonorProfile.full_name.ilike(f'%{name}%'))
+    if pin:
+        query = query.filter(DonorProfile.zip_code.ilike(f'%{pin}%'))
+    return query.order_by(DonorProfile.full_name, DonorProfile.id).limit(21).all()
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=500_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        print(f'database: {db.engine.dialect.name}')
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.donors)
+        print(f'seeded {args.donors:,} donors in {time.perf_counter() - started:.1f} s')
+
+        cases = [
+            ('city + state (rare city)', lambda: ilike_page(city='mysuru', state='Karnataka'),
+             lambda: keyset_page(donor_search_query(city='mysuru', state='Karnataka'))[0]),
+            ('city + state (small town)', lambda: ilike_page(city='town 17', state='Uttar Pradesh'),
+             lambda: keyset_page(donor_search_query(city='Town  17', state='Uttar Pradesh'))[0]),
+            ('city + state (big city)', lambda: ilike_page(city='chennai', state='Tamil Nadu'),
+             lambda: keyset_page(donor_search_query(city='chennai', state='Tamil Nadu'))[0]),
+            ('name word', lambda: ilike_page(name='iyer'),
+             lambda: keyset_page(donor_search_query(text='iyer'))[0]),
+            ('city word', lambda: ilike_page(city='chennai'),
+             lambda: keyset_page(donor_search_query(text='chennai'))[0]),
+            ('name + city words, ranked', lambda: ilike_page(name='priya', city='chennai'),
+             lambda: keyset_page(donor_search_query(text='priya chennai'), sort=RELEVANCE)[0]),
+            ('PIN code', lambda: ilike_page(pin='560123'),
+             lambda: keyset_page(donor_search_query(text='560123'))[0]),
+        ]
+        print(f'{"first page of 20":<28} {"ilike":>10} {"indexed":>10} {"speed-up":>9}')
+        for label, old, new in cases:
+            old_ms, _ = timed(old, args.repeats)
+            new_ms, rows = timed(new, args.repeats)
+            print(f'{label:<28} {old_ms:>8.2f}ms {new_ms:>8.2f}ms {old_ms / new_ms:>8.0f}x  ({len(rows)} rows)')
+
+
+if __name__ == '__main__':
+    main()
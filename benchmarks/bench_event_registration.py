@@ -0,0 +1,206 @@
+"""Benchmark a sign-up stampede on one capacity-limited donation event.
+
+Seeds a scratch SQLite database (or uses DATABASE_URL) with one event of
+--seats seats and --donors donors, then runs two phases through the real
+routes, --threads requests at a time, all released together:
+
+* stampede: every donor signs up at once, and every tenth clicks twice;
+  reports sign-ups per second and latency percentiles
+* churn: --cancels registered donors cancel at once; each freed seat must
+  go to the oldest waitlisted donor
+
+Afterwards the event must hold exactly --seats registered donors,
+registered_count must match them, nobody may be signed up twice and the
+rest must be waitlisted. Requests beyond the database connection pool wait
+for a connection, so with many --threads the tail latencies mostly measure
+that queue.
+
+    python benchmarks/bench_event_registration.py
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/bench_event_registration.py --threads 64
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'events.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import DonationEvent, DonorProfile, EventRegistration, OrganizationProfile, User  # noqa: E402
+
+
+def seed(seats, donors):
+    """One event and ``donors`` donors; returns ``(event id, donor user ids)``"""
+    db.drop_all()
+    db.create_all()
+    organizer = User(username='org1', email='org1@example.com', role='organization', password_hash='x')
+    db.session.add(organizer)
+    db.session.flush()
+    organization = OrganizationProfile(user_id=organizer.id, organization_name='Red Drop Trust',
+                                       registration_number='R-1', contact_person='Ms. Iyer', phone='9999999999',
+                                       address='1 Main Road', city='Chennai', state='Tamil Nadu', zip_code='600001')
+    db.session.add(organization)
+    db.session.flush()
+    event = DonationEvent(organization_id=organization.id, event_name='Mega Camp',
+                          event_date=date.today() + timedelta(days=7), start_time=clock(9), end_time=clock(17),
+                          location='Town Hall', address='1 Main Road', city='Chennai', state='Tamil Nadu',
+                          max_participants=seats)
+    db.session.add(event)
+    db.session.commit()
+
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {'username': f'donor{i}', 'email': f'donor{i}@example.com', 'role': 'donor', 'password_hash': 'x',
+         'is_active': True, 'created_at': now}
+        for i in range(donors)
+    ])
+    user_ids = db.session.scalars(db.select(User.id).where(User.role == 'donor').order_by(User.id)).all()
+    db.session.execute(insert(DonorProfile), [
+        {'user_id': user_id, 'full_name': f'Donor {user_id}', 'blood_type': 'O+', 'phone': '9999999999',
+         'address': '1 Main Road', 'city': 'Chennai', 'state': 'Tamil Nadu', 'zip_code': '600001',
+         'date_of_birth': date(1990, 1, 1), 'is_available': True}
+        for user_id in user_ids
+    ])
+    db.session.commit()
+    return event.id, user_ids
+
+
+def client_for(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['role'] = 'donor'
+    return client
+
+
+def fire(calls, threads):
+    """POST every ``(client, url)`` with ``threads`` in flight; returns ({status: count}, latencies)"""
+    barrier = threading.Barrier(min(threads, len(calls)))
+    statuses = {}
+    latencies = []
+    lock = threading.Lock()
+    started = threading.local()
+
+    def post(call):
+        client, url = call
+        if not getattr(started, 'done', False):
+            # Each worker's first request waits for the others, so the stampede starts at once
+            started.done = True
+            barrier.wait()
+        began = time.perf_counter()
+        try:
+            status = client.post(url).status_code
+        except Exception as exc:  # a crash counts against the check, not the harness
+            status = type(exc).__name__
+        elapsed = time.perf_counter() - began
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(post, calls))
+    return statuses, latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, count, seconds, latencies):
+    print(f'{name:<10} {count:>6} requests in {seconds:6.2f} s  {count / seconds:8.0f}/s  '
+          f'p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p95 {percentile(latencies, 0.95) * 1000:6.1f} ms  '
+          f'p99 {percentile(latencies, 0.99) * 1000:6.1f} ms')
+
+
+def snapshot(event_id):
+    """``(registered_count, registered donor ids, waitlisted donor ids oldest first, duplicate donors)``"""
+    event = db.session.get(DonationEvent, event_id)
+    db.session.refresh(event)
+    rows = db.session.execute(
+        db.select(EventRegistration.donor_id, EventRegistration.status)
+        .where(EventRegistration.event_id == event_id)
+        .order_by(EventRegistration.created_at, EventRegistration.id)).all()
+    duplicates = db.session.scalar(
+        db.select(func.count()).select_from(
+            db.select(EventRegistration.donor_id)
+            .where(EventRegistration.event_id == event_id)
+            .group_by(EventRegistration.donor_id)
+            .having(func.count() > 1).subquery()))
+    return (event.registered_count,
+            {donor_id for donor_id, status in rows if status == 'registered'},
+            [donor_id for donor_id, status in rows if status == 'waitlisted'],
+            duplicates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seats', type=int, default=100, help='event capacity')
+    parser.add_argument('--donors', type=int, default=5000, help='donors signing up at once')
+    parser.add_argument('--cancels', type=int, default=50, help='registered donors who cancel in the churn phase')
+    parser.add_argument('--threads', type=int, default=200, help='requests in flight')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        event_id, user_ids = seed(args.seats, args.donors)
+        donor_ids = dict(db.session.execute(db.select(DonorProfile.user_id, DonorProfile.id)).all())
+    clients = {user_id: client_for(user_id) for user_id in user_ids}
+    register_url = f'/donor/events/{event_id}/register'
+    cancel_url = f'/donor/events/{event_id}/cancel'
+
+    calls = [(clients[user_id], register_url) for user_id in user_ids]
+    calls += [(clients[user_id], register_url) for user_id in user_ids[::10]]
+    random.shuffle(calls)
+    began = time.perf_counter()
+    signup_statuses, latencies = fire(calls, args.threads)
+    report('stampede', len(calls), time.perf_counter() - began, latencies)
+
+    with app.app_context():
+        count, registered, waitlisted, duplicates = snapshot(event_id)
+    cancelling = random.sample(sorted(registered), min(args.cancels, len(registered)))
+    expected = (registered - set(cancelling)) | set(waitlisted[:len(cancelling)])
+    user_of = {donor_id: user_id for user_id, donor_id in donor_ids.items()}
+
+    calls = [(clients[user_of[donor_id]], cancel_url) for donor_id in cancelling]
+    began = time.perf_counter()
+    cancel_statuses, latencies = fire(calls, args.threads)
+    report('churn', len(calls), time.perf_counter() - began, latencies)
+
+    with app.app_context():
+        churned_count, churned_registered, churned_waitlisted, churned_duplicates = snapshot(event_id)
+
+    seated = min(args.seats, args.donors)
+    checks = [
+        ('every request redirected', set(signup_statuses) | set(cancel_statuses) == {302},
+         f'sign-ups {signup_statuses}, cancels {cancel_statuses}'),
+        ('no overbooking', count == len(registered) == seated,
+         f'registered_count {count}, {len(registered)} registered, {seated} seats'),
+        ('everyone else waitlisted', len(waitlisted) == args.donors - seated and not duplicates,
+         f'{len(waitlisted)} waitlisted, {duplicates} donor(s) with duplicates'),
+        ('seats refilled after cancels', churned_count == len(churned_registered) == seated and not churned_duplicates,
+         f'registered_count {churned_count}, {len(churned_registered)} registered'),
+        ('oldest waitlisted promoted', churned_registered == expected
+         and churned_waitlisted == waitlisted[len(cancelling):],
+         f'{len(churned_registered ^ expected)} donor(s) out of place'),
+    ]
+    for name, ok, detail in checks:
+        print(f'{"ok " if ok else "FAIL"} {name:<30} {detail}')
+    sys.exit(0 if all(ok for _, ok, _ in checks) else 1)
+
+
+if __name__ == '__main__':
+    main()
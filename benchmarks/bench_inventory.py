@@ -0,0 +1,222 @@
+"""Benchmark concurrent blood stock reservations.
+
+Runs two phases against a scratch SQLite database, or PostgreSQL when
+DATABASE_URL points at one:
+
+* throughput: N threads reserve and release single units against random
+  requests and locations; reports movements per second
+* contention: N threads race to reserve from one location holding fewer
+  units than they ask for; checks that exactly the stock on hand was sold
+* spread: N threads, each at its own location, race to cover the same
+  small requests; checks that no request ends up holding more units than
+  it needs
+* expiry: every request passes its deadline and the request sweeper
+  expires them; checks that no stock is left reserved
+
+Afterwards every inventory balance is replayed from the ledger and compared.
+
+    python benchmarks/bench_inventory.py
+    DATABASE_URL=postgresql://localhost/bench python benchmarks/bench_inventory.py --threads 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'inventory.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import case, func, insert, update  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+import inventory  # noqa: E402
+from expiry import expire_requests  # noqa: E402
+from models import BloodInventory, BloodRequest, HospitalProfile, InventoryLedgerEntry, User  # noqa: E402
+
+LOCATIONS = [f'Blood Bank {i}' for i in range(20)]
+
+
+def seed(requests):
+    db.drop_all()
+    db.create_all()
+    user = User(username='hospital1', email='hospital1@example.com', role='hospital', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    hospital = HospitalProfile(user_id=user.id, hospital_name='City Hospital', license_number='L-1',
+                               contact_person='Dr. Rao', phone='9999999999', address='1 Main Road',
+                               city='Chennai', state='Tamil Nadu', zip_code='600001')
+    db.session.add(hospital)
+    db.session.flush()
+    needed_by = datetime.utcnow() + timedelta(days=3)
+    db.session.execute(insert(BloodRequest), [
+        {'hospital_id': hospital.id, 'blood_type': 'AB+', 'units_needed': 1000, 'urgency_level': 'high',
+         'status': 'active', 'requested_at': datetime.utcnow(), 'needed_by': needed_by}
+        for _ in range(requests)
+    ])
+    db.session.commit()
+    for location in LOCATIONS:
+        for blood_type in inventory.BLOOD_TYPES:
+            inventory.receive(blood_type, location, 100000)
+
+
+def run_threads(threads, target):
+    errors = []
+
+    def guarded(index):
+        try:
+            with app.app_context():
+                target(index)
+        except Exception as exc:
+            errors.append(exc)
+
+    workers = [threading.Thread(target=guarded, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - started
+
+
+def throughput(threads, operations):
+    inventory_ids = db.session.scalars(db.select(BloodInventory.id)).all()
+    request_ids = db.session.scalars(db.select(BloodRequest.id)).all()
+
+    def work(index):
+        rng = random.Random(index)
+        for _ in range(operations):
+            blood_request = db.session.get(BloodRequest, rng.choice(request_ids))
+            inventory_id = rng.choice(inventory_ids)
+            inventory.reserve(blood_request, inventory_id, 1)
+            inventory.release(blood_request, inventory_id, 1)
+
+    elapsed = run_threads(threads, work)
+    movements = threads * operations * 2
+    print(f'throughput: {threads} threads, {movements:,} movements in {elapsed:.2f} s '
+          f'= {movements / elapsed:,.0f} movements/s')
+
+
+def contention(threads, stock, attempts):
+    contested = inventory.get_or_create_inventory('O-', 'Contested Bank')
+    inventory.receive('O-', 'Contested Bank', stock)
+    request_ids = db.session.scalars(db.select(BloodRequest.id)).all()
+    sold = []
+
+    def work(index):
+        for i in range(attempts):
+            blood_request = db.session.get(BloodRequest, request_ids[(index * attempts + i) % len(request_ids)])
+            try:
+                inventory.reserve(blood_request, contested.id, 1)
+                sold.append(1)
+            except inventory.InsufficientStock:
+                pass
+
+    elapsed = run_threads(threads, work)
+    db.session.expire_all()
+    left = db.session.get(BloodInventory, contested.id)
+    ok = len(sold) == stock and left.units_available == 0 and left.units_reserved == stock
+    print(f'contention: {threads * attempts} attempts on {stock} units in {elapsed:.2f} s, '
+          f'{len(sold)} reserved, {left.units_available} left -> {"ok" if ok else "OVERSOLD"}')
+    return ok
+
+
+def spread(threads, requests, units_needed=2):
+    hospital_id = db.session.scalar(db.select(HospitalProfile.id))
+    needed_by = datetime.utcnow() + timedelta(days=3)
+    request_ids = db.session.scalars(insert(BloodRequest).returning(BloodRequest.id), [
+        {'hospital_id': hospital_id, 'blood_type': 'AB+', 'units_needed': units_needed, 'urgency_level': 'high',
+         'status': 'active', 'requested_at': datetime.utcnow(), 'needed_by': needed_by}
+        for _ in range(requests)
+    ]).all()
+    db.session.commit()
+    inventory_ids = []
+    for i in range(threads):
+        inventory_ids.append(inventory.get_or_create_inventory('O-', f'Spread Bank {i}').id)
+        inventory.receive('O-', f'Spread Bank {i}', units_needed * requests)
+
+    def work(index):
+        for request_id in request_ids:
+            blood_request = db.session.get(BloodRequest, request_id)
+            try:
+                inventory.reserve(blood_request, inventory_ids[index])
+            except inventory.InventoryError:
+                pass  # already covered from another location
+
+    elapsed = run_threads(threads, work)
+    over_held = [request_id for request_id in request_ids
+                 if sum(inventory.reservations_for_request(request_id).values()) > units_needed]
+    print(f'spread: {threads} locations covering {requests} requests of {units_needed} units in {elapsed:.2f} s, '
+          f'{len(over_held)} over-held -> {"ok" if not over_held else "OVERSOLD"}')
+    return not over_held
+
+
+def expiry():
+    held_before = db.session.scalar(db.select(func.sum(BloodInventory.units_reserved)))
+    db.session.execute(update(BloodRequest).values(needed_by=datetime.utcnow() - timedelta(days=1)))
+    db.session.commit()
+    summary = expire_requests(grace_hours=0)
+    db.session.expire_all()
+    held_after = db.session.scalar(db.select(func.sum(BloodInventory.units_reserved)))
+    ok = held_after == 0 and summary['units_released'] == held_before
+    print(f'expiry: {summary["expired"]} requests expired in {summary["seconds"]:.2f} s, '
+          f'{summary["units_released"]} of {held_before} reserved units released, {held_after} still reserved '
+          f'-> {"ok" if ok else "LEAKED"}')
+    return ok
+
+
+def ledger_matches_balances():
+    held = case(
+        (InventoryLedgerEntry.entry_type == 'receive', InventoryLedgerEntry.units),
+        else_=0
+    )
+    rows = db.session.execute(
+        db.select(BloodInventory.id, BloodInventory.units_available, BloodInventory.units_reserved,
+                  func.sum(held),
+                  func.sum(case((InventoryLedgerEntry.entry_type == 'reserve', InventoryLedgerEntry.units),
+                                else_=0)),
+                  func.sum(case((InventoryLedgerEntry.entry_type == 'release', InventoryLedgerEntry.units),
+                                else_=0)),
+                  func.sum(case((InventoryLedgerEntry.entry_type == 'consume', InventoryLedgerEntry.units),
+                                else_=0)))
+        .join(InventoryLedgerEntry, InventoryLedgerEntry.inventory_id == BloodInventory.id)
+        .group_by(BloodInventory.id, BloodInventory.units_available, BloodInventory.units_reserved)
+    ).all()
+    mismatched = [row.id for row in rows
+                  if row[1] != row[3] - row[4] + row[5] or row[2] != row[4] - row[5] - row[6]]
+    print(f'ledger replay: {len(rows)} inventories, {len(mismatched)} mismatched')
+    return not mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=250, help='reserve/release pairs per thread')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--spread-requests', type=int, default=40, help='requests covered from every location at once')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        print(f'database: {db.engine.dialect.name}')
+        seed(args.requests)
+        throughput(args.threads, args.operations)
+        ok = contention(args.threads, args.stock, attempts=args.stock // args.threads + 10)
+        ok = spread(args.threads, args.spread_requests) and ok
+        ok = expiry() and ok
+        ok = ledger_matches_balances() and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark ranked donor matching.
+
+Scores blood requests against a synthetic in-memory snapshot of N donors
+(1M by default) and reports ranking latency. With --db, also seeds that many
+donors into a scratch SQLite database and times the full snapshot load and
+an incremental refresh after 1% of profiles change.
+
+    python benchmarks/bench_matching.py
+    python benchmarks/bench_matching.py 200000 --db
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'matching.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+import numpy as np  # noqa: E402
+from sqlalchemy import insert, update  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from matching import BLOOD_TYPES, DonorSnapshot  # noqa: E402
+from models import DonorProfile, User  # noqa: E402
+
+CITIES = [f'City {i}' for i in range(500)]
+STATES = [f'State {i}' for i in range(36)]
+
+
+def synthetic_snapshot(count, seed=7):
+    rng = np.random.default_rng(seed)
+    snapshot = DonorSnapshot()
+    today = date.today().toordinal()
+    snapshot.ids = np.arange(1, count + 1, dtype=np.int64)
+    snapshot.blood_type = rng.integers(0, len(BLOOD_TYPES), count, dtype=np.uint8)
+    donated = rng.random(count) < 0.6
+    snapshot.next_eligible = np.where(donated, today + rng.integers(-300, 56, count), 0).astype(np.int32)
+    snapshot.pin = rng.integers(110001, 110500, count, dtype=np.int64)
+    snapshot.city = rng.integers(0, len(CITIES), count, dtype=np.int32)
+    snapshot.state = rng.integers(0, len(STATES), count, dtype=np.int32)
+    snapshot.active = rng.random(count) < 0.9
+    snapshot.responses = rng.integers(0, 20, count).astype(np.float32)
+    snapshot.accepted = np.floor(snapshot.responses * rng.random(count)).astype(np.float32)
+    snapshot._city_codes = {city.lower(): i for i, city in enumerate(CITIES)}
+    snapshot._state_codes = {state.lower(): i for i, state in enumerate(STATES)}
+    return snapshot
+
+
+def bench_rank(snapshot, repeats):
+    timings = []
+    for i in range(repeats):
+        blood_type = BLOOD_TYPES[i % len(BLOOD_TYPES)]
+        started = time.perf_counter()
+        snapshot.rank(blood_type, 'critical', CITIES[i % len(CITIES)], STATES[i % len(STATES)],
+                      str(110001 + i % 500), needed_by=date.today() + timedelta(days=3), limit=20)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def seed_donors(count, batch=20000):
+    now = datetime.utcnow()
+    # Spread profile edits over the last day, as in a live database
+    edited_at = [now - timedelta(days=1) + timedelta(seconds=i * 86000 / count) for i in range(count + 1)]
+    rng = np.random.default_rng(11)
+    for start in range(0, count, batch):
+        ids = range(start + 1, min(start + batch, count) + 1)
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x',
+             'role': 'donor', 'created_at': now, 'is_active': True} for i in ids
+        ])
+        db.session.execute(insert(DonorProfile), [
+            {'id': i, 'user_id': i, 'full_name': f'Donor {i}', 'blood_type': BLOOD_TYPES[int(rng.integers(8))],
+             'phone': '9999999999', 'address': '1 Main Road', 'city': CITIES[int(rng.integers(500))],
+             'state': STATES[int(rng.integers(36))], 'zip_code': str(int(rng.integers(110001, 110500))),
+             'date_of_birth': date(1990, 1, 1), 'is_available': True, 'updated_at': edited_at[i]} for i in ids
+        ])
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('donors', nargs='?', type=int, default=1_000_000)
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--db', action='store_true', help='also time loading and refreshing from SQLite')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    snapshot = synthetic_snapshot(args.donors)
+    p50, p95 = bench_rank(snapshot, args.repeats)
+    print(f'rank top-20 over {args.donors:,} donors: p50 {p50:.2f} ms, p95 {p95:.2f} ms')
+
+    if not args.db:
+        return
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed_donors(args.donors)
+        print(f'seeded {args.donors:,} donors in {time.perf_counter() - started:.1f} s')
+
+        started = time.perf_counter()
+        snapshot = DonorSnapshot.load()
+        print(f'full snapshot load: {time.perf_counter() - started:.2f} s')
+
+        changed = max(1, args.donors // 100)
+        db.session.execute(update(DonorProfile).where(DonorProfile.id <= changed)
+                           .values(city='City 1', updated_at=datetime.utcnow()))
+        db.session.commit()
+        started = time.perf_counter()
+        snapshot.refresh()
+        print(f'incremental refresh of {changed:,} changed donors: {time.perf_counter() - started:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark the blood-request notification fan-out.
+
+Seeds N matching donors into a scratch SQLite database (or DATABASE_URL if
+set), queues one O- request fan-out and times the worker draining it.
+
+    python benchmarks/bench_notification_fanout.py            # 10k and 100k donors
+    python benchmarks/bench_notification_fanout.py 5000 --legacy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import delete, func, insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import DonorProfile, Notification, NotificationJob, User  # noqa: E402
+import notifications  # noqa: E402
+from utils import create_notification  # noqa: E402
+
+
+def seed_donors(count, batch=10000):
+    """Bulk insert ``count`` available O- donors and their users"""
+    db.session.execute(delete(Notification))
+    db.session.execute(delete(NotificationJob))
+    db.session.execute(delete(DonorProfile))
+    db.session.execute(delete(User))
+    db.session.commit()
+    now = datetime.utcnow()
+    for start in range(0, count, batch):
+        ids = range(start + 1, min(start + batch, count) + 1)
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com',
+             'password_hash': 'x', 'role': 'donor', 'created_at': now, 'is_active': True}
+            for i in ids
+        ])
+        db.session.execute(insert(DonorProfile), [
+            {'id': i, 'user_id': i, 'full_name': f'Donor {i}', 'blood_type': 'O-', 'phone': '9999999999',
+             'address': '1 Main Road', 'city': 'Chennai', 'state': 'Tamil Nadu', 'zip_code': '600001',
+             'date_of_birth': date(1990, 1, 1), 'is_available': True}
+            for i in ids
+        ])
+        db.session.commit()
+
+
+def bench_fanout(count, chunk_size):
+    seed_donors(count)
+    notifications.enqueue_fanout('Blood Request - O-', 'Benchmark request', 'blood_request', ['O-'])
+    db.session.commit()
+    started = time.perf_counter()
+    notifications.run_pending_jobs(chunk_size=chunk_size)
+    elapsed = time.perf_counter() - started
+    inserted = db.session.scalar(db.select(func.count(Notification.id)))
+    assert inserted == count, (inserted, count)
+    return elapsed
+
+
+def bench_legacy(count):
+    """The old path: one add + commit per donor inside the request"""
+    seed_donors(count)
+    donors = DonorProfile.query.filter(DonorProfile.blood_type.in_(['O-']),
+                                       DonorProfile.is_available == True).all()
+    started = time.perf_counter()
+    for donor in donors:
+        create_notification(donor.user_id, 'Blood Request - O-', 'Benchmark request', 'blood_request')
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--chunk-size', type=int, default=notifications.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--legacy', action='store_true', help='also time the per-row commit path')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()
+        print(f'{"donors":>8}  {"path":<8}  {"seconds":>8}  {"rows/s":>10}')
+        for size in args.sizes:
+            elapsed = bench_fanout(size, args.chunk_size)
+            print(f'{size:>8}  {"fan-out":<8}  {elapsed:>8.2f}  {size / elapsed:>10.0f}')
+            if args.legacy:
+                elapsed = bench_legacy(size)
+                print(f'{size:>8}  {"legacy":<8}  {elapsed:>8.2f}  {size / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark the notification inbox for users with very large inboxes.
+
+Seeds a scratch SQLite database (or DATABASE_URL if set) with N users holding
+100k notifications each, then times the unread badge, the first and a deep
+inbox page, and marking notifications read. The badge and the deep page are
+also timed the naive way (COUNT(*) and OFFSET) for comparison.
+
+    python benchmarks/bench_notification_inbox.py
+    python benchmarks/bench_notification_inbox.py --users 5 --per-user 200000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'inbox.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import Notification, User  # noqa: E402
+from notifications import INBOX_PAGE_SIZE, inbox_page, mark_read  # noqa: E402
+
+
+def seed(users, per_user, batch=20000):
+    """Users with ``per_user`` notifications each, a tenth of them unread"""
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'role': 'donor', 'created_at': now, 'is_active': True, 'unread_notifications': per_user // 10}
+        for i in range(1, users + 1)
+    ])
+    for user_id in range(1, users + 1):
+        for start in range(0, per_user, batch):
+            db.session.execute(insert(Notification), [
+                {'user_id': user_id, 'title': f'Notification {i}', 'message': 'Benchmark notification',
+                 'notification_type': 'system', 'is_read': i < per_user * 9 // 10,
+                 'created_at': now - timedelta(seconds=per_user - i)}
+                for i in range(start, min(start + batch, per_user))
+            ])
+        db.session.commit()
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--per-user', type=int, default=100_000)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    if args.users < 1:
+        parser.error('--users must be at least 1')
+    logging.disable(logging.INFO)
+    deep_page = args.per_user // INBOX_PAGE_SIZE // 2
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.users, args.per_user)
+        print(f'seeded {args.users} users x {args.per_user:,} notifications in {time.perf_counter() - started:.1f} s')
+
+        # Time reads on the first user and mark the next two read, reusing users when fewer were seeded
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        user_id, selecting, clearing = (user_ids[min(i, len(user_ids) - 1)] for i in range(3))
+        cursor = None
+        for _ in range(deep_page):
+            _, cursor = inbox_page(user_id, cursor)
+
+        results = [
+            ('badge: counter column', timed(lambda: db.session.scalar(
+                db.select(User.unread_notifications).where(User.id == user_id)), args.repeats)),
+            ('badge: COUNT(*) unread', timed(lambda: db.session.scalar(
+                db.select(func.count(Notification.id))
+                .where(Notification.user_id == user_id, Notification.is_read == False)), args.repeats)),
+            ('inbox page 1', timed(lambda: inbox_page(user_id), args.repeats)),
+            (f'inbox page {deep_page:,} (cursor)', timed(lambda: inbox_page(user_id, cursor), args.repeats)),
+            (f'inbox page {deep_page:,} (OFFSET)', timed(lambda: Notification.query
+                                                         .filter(Notification.user_id == user_id)
+                                                         .order_by(Notification.created_at.desc(),
+                                                                   Notification.id.desc())
+                                                         .offset(deep_page * INBOX_PAGE_SIZE)
+                                                         .limit(INBOX_PAGE_SIZE).all(), args.repeats)),
+        ]
+
+        unread_ids = db.session.scalars(
+            db.select(Notification.id)
+            .where(Notification.user_id == selecting, Notification.is_read == False)
+            .limit(INBOX_PAGE_SIZE)
+        ).all()
+        started = time.perf_counter()
+        marked = mark_read(selecting, notification_ids=unread_ids)
+        results.append((f'mark {marked} selected read', (time.perf_counter() - started) * 1000))
+
+        newest = db.session.scalar(db.select(func.max(Notification.id)).where(Notification.user_id == clearing))
+        started = time.perf_counter()
+        marked = mark_read(clearing, up_to=newest)
+        results.append((f'mark all read ({marked:,} rows)', (time.perf_counter() - started) * 1000))
+
+        for label, ms in results:
+            print(f'{label:<34} {ms:>9.2f} ms')
+        counters = {user.id: user.unread_notifications
+                    for user in User.query.filter(User.id.in_([selecting, clearing]))}
+        print(f'unread counters after marking: user {selecting} = {counters[selecting]:,}, '
+              f'user {clearing} = {counters[clearing]:,}')
+
+
+if __name__ == '__main__':
+    main()
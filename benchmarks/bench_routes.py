@@ -0,0 +1,267 @@
+"""Replay role journeys through the app and report per-route latency and queries.
+
+Seeds a scratch SQLite database with seed_data.py at --scale (or reuses
+DATABASE_URL if it already has users). It then drives the Flask test client,
+in process, through one journey per role:
+
+* donor: log in, dashboard, search by city, search by name, inbox, respond to a request
+* hospital: log in, dashboard, search near its PIN, request blood, request matches
+* organization: log in, dashboard, manage donors
+* admin: log in, dashboard, analytics, manage users
+
+Each step's latency and SQL statement count are recorded. The report gives
+p50/p95/p99 latency and mean/max queries per step. --output saves the
+results as JSON. --compare checks a saved run and exits 1 if any step's p95
+is slower by more than --tolerance, or if it issues more queries.
+
+    python benchmarks/bench_routes.py --output baseline.json
+    python benchmarks/bench_routes.py --compare baseline.json
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_routes.py --roles donor,hospital
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'routes.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import event, func  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import BloodRequest, DonorProfile, HospitalProfile, OrganizationProfile  # noqa: E402
+import seed_data  # noqa: E402
+
+ROLES = ['donor', 'hospital', 'organization', 'admin']
+# Slower p95s under this many ms are timer noise, not regressions
+NOISE_FLOOR_MS = 2.0
+
+
+class Recorder:
+    """Times test client calls and counts the statements each one runs"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # step -> [(ms, queries)]
+        self.errors = defaultdict(int)
+        self._thread = None
+        self._queries = 0
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        # Only statements run on behalf of the request being timed
+        if threading.get_ident() == self._thread:
+            self._queries += 1
+
+    def call(self, step, method, client, path, record=True, **kwargs):
+        self._thread, self._queries = threading.get_ident(), 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        self._thread = None
+        if record:
+            self.samples[step].append((elapsed, self._queries))
+            if response.status_code >= 400:
+                self.errors[step] += 1
+        return response
+
+
+class Journeys:
+    """One method per role; each logs in a random user of that role and walks their usual pages"""
+
+    def __init__(self, recorder, rng):
+        self.recorder = recorder
+        self.rng = rng
+        with app.app_context():
+            self.counts = {
+                'donor': db.session.scalar(db.select(func.count(DonorProfile.id))),
+                'hospital': db.session.scalar(db.select(func.count(HospitalProfile.id))),
+                'organization': db.session.scalar(db.select(func.count(OrganizationProfile.id))),
+            }
+            self.active_requests = db.session.scalars(
+                db.select(BloodRequest.id).where(BloodRequest.status == 'active')
+                .order_by(BloodRequest.id.desc()).limit(1000)).all()
+
+    def _login(self, role, username, record):
+        client = app.test_client()
+        self.recorder.call(f'{role}: login', 'POST', client, '/login', record,
+                           data={'username': username, 'password': seed_data.PASSWORD})
+        return client
+
+    def _pick(self, role):
+        number = self.rng.randrange(1, self.counts[role] + 1)
+        # seed_data deactivates every fiftieth donor
+        while role == 'donor' and number % 50 == 0:
+            number = self.rng.randrange(1, self.counts[role] + 1)
+        return number
+
+    def donor(self, record=True):
+        number = self._pick('donor')
+        city, state = seed_data.CITIES[number % len(seed_data.CITIES)][:2]
+        client = self._login('donor', f'donor{number}', record)
+        call = self.recorder.call
+        call('donor: dashboard', 'GET', client, '/donor/dashboard', record)
+        call('donor: search by city', 'GET', client, '/search/donors', record,
+             query_string={'blood_type': 'O-', 'city': city, 'state': state, 'sort': 'name'})
+        call('donor: search by name', 'GET', client, '/search/donors', record,
+             query_string={'q': self.rng.choice(seed_data.FIRST_NAMES), 'state': state})
+        call('donor: inbox', 'GET', client, '/notifications', record)
+        if self.active_requests:
+            request_id = self.rng.choice(self.active_requests)
+            call('donor: respond to request', 'GET', client, f'/respond-to-request/{request_id}/accept', record)
+
+    def hospital(self, record=True):
+        number = self._pick('hospital')
+        client = self._login('hospital', f'hospital{number}', record)
+        call = self.recorder.call
+        call('hospital: dashboard', 'GET', client, '/hospital/dashboard', record)
+        city_index = (number - 1) % len(seed_data.CITIES)
+        call('hospital: search near PIN', 'GET', client, '/search/donors', record,
+             query_string={'blood_type': 'O-', 'near_pin': seed_data.pin(city_index, (number - 1) % seed_data.PINS_PER_CITY),
+                           'radius_km': 25, 'state': seed_data.CITIES[city_index][1]})
+        call('hospital: request blood form', 'GET', client, '/hospital/request-blood', record)
+        call('hospital: request blood', 'POST', client, '/hospital/request-blood', record, data={
+            'blood_type': self.rng.choice(seed_data.BLOOD_TYPES), 'units_needed': 2, 'urgency_level': 'high',
+            'description': 'Benchmark request', 'needed_by': (date.today() + timedelta(days=3)).isoformat()})
+        with app.app_context():
+            request_id = db.session.scalar(
+                db.select(BloodRequest.id).where(BloodRequest.hospital_id == number)
+                .order_by(BloodRequest.requested_at.desc()).limit(1))
+        if request_id:
+            call('hospital: request matches', 'GET', client, f'/hospital/requests/{request_id}/matches', record)
+
+    def organization(self, record=True):
+        client = self._login('organization', f'org{self._pick("organization")}', record)
+        self.recorder.call('organization: dashboard', 'GET', client, '/organization/dashboard', record)
+        self.recorder.call('organization: manage donors', 'GET', client, '/organization/manage-donors', record)
+
+    def admin(self, record=True):
+        client = self._login('admin', 'admin1', record)
+        self.recorder.call('admin: dashboard', 'GET', client, '/admin/dashboard', record)
+        self.recorder.call('admin: analytics', 'GET', client, '/admin/analytics', record)
+        self.recorder.call('admin: manage users', 'GET', client, '/admin/manage-users', record)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = fraction * (len(ordered) - 1)
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+def summarise(recorder):
+    steps = {}
+    for step, samples in recorder.samples.items():
+        latencies = [ms for ms, _ in samples]
+        queries = [count for _, count in samples]
+        steps[step] = {
+            'count': len(samples),
+            'errors': recorder.errors.get(step, 0),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries_mean': round(statistics.mean(queries), 1),
+            'queries_max': max(queries),
+        }
+    return steps
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(steps, baseline, tolerance):
+    """Print regressions against a saved run; returns how many there are"""
+    regressions = 0
+    for step, old in baseline['steps'].items():
+        new = steps.get(step)
+        if new is None:
+            continue
+        slower = new['p95_ms'] > old['p95_ms'] * (1 + tolerance) and new['p95_ms'] - old['p95_ms'] > NOISE_FLOOR_MS
+        more_queries = new['queries_max'] > old['queries_max']
+        if slower or more_queries:
+            regressions += 1
+            print(f'REGRESSION {step}: p95 {old["p95_ms"]:.2f} -> {new["p95_ms"]:.2f} ms, '
+                  f'queries {old["queries_max"]} -> {new["queries_max"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.01, help='seed_data scale when seeding (default 0.01)')
+    parser.add_argument('--iterations', type=int, default=30, help='journeys per role')
+    parser.add_argument('--roles', default=','.join(ROLES), help='comma-separated roles to replay')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown (default 0.25)')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+    roles = [role.strip() for role in args.roles.split(',') if role.strip()]
+
+    with app.app_context():
+        db.create_all()
+        if not seed_data.is_seeded():
+            print(f'seeding at scale {args.scale}')
+            seed_data.seed(args.scale, args.seed)
+        dialect = db.engine.dialect.name
+    # The push broker reads its starting watermarks once per process; keep that out of the first request
+    app.extensions['push_broker'].start()
+
+    recorder = Recorder()
+    journeys = Journeys(recorder, random.Random(args.seed))
+    # One unrecorded pass warms template, matching and PIN caches
+    for role in roles:
+        getattr(journeys, role)(record=False)
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        for role in roles:
+            getattr(journeys, role)()
+    elapsed = time.perf_counter() - started
+
+    steps = summarise(recorder)
+    print(f'{sum(step["count"] for step in steps.values()):,} requests in {elapsed:.1f} s '
+          f'({dialect}, {args.iterations} journeys per role)')
+    print(f'{"step":<32} {"p50":>9} {"p95":>9} {"p99":>9} {"queries":>8} {"max":>4} {"errors":>6}')
+    for step, result in steps.items():
+        print(f'{step:<32} {result["p50_ms"]:>7.2f}ms {result["p95_ms"]:>7.2f}ms {result["p99_ms"]:>7.2f}ms '
+              f'{result["queries_mean"]:>8.1f} {result["queries_max"]:>4} {result["errors"]:>6}')
+
+    results = {
+        'meta': {'revision': git_revision(), 'database': dialect, 'python': platform.python_version(),
+                 'iterations': args.iterations, 'roles': roles, 'seed': args.seed,
+                 'rows': {name: count for name, count in journeys.counts.items()}},
+        'steps': steps,
+    }
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    failures = sum(result['errors'] for result in steps.values())
+    if args.compare:
+        with open(args.compare) as baseline:
+            failures += compare(steps, json.load(baseline), args.tolerance)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark how fast a fresh worker process can serve its first request.
+
+Each run starts a new Python process, as a gunicorn worker or a CLI command
+would, and times:
+
+* import: importing the app module (Flask, SQLAlchemy and every app module)
+* create_app: building and configuring the app
+* first request: GET /login, which compiles its templates
+* first query: a logged-in donor's dashboard, which opens the first
+  database connection
+
+"process" is the wall time the parent saw, interpreter start included.
+Before timing, one extra process imports the app and calls create_app()
+against a database path that does not exist. The check fails if that
+creates the file, since a worker should not touch the database until a
+request needs it. --budget-ms fails the run if the median time from process
+start to the first query is slower.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app as application
+imported = time.perf_counter()
+flask_app = application.create_app({'WTF_CSRF_ENABLED': False})
+created = time.perf_counter()
+if sys.argv[2] == 'probe':
+    sys.exit(0)
+client = flask_app.test_client()
+assert client.get('/login').status_code == 200
+first_request = time.perf_counter()
+with client.session_transaction() as session:
+    session['user_id'] = int(sys.argv[2])
+assert client.get('/donor/dashboard').status_code == 200
+first_query = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first request': first_request - created, 'first query': first_query - first_request}))
+'''
+
+PHASES = ['import', 'create_app', 'first request', 'first query', 'process']
+
+
+def child_env(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, NOTIFICATION_WORKER_MODE='external',
+               REQUEST_SWEEPER_MODE='external', LOG_LEVEL='WARNING')
+    env.pop('PYTHONPATH', None)
+    return env
+
+
+def seed(database_url):
+    """A scratch database holding one donor; returns the donor's user id"""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from extensions import db
+    from models import DonorProfile, User
+
+    app = create_app({'NOTIFICATION_WORKER_MODE': 'external', 'REQUEST_SWEEPER_MODE': 'external'})
+    with app.app_context():
+        db.create_all()
+        user = User(username='donor1', email='donor1@example.com', role='donor', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(DonorProfile(user_id=user.id, full_name='Donor One', blood_type='O+', phone='9999999999',
+                                    address='1 Main Road', city='Chennai', state='Tamil Nadu', zip_code='600001',
+                                    date_of_birth=date(1990, 1, 1), is_available=True))
+        db.session.commit()
+        return user.id
+
+
+def untouched_by_startup(scratch):
+    """True if importing the app and calling create_app() leaves a missing database missing"""
+    path = os.path.join(scratch, 'untouched.db')
+    subprocess.run([sys.executable, '-c', CHILD, ROOT, 'probe'], env=child_env(f'sqlite:///{path}'),
+                   cwd=scratch, check=True)
+    return not os.path.exists(path)
+
+
+def run_once(database_url, user_id, scratch):
+    began = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, ROOT, str(user_id)], env=child_env(database_url),
+                            cwd=scratch, check=True, capture_output=True, text=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - began
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes to time')
+    parser.add_argument('--budget-ms', type=float, help='fail if the median process time exceeds this')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    untouched = untouched_by_startup(scratch)
+    database_url = 'sqlite:///' + os.path.join(scratch, 'startup.db')
+    user_id = seed(database_url)
+    runs = [run_once(database_url, user_id, scratch) for _ in range(args.runs)]
+
+    print(f'{args.runs} fresh processes')
+    print(f'{"phase":<15} {"median":>9} {"min":>9} {"max":>9}')
+    for phase in PHASES:
+        values = [run[phase] * 1000 for run in runs]
+        print(f'{phase:<15} {statistics.median(values):7.1f}ms {min(values):7.1f}ms {max(values):7.1f}ms')
+
+    median_process = statistics.median(run['process'] for run in runs) * 1000
+    checks = [('startup leaves the database alone', untouched,
+               'no database file created' if untouched else 'import or create_app() created the database')]
+    if args.budget_ms is not None:
+        checks.append(('within budget', median_process <= args.budget_ms,
+                       f'median {median_process:.0f} ms, budget {args.budget_ms:.0f} ms'))
+    for name, ok, detail in checks:
+        print(f'{"ok " if ok else "FAIL"} {name:<34} {detail}')
+    sys.exit(0 if all(ok for _, ok, _ in checks) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Check that admin exports stream in flat memory.
+
+Seeds N donors with profiles into a scratch SQLite database (or DATABASE_URL
+if set), then pulls the CSV and NDJSON donor exports through the Flask test
+client chunk by chunk, sampling the process's resident memory as it goes.
+Fails if RSS grows by more than the ceiling during either export, if a
+row goes missing, or if the CSV leaves a formula unescaped or escapes a
+phone number.
+
+    python benchmarks/check_export_memory.py                  # 1M donors, 64 MB ceiling
+    python benchmarks/check_export_memory.py --donors 200000 --ceiling-mb 32
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'exports.db'))
+os.environ.setdefault('SESSION_SECRET', 'export-check-secret')
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import insert  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import DonorProfile, User  # noqa: E402
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+# The first donor's name must come out escaped, and every phone number untouched
+FORMULA_NAME = '=HYPERLINK("http://example.com")'
+PHONE = '+91 99999 99999'
+
+
+def seed(donors, batch=50000):
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [{'id': 1, 'username': 'admin1', 'email': 'admin1@example.com',
+                                       'password_hash': 'x', 'role': 'admin', 'created_at': now,
+                                       'is_active': True, 'unread_notifications': 0}])
+    for start in range(2, donors + 2, batch):
+        ids = range(start, min(start + batch, donors + 2))
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x',
+             'role': 'donor', 'created_at': now, 'is_active': True, 'unread_notifications': 0}
+            for i in ids
+        ])
+        db.session.execute(insert(DonorProfile), [
+            {'user_id': i, 'full_name': FORMULA_NAME if i == 2 else f'Donor {i}', 'blood_type': BLOOD_TYPES[i % 8],
+             'phone': PHONE,
+             'address': f'{i} Main Road', 'city': 'Chennai', 'state': 'Tamil Nadu', 'zip_code': '600001',
+             'date_of_birth': date(1990, 1, 1), 'last_donation_date': date.today() - timedelta(days=i % 365),
+             'next_eligible_date': date.today() + timedelta(days=56 - i % 365), 'is_available': True,
+             'updated_at': now}
+            for i in ids
+        ])
+        db.session.commit()
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def export(client, fmt):
+    """Stream one export; returns (data lines, bytes, seconds, peak RSS growth in MB, first chunks)"""
+    gc.collect()
+    baseline = peak = rss_mb()
+    lines = size = 0
+    head = b''
+    started = time.perf_counter()
+    response = client.get(f'/admin/donors/export.{fmt}', buffered=False)
+    assert response.status_code == 200, response.status_code
+    for chunks, chunk in enumerate(response.response):
+        lines += chunk.count(b'\n')
+        size += len(chunk)
+        if chunks < 2:
+            head += chunk
+        if chunks % 20 == 0:
+            peak = max(peak, rss_mb())
+    response.close()
+    peak = max(peak, rss_mb())
+    return lines, size, time.perf_counter() - started, peak - baseline, head
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=1_000_000)
+    parser.add_argument('--ceiling-mb', type=float, default=64)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        seed(args.donors)
+        print(f'seeded {args.donors:,} donors in {time.perf_counter() - started:.1f} s')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update({'user_id': 1, 'username': 'admin1', 'role': 'admin'})
+
+    ok = True
+    for fmt, header_lines in (('csv', 1), ('ndjson', 0)):
+        lines, size, elapsed, growth, head = export(client, fmt)
+        if fmt == 'csv':
+            first_row = head.decode().splitlines()[1]
+            escaped = f"'{FORMULA_NAME}".replace('"', '""') in first_row and f',{PHONE},' in first_row
+            ok = ok and escaped
+            print(f'csv formula escaping: {"ok" if escaped else "FAIL"}  {first_row[:90]}')
+        rows = lines - header_lines
+        passed = rows == args.donors and growth <= args.ceiling_mb
+        ok = ok and passed
+        print(f'{fmt:<7} {rows:>10,} rows  {size / 2**20:>7.0f} MB  {elapsed:>6.1f} s  '
+              f'RSS +{growth:.1f} MB (ceiling {args.ceiling_mb:.0f} MB) -> {"ok" if passed else "FAIL"}')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
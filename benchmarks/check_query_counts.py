@@ -0,0 +1,121 @@
+"""Fail if a page issues more SQL queries than its budget.
+
+Seeds a scratch SQLite database with a busy hospital (ten requests with
+many donor responses each), renders each page through the Flask test client
+and compares the number of statements executed with a fixed upper bound.
+Query counts must not grow with the number of rows, so an N+1 regression
+shows up here as a failure.
+
+    python benchmarks/check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'queries.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import event  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import BloodRequest, BloodRequestResponse, DonorProfile, HospitalProfile, User  # noqa: E402
+
+PASSWORD = 'benchmark'
+REQUESTS = 10
+RESPONSES_PER_REQUEST = 25
+
+# (username, path, maximum statements)
+PAGE_BUDGETS = [
+    ('hospital1', '/hospital/dashboard', 5),
+]
+
+
+def make_user(username, role):
+    user = User(username=username, email=f'{username}@example.com', role=role)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def seed():
+    hospital_user = make_user('hospital1', 'hospital')
+    hospital = HospitalProfile(user_id=hospital_user.id, hospital_name='City Hospital', license_number='L-1',
+                               contact_person='Dr. Rao', phone='9999999999', address='1 Main Road',
+                               city='Chennai', state='Tamil Nadu', zip_code='600001')
+    db.session.add(hospital)
+
+    donors = []
+    for i in range(RESPONSES_PER_REQUEST):
+        user = make_user(f'donor{i}', 'donor')
+        donor = DonorProfile(user_id=user.id, full_name=f'Donor {i}', blood_type='O-', phone='9999999999',
+                             address='1 Main Road', city='Chennai', state='Tamil Nadu', zip_code='600001',
+                             date_of_birth=date(1990, 1, 1), is_available=True)
+        db.session.add(donor)
+        donors.append(donor)
+    db.session.flush()
+
+    for i in range(REQUESTS):
+        blood_request = BloodRequest(hospital_id=hospital.id, blood_type='O-', units_needed=2,
+                                     urgency_level='high', description='Surgery',
+                                     needed_by=datetime.utcnow() + timedelta(days=3))
+        db.session.add(blood_request)
+        db.session.flush()
+        for j, donor in enumerate(donors):
+            db.session.add(BloodRequestResponse(request_id=blood_request.id, donor_id=donor.id,
+                                                status='accepted' if j % 2 else 'declined'))
+        blood_request.accepted_count = RESPONSES_PER_REQUEST // 2
+        blood_request.declined_count = RESPONSES_PER_REQUEST - RESPONSES_PER_REQUEST // 2
+    db.session.commit()
+
+
+def count_queries(client, path):
+    statements = []
+    request_thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Background threads (notification workers, push broker) are not part of the page
+        if threading.get_ident() == request_thread:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.get(path)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, (path, response.status_code)
+    return statements
+
+
+def main():
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        seed()
+    # The push broker reads its starting watermarks once per process; keep that out of page counts
+    app.extensions['push_broker'].start()
+
+    failures = 0
+    for username, path, budget in PAGE_BUDGETS:
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        statements = count_queries(client, path)
+        ok = len(statements) <= budget
+        failures += not ok
+        print(f'{"ok " if ok else "FAIL"} {path:<30} {len(statements):>3} queries (budget {budget})')
+        if not ok:
+            for statement in statements:
+                print('     ' + ' '.join(statement.split())[:150])
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Fail if parallel responders can duplicate a response or skew the counters.
+
+Seeds a scratch SQLite database (or uses DATABASE_URL) with one hospital,
+one active blood request and --donors donors. Every donor then answers the
+request with --clicks simultaneous GETs, as a double click or a retried
+request would, all released together from a barrier. Afterwards each donor
+must have exactly one response, every click must have been answered with a
+redirect, and the request's accepted_count and declined_count must equal a
+fresh count of its responses.
+
+    python benchmarks/check_response_races.py
+    python benchmarks/check_response_races.py --donors 50 --clicks 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'races.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+from sqlalchemy import func  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import BloodRequest, BloodRequestResponse, DonorProfile, HospitalProfile, User  # noqa: E402
+
+PASSWORD = 'benchmark'
+
+
+def seed(donor_count):
+    """One request and ``donor_count`` donors; returns the request id"""
+    password_hash = generate_password_hash(PASSWORD)
+    hospital_user = User(username='racehospital', email='racehospital@example.com', role='hospital',
+                         password_hash=password_hash)
+    db.session.add(hospital_user)
+    db.session.flush()
+    hospital = HospitalProfile(user_id=hospital_user.id, hospital_name='Race Hospital', license_number='L-R',
+                               contact_person='Dr. Rao', phone='9999999999', address='1 Main Road',
+                               city='Chennai', state='Tamil Nadu', zip_code='600001')
+    db.session.add(hospital)
+    db.session.flush()
+    for i in range(donor_count):
+        user = User(username=f'racedonor{i}', email=f'racedonor{i}@example.com', role='donor',
+                    password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(DonorProfile(user_id=user.id, full_name=f'Race Donor {i}', blood_type='O-',
+                                    phone='9999999999', address='1 Main Road', city='Chennai',
+                                    state='Tamil Nadu', zip_code='600001', date_of_birth=date(1990, 1, 1),
+                                    is_available=True))
+    blood_request = BloodRequest(hospital_id=hospital.id, blood_type='O-', units_needed=2, urgency_level='high',
+                                 description='Race check', needed_by=datetime.utcnow() + timedelta(days=3))
+    db.session.add(blood_request)
+    db.session.commit()
+    return blood_request.id
+
+
+def respond_in_parallel(request_id, donor_count, clicks):
+    """Fire every donor's clicks at once; returns {status code: count}"""
+    clients = []
+    for i in range(donor_count):
+        client = app.test_client()
+        client.post('/login', data={'username': f'racedonor{i}', 'password': PASSWORD})
+        action = 'accept' if i % 2 == 0 else 'decline'
+        clients.extend((client, action) for _ in range(clicks))
+
+    barrier = threading.Barrier(len(clients))
+    statuses = {}
+    lock = threading.Lock()
+
+    def click(client, action):
+        barrier.wait()
+        try:
+            status = client.get(f'/respond-to-request/{request_id}/{action}').status_code
+        except Exception as exc:  # a crash counts against the check, not the harness
+            status = type(exc).__name__
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=click, args=pair) for pair in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--donors', type=int, default=30, help='donors answering the request')
+    parser.add_argument('--clicks', type=int, default=3, help='simultaneous requests per donor')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        request_id = seed(args.donors)
+    statuses = respond_in_parallel(request_id, args.donors, args.clicks)
+
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(BloodRequestResponse.donor_id, BloodRequestResponse.status)
+            .where(BloodRequestResponse.request_id == request_id)).all()
+        blood_request = db.session.get(BloodRequest, request_id)
+        counters = (blood_request.accepted_count, blood_request.declined_count)
+        duplicates = db.session.scalar(
+            db.select(func.count()).select_from(
+                db.select(BloodRequestResponse.donor_id)
+                .where(BloodRequestResponse.request_id == request_id)
+                .group_by(BloodRequestResponse.donor_id)
+                .having(func.count() > 1).subquery()))
+    counted = (sum(status == 'accepted' for _, status in rows), sum(status == 'declined' for _, status in rows))
+
+    checks = [
+        ('every click redirected', statuses == {302: args.donors * args.clicks}, statuses),
+        ('one response per donor', len(rows) == args.donors and not duplicates,
+         f'{len(rows)} responses, {duplicates} donor(s) with duplicates'),
+        ('counters match responses', counters == counted, f'counters {counters}, counted {counted}'),
+    ]
+    for name, ok, detail in checks:
+        print(f'{"ok " if ok else "FAIL"} {name:<28} {detail}')
+    sys.exit(0 if all(ok for _, ok, _ in checks) else 1)
+
+
+if __name__ == '__main__':
+    main()
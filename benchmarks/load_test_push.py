@@ -0,0 +1,177 @@
+"""Load test the server push channel with thousands of open subscribers.
+
+Seeds N donor users into a scratch SQLite database, starts gunicorn with one
+gevent worker, opens one Server-Sent Events connection per user and then
+commits one notification for every user in a single fan-out. Reports how long
+it took to connect everyone, the delivery latency of the notification across
+all subscribers, and the worker's resident memory.
+
+Needs gevent (``pip install gevent``).
+
+    python benchmarks/load_test_push.py               # 5k subscribers
+    python benchmarks/load_test_push.py 2000 --port 5055
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import resource  # noqa: E402
+import socket  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'push.db'))
+os.environ.setdefault('SESSION_SECRET', 'load-test-secret')
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+import gevent  # noqa: E402
+from sqlalchemy import insert, update  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import Notification, User  # noqa: E402
+
+
+def seed(count):
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {'id': i, 'username': f'donor{i}', 'email': f'donor{i}@example.com', 'password_hash': 'x',
+         'role': 'donor', 'created_at': now, 'is_active': True, 'unread_notifications': 0}
+        for i in range(1, count + 1)
+    ])
+    db.session.commit()
+
+
+def fan_out(count):
+    """One notification per user, committed together like a fan-out chunk"""
+    now = datetime.utcnow()
+    db.session.execute(insert(Notification), [
+        {'user_id': i, 'title': 'Blood Request - O-', 'message': 'Load test', 'notification_type': 'blood_request',
+         'is_read': False, 'created_at': now}
+        for i in range(1, count + 1)
+    ])
+    db.session.execute(update(User).values(unread_notifications=User.unread_notifications + 1))
+    db.session.commit()
+
+
+def session_cookie(user_id):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'user_id': user_id, 'username': f'donor{user_id}', 'role': 'donor'})
+
+
+class Subscriber:
+    def __init__(self, port, user_id):
+        self.port = port
+        self.user_id = user_id
+        self.sock = None
+        self.buffer = b''
+        self.connected_at = None
+        self.received_at = None
+
+    def connect(self):
+        self.sock = socket.create_connection(('127.0.0.1', self.port))
+        self.sock.sendall((
+            'GET /events/stream HTTP/1.1\r\n'
+            'Host: localhost\r\n'
+            'Accept: text/event-stream\r\n'
+            f'Cookie: session={session_cookie(self.user_id)}\r\n\r\n'
+        ).encode())
+        self.read_until(b'event: ready')
+        self.connected_at = time.perf_counter()
+
+    def read_until(self, marker):
+        while marker not in self.buffer:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError(f'subscriber {self.user_id} disconnected')
+            self.buffer += chunk
+        self.buffer = self.buffer[self.buffer.index(marker) + len(marker):]
+
+    def wait_for_notification(self):
+        self.read_until(b'event: notification')
+        self.received_at = time.perf_counter()
+
+
+def start_server(port, connections):
+    hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+    command = [sys.executable, '-m', 'gunicorn', '-k', 'gevent', '-w', '1',
+               '--worker-connections', str(connections + 100), '--backlog', '4096', '--graceful-timeout', '5',
+               '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'main:app']
+    server = subprocess.Popen(command, cwd=ROOT, env=os.environ.copy(),
+                              preexec_fn=lambda: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard)))
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def worker_rss_mb(server):
+    children = subprocess.run(['pgrep', '-P', str(server.pid)], capture_output=True, text=True).stdout.split()
+    total = 0
+    for pid in children or [str(server.pid)]:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1])
+    return total / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('subscribers', nargs='?', type=int, default=5000)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--connect-batch', type=int, default=250)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    hard = resource.getrlimit(resource.RLIMIT_NOFILE)[1]
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with app.app_context():
+        db.create_all()
+        seed(args.subscribers)
+
+    server = start_server(args.port, args.subscribers)
+    subscribers = [Subscriber(args.port, i) for i in range(1, args.subscribers + 1)]
+    try:
+        started = time.perf_counter()
+        for start in range(0, len(subscribers), args.connect_batch):
+            gevent.joinall([gevent.spawn(s.connect) for s in subscribers[start:start + args.connect_batch]],
+                           raise_error=True)
+        print(f'{len(subscribers):,} subscribers connected in {time.perf_counter() - started:.1f} s, '
+              f'worker RSS {worker_rss_mb(server):.0f} MB')
+
+        waiters = [gevent.spawn(s.wait_for_notification) for s in subscribers]
+        with app.app_context():
+            fan_out(args.subscribers)
+        committed = time.perf_counter()
+        gevent.joinall(waiters, timeout=60, raise_error=True)
+
+        latencies = sorted((s.received_at - committed) * 1000 for s in subscribers if s.received_at)
+        print(f'{len(latencies):,}/{len(subscribers):,} received the notification')
+        print(f'delivery latency after commit: p50 {statistics.median(latencies):.0f} ms, '
+              f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.0f} ms, max {latencies[-1]:.0f} ms')
+        print(f'worker RSS with all streams open: {worker_rss_mb(server):.0f} MB')
+    finally:
+        for subscriber in subscribers:
+            if subscriber.sock is not None:
+                subscriber.sock.close()
+        server.terminate()
+        server.wait(10)
+
+
+if __name__ == '__main__':
+    main()
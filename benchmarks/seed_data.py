@@ -0,0 +1,268 @@
+"""Seed a database with production-sized synthetic data.
+
+At --scale 1 this writes 1M donors, 5k hospitals, 1k organizations, 500k
+blood requests, 1M responses, 2M donations, 20k donation events and 5M
+notifications. Rows go in with multi-row Core inserts in batches and
+consistent foreign keys. Every account has the password ``benchmark`` and a
+predictable username (donor1, hospital1, org1, admin1), so load drivers can
+log in as anyone. Donor PIN codes have centroids, so searches near a PIN
+work too.
+
+Used by bench_routes.py. It can also fill a database you keep between runs:
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed_data.py --scale 0.1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'seed.db'))
+os.environ['NOTIFICATION_WORKER_MODE'] = 'external'
+
+import logging  # noqa: E402
+
+import numpy as np  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from extensions import db  # noqa: E402
+from main import app  # noqa: E402
+from models import (DONATION_INTERVAL_DAYS, BloodInventory, BloodRequest, BloodRequestResponse,  # noqa: E402
+                    Donation, DonationEvent, DonorProfile, HospitalProfile, Notification,
+                    OrganizationProfile, PinCode, User)
+
+PASSWORD = 'benchmark'
+# Row counts at --scale 1
+VOLUMES = {
+    'donors': 1_000_000,
+    'hospitals': 5_000,
+    'organizations': 1_000,
+    'blood_requests': 500_000,
+    'responses': 1_000_000,
+    'donations': 2_000_000,
+    'events': 20_000,
+    'notifications': 5_000_000,
+}
+BATCH = 20_000
+
+BLOOD_TYPES = ['O+', 'B+', 'A+', 'AB+', 'O-', 'B-', 'A-', 'AB-']
+# Roughly the Indian blood group distribution, so rare types stay rare
+BLOOD_TYPE_SHARES = [0.37, 0.32, 0.22, 0.07, 0.008, 0.007, 0.004, 0.001]
+# (city, state, PIN prefix, latitude, longitude)
+CITIES = [('Chennai', 'Tamil Nadu', 600, 13.08, 80.27), ('Coimbatore', 'Tamil Nadu', 641, 11.02, 76.96),
+          ('Mumbai', 'Maharashtra', 400, 19.08, 72.88), ('Pune', 'Maharashtra', 411, 18.52, 73.86),
+          ('Bengaluru', 'Karnataka', 560, 12.97, 77.59), ('New Delhi', 'Delhi', 110, 28.61, 77.21),
+          ('Kolkata', 'West Bengal', 700, 22.57, 88.36), ('Hyderabad', 'Telangana', 500, 17.39, 78.49),
+          ('Ahmedabad', 'Gujarat', 380, 23.02, 72.57), ('Jaipur', 'Rajasthan', 302, 26.91, 75.79),
+          ('Lucknow', 'Uttar Pradesh', 226, 26.85, 80.95), ('Kochi', 'Kerala', 682, 9.93, 76.27)]
+PINS_PER_CITY = 100
+FIRST_NAMES = ['Priya', 'Arun', 'Lakshmi', 'Rahul', 'Anjali', 'Vikram', 'Meena', 'Suresh', 'Kavya', 'Imran']
+LAST_NAMES = ['Raman', 'Kumar', 'Sharma', 'Iyer', 'Reddy', 'Khan', 'Nair', 'Patel', 'Das', 'Singh']
+URGENCY_LEVELS = ['low', 'medium', 'high', 'critical']
+
+
+def volumes(scale):
+    return {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+
+
+def pin(city_index, offset):
+    return f'{CITIES[city_index][2]}{offset + 1:03d}'
+
+
+def _insert(model, rows):
+    """Insert an iterable of row dicts in BATCH-sized multi-row statements"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+
+
+def seed(scale=0.01, seed=7, echo=print):
+    """Fill an empty database; returns the row counts used"""
+    counts = volumes(scale)
+    rng = np.random.default_rng(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    today = now.date()
+    password_hash = generate_password_hash(PASSWORD)
+    donors, hospitals, organizations = counts['donors'], counts['hospitals'], counts['organizations']
+
+    def step(label, fn):
+        started = time.perf_counter()
+        fn()
+        echo(f'  {label:<16} {time.perf_counter() - started:>7.1f} s')
+
+    # Notifications are drawn first so each user's unread counter can be written with the user
+    notified_user = rng.integers(1, donors + hospitals + 1, counts['notifications'])
+    notification_unread = rng.random(counts['notifications']) < 0.2
+    unread = np.bincount(notified_user[notification_unread], minlength=donors + hospitals + organizations + 2)
+    # Likewise responses, for each request's accepted and declined counters; a donor answers a request once
+    pairs = rng.choice(counts['blood_requests'] * donors, counts['responses'], replace=False)
+    response_request, response_donor = pairs // donors + 1, pairs % donors + 1
+    response_accepted = np.arange(counts['responses']) % 2 == 0
+    accepted = np.bincount(response_request[response_accepted], minlength=counts['blood_requests'] + 1)
+    declined = np.bincount(response_request[~response_accepted], minlength=counts['blood_requests'] + 1)
+
+    def users():
+        roles = [('donor', 'donor', donors), ('hospital', 'hospital', hospitals),
+                 ('organization', 'org', organizations), ('admin', 'admin', 1)]
+        created = now - timedelta(days=730)
+        user_id = 0
+        for role, prefix, count in roles:
+            for i in range(1, count + 1):
+                user_id += 1
+                yield {'id': user_id, 'username': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com',
+                       'password_hash': password_hash, 'role': role,
+                       # One donor in fifty has been deactivated
+                       'is_active': role != 'donor' or i % 50 != 0,
+                       'created_at': created + timedelta(minutes=user_id % 1_000_000),
+                       'unread_notifications': int(unread[user_id])}
+
+    def pin_codes():
+        for c, (_, state, _, latitude, longitude) in enumerate(CITIES):
+            offsets = rng.normal(0, 0.12, (PINS_PER_CITY, 2))
+            for p in range(PINS_PER_CITY):
+                yield {'pin': pin(c, p), 'latitude': latitude + offsets[p, 0], 'longitude': longitude + offsets[p, 1],
+                       'district': CITIES[c][0], 'state': state}
+
+    def donor_profiles():
+        cities = rng.integers(0, len(CITIES), donors).tolist()
+        pins = rng.integers(0, PINS_PER_CITY, donors).tolist()
+        types = rng.choice(len(BLOOD_TYPES), donors, p=BLOOD_TYPE_SHARES).tolist()
+        last_donated = rng.integers(-1, 720, donors).tolist()
+        names = rng.integers(0, len(FIRST_NAMES) * len(LAST_NAMES), donors).tolist()
+        for i in range(donors):
+            city, state = CITIES[cities[i]][:2]
+            last = today - timedelta(days=last_donated[i]) if last_donated[i] >= 0 else None
+            first_name, last_name = divmod(names[i], len(LAST_NAMES))
+            yield {'id': i + 1, 'user_id': i + 1,
+                   'full_name': f'{FIRST_NAMES[first_name]} {LAST_NAMES[last_name]} {i + 1}',
+                   'blood_type': BLOOD_TYPES[types[i]], 'phone': '9999999999', 'address': f'{i + 1} Main Road',
+                   'city': city, 'state': state, 'zip_code': pin(cities[i], pins[i]),
+                   'date_of_birth': date(1970, 1, 1) + timedelta(days=(i * 37) % 12000),
+                   'last_donation_date': last,
+                   'next_eligible_date': last + timedelta(days=DONATION_INTERVAL_DAYS) if last else None,
+                   'is_available': i % 10 != 0, 'updated_at': now}
+
+    def hospital_profiles():
+        for i in range(hospitals):
+            city, state = CITIES[i % len(CITIES)][:2]
+            yield {'id': i + 1, 'user_id': donors + i + 1, 'hospital_name': f'{city} Hospital {i + 1}',
+                   'license_number': f'H-{i + 1}', 'contact_person': 'Dr. Rao', 'phone': '9999999999',
+                   'address': f'{i + 1} Hospital Road', 'city': city, 'state': state,
+                   'zip_code': pin(i % len(CITIES), i % PINS_PER_CITY)}
+
+    def organization_profiles():
+        for i in range(organizations):
+            city, state = CITIES[i % len(CITIES)][:2]
+            yield {'id': i + 1, 'user_id': donors + hospitals + i + 1, 'organization_name': f'{city} Blood Bank {i + 1}',
+                   'registration_number': f'O-{i + 1}', 'contact_person': 'Ms. Iyer', 'phone': '9999999999',
+                   'address': f'{i + 1} Camp Road', 'city': city, 'state': state,
+                   'zip_code': pin(i % len(CITIES), i % PINS_PER_CITY)}
+
+    def blood_requests():
+        count = counts['blood_requests']
+        hospital_ids = rng.integers(1, hospitals + 1, count).tolist()
+        types = rng.choice(len(BLOOD_TYPES), count, p=BLOOD_TYPE_SHARES).tolist()
+        ages = np.sort(rng.integers(0, 365 * 24 * 60, count))[::-1].tolist()
+        for i in range(count):
+            requested_at = now - timedelta(minutes=ages[i])
+            # Requests from the last two weeks are still open
+            status = 'active' if ages[i] < 14 * 24 * 60 else ('fulfilled' if i % 5 else 'cancelled')
+            yield {'id': i + 1, 'hospital_id': hospital_ids[i], 'blood_type': BLOOD_TYPES[types[i]],
+                   'units_needed': 1 + i % 4, 'urgency_level': URGENCY_LEVELS[i % 4], 'description': 'Surgery',
+                   'status': status, 'requested_at': requested_at, 'needed_by': requested_at + timedelta(days=7),
+                   'accepted_count': int(accepted[i + 1]), 'declined_count': int(declined[i + 1])}
+
+    def responses():
+        request_ids, donor_ids = response_request.tolist(), response_donor.tolist()
+        for i in range(counts['responses']):
+            yield {'request_id': request_ids[i], 'donor_id': donor_ids[i],
+                   'status': 'accepted' if response_accepted[i] else 'declined',
+                   'response_date': now - timedelta(minutes=i % 500_000)}
+
+    def donations():
+        count = counts['donations']
+        donor_ids = rng.integers(1, donors + 1, count).tolist()
+        ages = rng.integers(0, 3 * 365, count).tolist()
+        for i in range(count):
+            yield {'donor_id': donor_ids[i], 'donation_date': today - timedelta(days=ages[i]),
+                   'blood_type': BLOOD_TYPES[i % len(BLOOD_TYPES)], 'units_donated': 1,
+                   'location': CITIES[i % len(CITIES)][0]}
+
+    def events():
+        count = counts['events']
+        organization_ids = rng.integers(1, organizations + 1, count).tolist()
+        for i in range(count):
+            event_date = today + timedelta(days=i % 365 - 270)
+            city, state = CITIES[i % len(CITIES)][:2]
+            yield {'organization_id': organization_ids[i], 'event_name': f'Donation Camp {i + 1}',
+                   'description': 'Walk-in blood donation camp', 'event_date': event_date,
+                   'start_time': clock(9), 'end_time': clock(17), 'location': 'Community Hall',
+                   'address': f'{i + 1} Camp Road', 'city': city, 'state': state, 'max_participants': 100,
+                   'status': 'upcoming' if event_date >= today else 'completed'}
+
+    def inventory():
+        for c, (city, _, _, _, _) in enumerate(CITIES):
+            for t, blood_type in enumerate(BLOOD_TYPES):
+                yield {'blood_type': blood_type, 'units_available': (c * 7 + t * 13) % 60,
+                       'location': f'{city} Blood Bank', 'last_updated': now}
+
+    def notifications():
+        user_ids = notified_user.tolist()
+        unread_flags = notification_unread.tolist()
+        for i in range(counts['notifications']):
+            yield {'user_id': user_ids[i], 'title': 'Blood Request - O-',
+                   'message': 'A hospital near you needs blood.', 'notification_type': 'blood_request',
+                   'is_read': not unread_flags[i],
+                   'created_at': now - timedelta(seconds=(counts['notifications'] - i) * 5)}
+
+    step('users', lambda: _insert(User, users()))
+    step('pin codes', lambda: _insert(PinCode, pin_codes()))
+    step('donors', lambda: _insert(DonorProfile, donor_profiles()))
+    step('hospitals', lambda: _insert(HospitalProfile, hospital_profiles()))
+    step('organizations', lambda: _insert(OrganizationProfile, organization_profiles()))
+    step('blood requests', lambda: _insert(BloodRequest, blood_requests()))
+    step('responses', lambda: _insert(BloodRequestResponse, responses()))
+    step('donations', lambda: _insert(Donation, donations()))
+    step('events', lambda: _insert(DonationEvent, events()))
+    step('inventory', lambda: _insert(BloodInventory, inventory()))
+    step('notifications', lambda: _insert(Notification, notifications()))
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return counts
+
+
+def is_seeded():
+    return bool(db.session.scalar(db.select(func.count()).select_from(User)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.01, help='fraction of the production volumes (default 0.01)')
+    parser.add_argument('--seed', type=int, default=7, help='random seed')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        if is_seeded():
+            sys.exit('The database already has users; seed an empty one.')
+        print(f'seeding {db.engine.url.render_as_string(hide_password=True)} at scale {args.scale}')
+        started = time.perf_counter()
+        counts = seed(args.scale, args.seed)
+        print(', '.join(f'{count:,} {name}' for name, count in counts.items()))
+        print(f'done in {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
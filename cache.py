@@ -0,0 +1,130 @@
+"""Small TTL caches for expensive read models.
+
+``TTLCache`` lives in one process. ``RedisCache`` keeps the same interface in
+a Redis server, so every gunicorn worker reads and invalidates one copy;
+``from_url`` picks between them from a ``CACHE_URL`` setting. Both count hits
+and misses in the process that asks.
+"""
+import logging
+import pickle
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def delete_prefix(self, prefix):
+        """Drop every entry whose key starts with ``prefix``"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def counters(self):
+        """Hits, misses, hit rate and entry count since the process started"""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': self.size(),
+                'hit_rate': self.hits / lookups if lookups else None}
+
+
+class RedisCache(TTLCache):
+    """``TTLCache`` whose entries live in Redis under ``namespace``, shared by every worker.
+
+    Values are pickled, so cache only plain data. If Redis is unreachable a
+    lookup counts as a miss and writes are skipped, so callers fall back to
+    the database instead of failing.
+    """
+
+    def __init__(self, url, ttl=300, namespace='cache:'):
+        import redis  # only needed when a shared cache is configured
+
+        super().__init__(ttl)
+        self.namespace = namespace
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+
+    def get(self, key, default=None):
+        try:
+            raw = self._client.get(self.namespace + key)
+        except self._errors as exc:
+            logger.warning('Cache read of %s failed: %s', key, exc)
+            raw = None
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        milliseconds = max(1, int((self.ttl if ttl is None else ttl) * 1000))
+        try:
+            self._client.set(self.namespace + key, pickle.dumps(value), px=milliseconds)
+        except self._errors as exc:
+            logger.warning('Cache write of %s failed: %s', key, exc)
+
+    def delete_prefix(self, prefix):
+        pattern = self.namespace + ''.join('\\' + c if c in '*?[]\\' else c for c in prefix) + '*'
+        try:
+            keys = list(self._client.scan_iter(match=pattern, count=500))
+            if keys:
+                self._client.delete(*keys)
+        except self._errors as exc:
+            # Entries left behind still expire after their TTL
+            logger.warning('Cache invalidation of %s* failed: %s', prefix, exc)
+
+    def clear(self):
+        self.delete_prefix('')
+
+    def size(self):
+        return None
+
+
+def from_url(url, ttl=300, namespace='cache:'):
+    """A ``RedisCache`` for a ``redis://`` or ``rediss://`` URL, else an in-process ``TTLCache``"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, ttl, namespace)
+    return TTLCache(ttl)
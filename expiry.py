@@ -0,0 +1,221 @@
+"""Retire blood requests whose deadline has passed.
+
+A request stays 'active' until someone edits it, so without a sweep the
+active set read by the dashboards, stats and matching only grows. The
+sweeper moves requests whose ``needed_by`` is more than
+``REQUEST_EXPIRY_GRACE_HOURS`` in the past to 'expired', ``batch_size`` rows
+per transaction, so it never holds long locks and the partial "active"
+indexes stay small. Blood stock the expired requests still hold is released
+in the same transaction, through the inventory ledger.
+
+In 'thread' mode (default) each web process runs a sweeper thread every
+``REQUEST_SWEEP_INTERVAL`` seconds. The process that sweeps keeps a
+``SchedulerLease`` row for a whole interval, so the others skip their turn
+and only one sweep runs per interval; the holder renews it, and if that
+process dies the lease lapses and another takes over. In 'external' mode run
+``flask expire-requests`` from cron instead.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from inventory import release_held, stock_cache
+from models import BloodRequest, SchedulerLease
+from stats import invalidate_tables
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_INTERVAL = 900
+DEFAULT_GRACE_HOURS = 24
+LEASE_NAME = 'expire-requests'
+
+
+def expire_requests(batch_size=DEFAULT_BATCH_SIZE, grace_hours=DEFAULT_GRACE_HOURS, dry_run=False):
+    """Move past-deadline active requests to 'expired', one batch per transaction.
+
+    Returns a summary with ``expired``, ``batches``, ``by_blood_type``,
+    ``units_released`` and ``seconds``. With ``dry_run`` nothing is changed
+    and ``expired`` is how many requests would be.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    overdue = db.select(BloodRequest.id, BloodRequest.blood_type).where(
+        BloodRequest.status == 'active', BloodRequest.needed_by < cutoff)
+    by_blood_type = Counter()
+    batches = 0
+    units_released = 0
+    if dry_run:
+        for _, blood_type in db.session.execute(overdue):
+            by_blood_type[blood_type] += 1
+    else:
+        while True:
+            # Walk the partial needed_by index; expired rows leave it, so each batch starts at the front
+            rows = db.session.execute(overdue.order_by(BloodRequest.needed_by, BloodRequest.id)
+                                      .limit(batch_size)).all()
+            if not rows:
+                break
+            try:
+                expired = db.session.execute(
+                    update(BloodRequest)
+                    .where(BloodRequest.id.in_([request_id for request_id, _ in rows]),
+                           BloodRequest.status == 'active')
+                    .values(status='expired')
+                    .returning(BloodRequest.id, BloodRequest.blood_type)
+                    .execution_options(synchronize_session=False)
+                ).all()
+                # No longer active, so nothing can reserve for them between the release and the commit
+                units_released += release_held([request_id for request_id, _ in expired])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            batches += 1
+            # Rows changed by someone else since the read are not counted
+            by_blood_type.update(blood_type for _, blood_type in expired)
+            if len(rows) < batch_size:
+                break
+        if units_released:
+            stock_cache.clear()
+        if batches:
+            # Bulk updates skip the flush hooks the stats cache listens to
+            invalidate_tables(BloodRequest.__tablename__)
+
+    summary = {'expired': sum(by_blood_type.values()), 'batches': batches,
+               'by_blood_type': dict(sorted(by_blood_type.items())), 'units_released': units_released,
+               'seconds': time.perf_counter() - started}
+    if summary['expired'] and not dry_run:
+        logger.info('Expired %d blood request(s) in %d batch(es), releasing %d held unit(s) (%.2f s): %s',
+                    summary['expired'], batches, units_released, summary['seconds'],
+                    ', '.join(f'{bt} {n}' for bt, n in summary['by_blood_type'].items()))
+    return summary
+
+
+def acquire_lease(name, holder, seconds):
+    """Take or renew the named lease for ``seconds``; False if another live holder has it"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    # Compare-and-set: only an expired lease, or our own, can be taken
+    taken = db.session.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == name,
+               db.or_(SchedulerLease.expires_at < now, SchedulerLease.holder == holder))
+        .values(holder=holder, expires_at=expires_at)
+    ).rowcount
+    db.session.commit()
+    if taken:
+        return True
+    try:
+        db.session.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # The lease exists and someone else holds it
+        db.session.rollback()
+        return False
+
+
+def release_lease(name, holder):
+    db.session.execute(update(SchedulerLease)
+                       .where(SchedulerLease.name == name, SchedulerLease.holder == holder)
+                       .values(expires_at=datetime.utcnow()))
+    db.session.commit()
+
+
+class RequestSweeper:
+    """Thread that expires overdue requests every ``interval`` seconds while it holds the lease"""
+
+    def __init__(self, app, interval=DEFAULT_INTERVAL):
+        self.app = app
+        self.interval = interval
+        self.holder = f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-sweeper', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        # Waiting a jittered interval first keeps short-lived processes from sweeping
+        # and spreads workers that started together
+        while not self._stopping.wait(self.interval * random.uniform(0.9, 1.1)):
+            try:
+                with self.app.app_context():
+                    self.sweep()
+            except Exception:
+                logger.exception('Request expiry sweep failed')
+
+    def sweep(self):
+        """Run one sweep if this process can take the lease; returns the summary or None.
+
+        The lease is not released afterwards: it runs out one interval after
+        it was taken, so other processes waking up meanwhile skip their sweep.
+        """
+        if not acquire_lease(LEASE_NAME, self.holder, self.interval):
+            return None
+        return expire_requests(self.app.config['REQUEST_SWEEP_BATCH_SIZE'],
+                               self.app.config['REQUEST_EXPIRY_GRACE_HOURS'])
+
+
+def init_app(app):
+    """Configure the sweeper and register its CLI command.
+
+    ``REQUEST_SWEEPER_MODE`` is 'thread' (default) to sweep from the web
+    processes, or 'external' when cron runs ``flask expire-requests``.
+    """
+    app.config.setdefault('REQUEST_SWEEPER_MODE', os.environ.get('REQUEST_SWEEPER_MODE', 'thread'))
+    app.config.setdefault('REQUEST_SWEEP_INTERVAL', int(os.environ.get('REQUEST_SWEEP_INTERVAL', DEFAULT_INTERVAL)))
+    app.config.setdefault('REQUEST_SWEEP_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    app.config.setdefault('REQUEST_EXPIRY_GRACE_HOURS', DEFAULT_GRACE_HOURS)
+
+    if app.config['REQUEST_SWEEPER_MODE'] == 'thread':
+        sweeper = RequestSweeper(app, interval=app.config['REQUEST_SWEEP_INTERVAL'])
+        app.extensions['request_sweeper'] = sweeper
+        # Started by the first request, so it runs in each forked worker rather than a preloading master
+        app.before_request(sweeper.start)
+
+    @app.cli.command('expire-requests')
+    @click.option('--batch-size', default=None, type=int, help='Requests per transaction.')
+    @click.option('--grace-hours', default=None, type=float, help='Hours past needed_by before a request expires.')
+    @click.option('--dry-run', is_flag=True, help='Report what would expire without changing anything.')
+    def expire_requests_command(batch_size, grace_hours, dry_run):
+        """Move active blood requests past their deadline to 'expired'."""
+        holder = f'cli:{socket.gethostname()}:{os.getpid()}'
+        if not dry_run and not acquire_lease(LEASE_NAME, holder, app.config['REQUEST_SWEEP_INTERVAL']):
+            raise click.ClickException('Another process is sweeping; try again later.')
+        try:
+            summary = expire_requests(batch_size or app.config['REQUEST_SWEEP_BATCH_SIZE'],
+                                      app.config['REQUEST_EXPIRY_GRACE_HOURS'] if grace_hours is None else grace_hours,
+                                      dry_run=dry_run)
+        finally:
+            if not dry_run:
+                release_lease(LEASE_NAME, holder)
+        verb = 'Would expire' if dry_run else 'Expired'
+        click.echo(f'{verb} {summary["expired"]} blood request(s) in {summary["batches"]} batch(es) '
+                   f'({summary["seconds"]:.2f} s).')
+        if summary['units_released']:
+            click.echo(f'Released {summary["units_released"]} held unit(s) back to stock.')
+        for blood_type, count in summary['by_blood_type'].items():
+            click.echo(f'  {blood_type:<4} {count}')
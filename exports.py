@@ -0,0 +1,144 @@
+"""Streaming CSV and NDJSON exports of the admin user lists.
+
+Rows come from a server-side cursor (``yield_per``) over users joined to the
+matching profile table and are written out in small chunks as they arrive, so
+an export of a million donors holds one batch in memory at a time. The stream
+runs on its own connection, taken when the view returns and released when the
+last row is sent or the client goes away.
+"""
+import csv
+import io
+import json
+import re
+from datetime import date, datetime
+
+from extensions import db
+from models import DonorProfile, HospitalProfile, OrganizationProfile, User
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+YIELD_PER = 1000
+
+_USER_COLUMNS = [
+    ('user_id', User.id),
+    ('username', User.username),
+    ('email', User.email),
+    ('registered_at', User.created_at),
+    ('is_active', User.is_active),
+]
+
+EXPORTS = {
+    'donors': ('donor', DonorProfile, _USER_COLUMNS + [
+        ('full_name', DonorProfile.full_name),
+        ('blood_type', DonorProfile.blood_type),
+        ('phone', DonorProfile.phone),
+        ('city', DonorProfile.city),
+        ('state', DonorProfile.state),
+        ('zip_code', DonorProfile.zip_code),
+        ('date_of_birth', DonorProfile.date_of_birth),
+        ('last_donation_date', DonorProfile.last_donation_date),
+        ('next_eligible_date', DonorProfile.next_eligible_date),
+        ('is_available', DonorProfile.is_available),
+    ]),
+    'hospitals': ('hospital', HospitalProfile, _USER_COLUMNS + [
+        ('hospital_name', HospitalProfile.hospital_name),
+        ('license_number', HospitalProfile.license_number),
+        ('contact_person', HospitalProfile.contact_person),
+        ('phone', HospitalProfile.phone),
+        ('city', HospitalProfile.city),
+        ('state', HospitalProfile.state),
+        ('zip_code', HospitalProfile.zip_code),
+    ]),
+    'organizations': ('organization', OrganizationProfile, _USER_COLUMNS + [
+        ('organization_name', OrganizationProfile.organization_name),
+        ('registration_number', OrganizationProfile.registration_number),
+        ('contact_person', OrganizationProfile.contact_person),
+        ('phone', OrganizationProfile.phone),
+        ('city', OrganizationProfile.city),
+        ('state', OrganizationProfile.state),
+        ('zip_code', OrganizationProfile.zip_code),
+    ]),
+}
+
+# Spreadsheet apps run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# ...but signed numbers and phone numbers like "+91 98765 43210" are safe and left as they are
+_PLAIN_NUMBER = re.compile(r'[+-]?[\d\s().-]+')
+
+
+def export_query(kind):
+    """Header names and the SELECT for one export, in user id order"""
+    role, profile, columns = EXPORTS[kind]
+    # Outer join so users who never finished their profile are still exported
+    statement = (
+        db.select(*(column for _, column in columns))
+        .select_from(User)
+        .outerjoin(profile, profile.user_id == User.id)
+        .where(User.role == role)
+        .order_by(User.id)
+    )
+    return [name for name, _ in columns], statement
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES) and not _PLAIN_NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _rows(engine, statement):
+    """Yield lists of rows from a server-side cursor on a dedicated connection"""
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=YIELD_PER).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+
+def stream_csv(engine, kind):
+    """CSV body for an export, one chunk per fetched batch"""
+    headers, statement = export_query(kind)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(headers)
+    yield flush()
+    for partition in _rows(engine, statement):
+        writer.writerows([_csv_cell(value) for value in row] for row in partition)
+        yield flush()
+
+
+def stream_ndjson(engine, kind):
+    """Newline-delimited JSON body for an export, one object per user"""
+    headers, statement = export_query(kind)
+    for partition in _rows(engine, statement):
+        yield ''.join(
+            json.dumps(dict(zip(headers, map(_json_value, row))), separators=(',', ':')) + '\n'
+            for row in partition
+        )
+
+
+def stream_export(engine, kind, fmt):
+    """Body generator for ``kind`` (donors, hospitals, organizations) in ``fmt``"""
+    if fmt == 'csv':
+        return stream_csv(engine, kind)
+    return stream_ndjson(engine, kind)
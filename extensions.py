@@ -1,4 +1,6 @@
 # extensions.py
+from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
+moment = Moment()
@@ -0,0 +1,112 @@
+"""Cached read models behind the donor dashboard.
+
+Every donor with the same compatible blood types sees the same five latest
+active requests, and every donor sees the same five upcoming events, so each
+feed is computed once and served from ``cache`` until a committed write to
+the tables behind it drops it. Bulk ``update()``/``delete()`` statements run
+through the session count as writes too. ``FEED_CACHE_TTL`` bounds how stale
+an entry can get if a write bypasses the session.
+
+Set ``CACHE_URL`` to a Redis URL to share the feeds between gunicorn workers;
+otherwise each worker keeps its own copy, and a write made in one worker
+reaches the others only when their entries expire.
+"""
+import os
+from collections import namedtuple
+from datetime import date
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+import cache as cache_store
+from extensions import db
+from models import BloodRequest, DonationEvent, HospitalProfile
+
+DEFAULT_TTL = 60
+FEED_SIZE = 5
+
+# Table name -> cache key prefixes computed from it
+INVALIDATES = {
+    BloodRequest.__tablename__: ['feed:requests'],
+    HospitalProfile.__tablename__: ['feed:requests'],
+    DonationEvent.__tablename__: ['feed:events'],
+}
+
+# Plain rows, so a shared store can pickle them and templates read them like models
+RequestCard = namedtuple('RequestCard', 'id hospital_name blood_type units_needed urgency_level description '
+                                        'requested_at needed_by')
+EventCard = namedtuple('EventCard', 'id event_name event_date location city')
+
+cache = cache_store.TTLCache(DEFAULT_TTL)
+
+
+def request_feed(compatible_types):
+    """The latest active requests a donor of these compatible types can answer"""
+    types = sorted(compatible_types)
+
+    def compute():
+        rows = (BloodRequest.query.options(joinedload(BloodRequest.hospital))
+                .filter(BloodRequest.blood_type.in_(types), BloodRequest.status == 'active')
+                .order_by(BloodRequest.requested_at.desc()).limit(FEED_SIZE).all())
+        return [RequestCard(row.id, row.hospital.hospital_name, row.blood_type, row.units_needed,
+                            row.urgency_level, row.description, row.requested_at, row.needed_by)
+                for row in rows]
+    return cache.get_or_set(f'feed:requests:{",".join(types)}', compute)
+
+
+def upcoming_events():
+    """The next upcoming donation events, soonest first"""
+    today = date.today()
+
+    def compute():
+        rows = (DonationEvent.query
+                .filter(DonationEvent.event_date >= today, DonationEvent.status == 'upcoming')
+                .order_by(DonationEvent.event_date.asc()).limit(FEED_SIZE).all())
+        return [EventCard(row.id, row.event_name, row.event_date, row.location, row.city) for row in rows]
+    return cache.get_or_set(f'feed:events:{today.isoformat()}', compute)
+
+
+def invalidate(*prefixes):
+    """Drop cached feeds; with no arguments, drop everything"""
+    if not prefixes:
+        cache.clear()
+    for prefix in prefixes:
+        cache.delete_prefix(prefix)
+
+
+def _collect_changed_tables(session, flush_context, instances):
+    changed = session.info.setdefault('feed_changed_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in INVALIDATES:
+            changed.add(table)
+
+
+def _collect_bulk_writes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        table = mapper.local_table.name if mapper is not None else None
+        if table in INVALIDATES:
+            orm_execute_state.session.info.setdefault('feed_changed_tables', set()).add(table)
+
+
+def _invalidate_after_commit(session):
+    for table in session.info.pop('feed_changed_tables', ()):
+        invalidate(*INVALIDATES[table])
+
+
+def _discard_after_rollback(session):
+    session.info.pop('feed_changed_tables', None)
+
+
+def init_app(app):
+    """Pick the feed store, configure its TTL and invalidate on committed writes"""
+    global cache
+    ttl = app.config.setdefault('FEED_CACHE_TTL', DEFAULT_TTL)
+    url = app.config.setdefault('CACHE_URL', os.environ.get('CACHE_URL'))
+    cache = cache_store.from_url(url, ttl, namespace='blood-donation:')
+    if not event.contains(db.session, 'before_flush', _collect_changed_tables):
+        event.listen(db.session, 'before_flush', _collect_changed_tables)
+        event.listen(db.session, 'do_orm_execute', _collect_bulk_writes)
+        event.listen(db.session, 'after_commit', _invalidate_after_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, DateField, IntegerField, TimeField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange
+from wtforms import StringField, PasswordField, SelectField, TextAreaField, DateField, IntegerField, TimeField, BooleanField, HiddenField
+from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, Optional
 from datetime import date
 
 INDIAN_STATES = [
@@ -115,13 +115,39 @@ class DonationEventForm(FlaskForm):
     address = TextAreaField('Address', validators=[DataRequired()])
     city = StringField('City', validators=[DataRequired(), Length(max=50)])
     state = SelectField('State', choices=INDIAN_STATES, validators=[DataRequired()])
-    max_participants = IntegerField('Maximum Participants', validators=[NumberRange(min=1)])
+    # Blank for no limit; past the limit donors are waitlisted
+    max_participants = IntegerField('Maximum Participants', validators=[Optional(), NumberRange(min=1)])
 
 class SearchForm(FlaskForm):
     blood_type = SelectField('Blood Type', 
                            choices=[('', 'All Blood Types'), ('A+', 'A+'), ('A-', 'A-'), 
                                    ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), 
-                                   ('O+', 'O+'), ('O-', 'O-')])
+                                   ('O+', 'O+'), ('O-', 'O-')],
+                           default='')
+    q = StringField('Name, City or PIN Code', validators=[Length(max=100)])
     city = StringField('City')
     state = SelectField('State', choices=INDIAN_STATES, validators=[DataRequired()])
+    # Searching near a PIN code orders donors by distance and ignores state and sort
+    near_pin = StringField('Near PIN Code', validators=[Optional(), Length(max=10)])
+    radius_km = SelectField('Within',
+                            choices=[(5, '5 km'), (10, '10 km'), (25, '25 km'), (50, '50 km'), (100, '100 km')],
+                            coerce=int, default=25)
+    available_only = BooleanField('Available donors only')
+    eligible_only = BooleanField('Eligible to donate now')
+    rare_only = BooleanField('Rare blood types only')
+    sort = SelectField('Sort By',
+                      choices=[('relevance', 'Best Match'), ('name', 'Name'), ('city', 'City'),
+                               ('recent', 'Newest Donors')],
+                      default='relevance')
 
+    class Meta:
+        # Read-only search submitted with GET so result pages can be linked and paged
+        csrf = False
+
+class NotificationsReadForm(FlaskForm):
+    # Newest notification id the user has seen; "mark all" stops here
+    up_to = HiddenField('Up To')
+
+class EventRegistrationForm(FlaskForm):
+    # No fields: carries the CSRF token for sign-up and cancel buttons
+    pass
@@ -0,0 +1,146 @@
+"""Ranked, indexed text search over donor names, cities, states and PIN codes.
+
+SQLite keeps an FTS5 index (``donor_search``) over ``donor_profile``, synced
+by triggers. PostgreSQL keeps a generated, weighted ``tsvector`` column with a
+GIN index. Both are created with the ``donor_profile`` table on a fresh
+database and by ``flask schema upgrade`` on an existing one. Either way a
+search is an index lookup rather than a scan of every profile.
+
+Every search term matches as a word prefix, and all terms must match. A
+full-name hit ranks above a city or PIN code hit, which ranks above a state
+hit.
+
+SQLite's planner cannot tell how many profiles a match returns, so
+``is_common_word`` counts them for single-word searches, where a common word
+is better filtered than joined (see ``search.donor_search_query``).
+"""
+import re
+
+from sqlalchemy import bindparam, event, func, literal_column, text
+
+from extensions import db
+from models import DonorProfile
+
+MAX_TERMS = 8
+# A single search word matching at least this many profiles is common enough
+# that walking profiles in page order fills a page sooner than sorting every match
+COMMON_WORD_MATCHES = 1000
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS donor_search USING fts5(
+        full_name, city, state, zip_code,
+        content='donor_profile', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS donor_search_insert AFTER INSERT ON donor_profile BEGIN
+        INSERT INTO donor_search (rowid, full_name, city, state, zip_code)
+        VALUES (new.id, new.full_name, new.city, new.state, new.zip_code);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donor_search_delete AFTER DELETE ON donor_profile BEGIN
+        INSERT INTO donor_search (donor_search, rowid, full_name, city, state, zip_code)
+        VALUES ('delete', old.id, old.full_name, old.city, old.state, old.zip_code);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donor_search_update
+    AFTER UPDATE OF full_name, city, state, zip_code ON donor_profile BEGIN
+        INSERT INTO donor_search (donor_search, rowid, full_name, city, state, zip_code)
+        VALUES ('delete', old.id, old.full_name, old.city, old.state, old.zip_code);
+        INSERT INTO donor_search (rowid, full_name, city, state, zip_code)
+        VALUES (new.id, new.full_name, new.city, new.state, new.zip_code);
+    END""",
+]
+
+_POSTGRESQL_DDL = [
+    # 'simple' keeps names and places unstemmed; the explicit regconfig keeps it immutable
+    """ALTER TABLE donor_profile ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(full_name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(city, '') || ' ' || coalesce(zip_code, '')), 'B') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(state, '')), 'C')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_donor_profile_search ON donor_profile USING gin (search_vector)',
+]
+
+# bm25 column weights for full_name, city, state, zip_code
+_SQLITE_WEIGHTS = (10.0, 5.0, 1.0, 5.0)
+
+_matches = {}
+
+
+def search_terms(query_text):
+    """The words of a search box entry, lowercased, punctuation dropped"""
+    return re.findall(r'[^\W_]+', (query_text or '').casefold())[:MAX_TERMS]
+
+
+def match_query(terms, dialect_name):
+    """Bind value for ``donor_matches()``: every term as a prefix, all required"""
+    if dialect_name == 'postgresql':
+        return ' & '.join(f'{term}:*' for term in terms)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def donor_matches(dialect_name):
+    """Subquery of ``(id, rank)`` for profiles matching the ``search_text`` bind.
+
+    Lower ranks are better matches. Built once per dialect so callers can
+    refer to its columns, e.g. to order by ``rank``.
+    """
+    if dialect_name not in _matches:
+        search_text = bindparam('search_text')
+        if dialect_name == 'postgresql':
+            vector = literal_column('donor_profile.search_vector')
+            tsquery = func.to_tsquery(literal_column("'simple'::regconfig"), search_text)
+            matches = (db.select(DonorProfile.id.label('id'), (-func.ts_rank(vector, tsquery)).label('rank'))
+                       .where(vector.op('@@')(tsquery)))
+        else:
+            index = literal_column('donor_search')
+            matches = (db.select(literal_column('donor_search.rowid').label('id'),
+                                 func.bm25(index, *_SQLITE_WEIGHTS).label('rank'))
+                       .select_from(text('donor_search'))
+                       .where(index.op('MATCH')(search_text)))
+        _matches[dialect_name] = matches.subquery('donor_matches')
+    return _matches[dialect_name]
+
+
+def donor_match_ids():
+    """Unranked select of the ids of SQLite profiles matching the ``search_text`` bind"""
+    return (db.select(literal_column('donor_search.rowid'))
+            .select_from(text('donor_search'))
+            .where(literal_column('donor_search').op('MATCH')(bindparam('search_text'))))
+
+
+def is_common_word(terms, dialect_name):
+    """True if ``terms`` is one word matching at least ``COMMON_WORD_MATCHES`` profiles.
+
+    Only checked on SQLite; PostgreSQL keeps statistics for the GIN index and
+    plans common words itself.
+    """
+    if len(terms) != 1 or dialect_name == 'postgresql':
+        return False
+    probe = donor_match_ids().limit(COMMON_WORD_MATCHES).subquery()
+    count = db.session.execute(db.select(func.count()).select_from(probe),
+                               {'search_text': match_query(terms, dialect_name)}).scalar()
+    return count >= COMMON_WORD_MATCHES
+
+
+def install(connection):
+    """Create the search index if it is missing, returning True if it was created"""
+    if connection.dialect.name == 'postgresql':
+        exists = connection.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'donor_profile' AND column_name = 'search_vector'"
+        )).first() is not None
+        statements = _POSTGRESQL_DDL
+    else:
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'donor_search'"
+        )).first() is not None
+        statements = _SQLITE_DDL
+    for statement in statements:
+        connection.execute(text(statement))
+    if not exists and connection.dialect.name != 'postgresql':
+        # The generated column fills itself; FTS5 has to index existing rows
+        connection.execute(text("INSERT INTO donor_search (donor_search) VALUES ('rebuild')"))
+    return not exists
+
+
+@event.listens_for(DonorProfile.__table__, 'after_create')
+def _install_with_table(target, connection, **kw):
+    install(connection)
@@ -0,0 +1,181 @@
+"""PIN code centroids and distance lookups.
+
+``PinCode`` holds one centroid per six-digit PIN code, loaded from a local
+CSV by ``flask pins load``. The India Post directory export works as-is: its
+``pincode``, ``latitude`` and ``longitude`` columns are read, and rows for
+the several post offices of one PIN are averaged.
+
+Each process keeps the whole table in memory as a ``PinDirectory`` of NumPy
+arrays (about 20k rows). Finding every PIN within R km first keeps only PINs
+inside the bounding box, then computes great-circle distances for those, so
+it takes well under a millisecond. Donors are located through their
+normalised ``DonorProfile.pin_key``.
+"""
+import csv
+from collections import defaultdict
+
+import click
+import numpy as np
+
+from cache import TTLCache
+from extensions import db
+from models import PinCode, normalise_pin
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+RADIUS_CHOICES = [5, 10, 25, 50, 100]
+DEFAULT_RADIUS_KM = 25
+DEFAULT_DIRECTORY_TTL = 3600
+
+_PIN_COLUMNS = ('pincode', 'pin', 'pin_code', 'zip_code')
+_STATE_COLUMNS = ('statename', 'state')
+
+directory_cache = TTLCache(DEFAULT_DIRECTORY_TTL)
+
+
+class UnknownPinCode(ValueError):
+    """Raised when a PIN code has no centroid in the reference table"""
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments in degrees, arrays broadcast"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class PinDirectory:
+    """Every PIN centroid as arrays sorted by PIN"""
+
+    def __init__(self, pins, latitudes, longitudes):
+        order = np.argsort(pins)
+        self.pins = np.asarray(pins, dtype=np.int64)[order]
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)[order]
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.pins)
+
+    @classmethod
+    def load(cls):
+        rows = db.session.execute(db.select(PinCode.pin, PinCode.latitude, PinCode.longitude)).all()
+        return cls([int(pin) for pin, _, _ in rows], [row[1] for row in rows], [row[2] for row in rows])
+
+    def _positions(self, pins):
+        """Row of each PIN (int array) in the directory, -1 where unknown"""
+        pins = np.asarray(pins, dtype=np.int64)
+        if not len(self.pins):
+            return np.full(len(pins), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.pins, pins), len(self.pins) - 1)
+        return np.where(self.pins[positions] == pins, positions, -1)
+
+    def locate(self, pin):
+        """``(latitude, longitude)`` of a PIN code; raises UnknownPinCode"""
+        key = normalise_pin(pin)
+        position = self._positions([int(key)])[0] if key else -1
+        if position < 0:
+            raise UnknownPinCode(f'No location is known for PIN code {pin!r}')
+        return float(self.latitudes[position]), float(self.longitudes[position])
+
+    def coordinates(self, pins):
+        """Latitude and longitude arrays for integer PINs, NaN where unknown"""
+        positions = self._positions(pins)
+        known = positions >= 0
+        latitudes = np.full(len(positions), np.nan)
+        longitudes = np.full(len(positions), np.nan)
+        latitudes[known] = self.latitudes[positions[known]]
+        longitudes[known] = self.longitudes[positions[known]]
+        return latitudes, longitudes
+
+    def within(self, latitude, longitude, radius_km):
+        """PIN codes (six-digit strings) within ``radius_km``, nearest first, and their distances"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(latitude)), 0.01))
+        box = np.flatnonzero((np.abs(self.latitudes - latitude) <= lat_span)
+                             & (np.abs(self.longitudes - longitude) <= lon_span))
+        distances = haversine_km(latitude, longitude, self.latitudes[box], self.longitudes[box])
+        inside = distances <= radius_km
+        box, distances = box[inside], distances[inside]
+        # Ties broken by PIN so the order is stable between requests
+        order = np.lexsort((self.pins[box], distances))
+        return [f'{pin:06d}' for pin in self.pins[box[order]].tolist()], distances[order]
+
+
+def get_pin_directory():
+    """The process-wide PIN directory, reloaded every ``PIN_DIRECTORY_TTL`` seconds"""
+    return directory_cache.get_or_set('pins', PinDirectory.load)
+
+
+def _pick(fieldnames, candidates):
+    lowered = {name.strip().lower(): name for name in fieldnames}
+    return next((lowered[name] for name in candidates if name in lowered), None)
+
+
+def read_pin_file(lines):
+    """``{pin: (latitude, longitude, district, state)}`` from CSV lines, averaging repeated PINs"""
+    reader = csv.DictReader(lines)
+    fieldnames = reader.fieldnames or []
+    pin_column = _pick(fieldnames, _PIN_COLUMNS)
+    latitude_column = _pick(fieldnames, ('latitude', 'lat'))
+    longitude_column = _pick(fieldnames, ('longitude', 'lon', 'lng'))
+    if not (pin_column and latitude_column and longitude_column):
+        raise ValueError('Expected pincode, latitude and longitude columns')
+    district_column = _pick(fieldnames, ('district',))
+    state_column = _pick(fieldnames, _STATE_COLUMNS)
+
+    sums = defaultdict(lambda: [0.0, 0.0, 0, None, None])
+    for row in reader:
+        pin = normalise_pin(row.get(pin_column))
+        try:
+            latitude, longitude = float(row[latitude_column]), float(row[longitude_column])
+        except (TypeError, ValueError):
+            # The India Post file has "NA" for offices without coordinates
+            continue
+        if not pin or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            continue
+        entry = sums[pin]
+        entry[0] += latitude
+        entry[1] += longitude
+        entry[2] += 1
+        if district_column and not entry[3]:
+            entry[3] = (row.get(district_column) or '').strip() or None
+        if state_column and not entry[4]:
+            entry[4] = (row.get(state_column) or '').strip() or None
+    return {pin: (lat / count, lon / count, district, state)
+            for pin, (lat, lon, count, district, state) in sums.items()}
+
+
+def load_pin_codes(lines):
+    """Replace the PIN reference table with the contents of a CSV; returns the PIN count"""
+    centroids = read_pin_file(lines)
+    db.session.execute(db.delete(PinCode))
+    rows = [{'pin': pin, 'latitude': lat, 'longitude': lon, 'district': district, 'state': state}
+            for pin, (lat, lon, district, state) in centroids.items()]
+    if rows:
+        db.session.execute(db.insert(PinCode), rows)
+    db.session.commit()
+    directory_cache.clear()
+    return len(rows)
+
+
+def init_app(app):
+    """Configure the directory reload interval and register ``flask pins load``"""
+    directory_cache.ttl = app.config.setdefault('PIN_DIRECTORY_TTL', DEFAULT_DIRECTORY_TTL)
+
+    @app.cli.group('pins')
+    def pins():
+        """PIN code reference data."""
+
+    @pins.command('load')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    def load_command(csv_file):
+        """Replace the PIN code centroids with those in a CSV file.
+
+        Needs pincode, latitude and longitude columns; district and
+        statename/state are kept when present.
+        """
+        try:
+            count = load_pin_codes(csv_file)
+        except ValueError as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f'Loaded {count} PIN code centroid(s).')
@@ -0,0 +1,259 @@
+"""Bulk import of donors, with their profiles, from CSV sign-up sheets.
+
+Each row is checked with the same rules as registering (``RegistrationForm``)
+and filling in a donor profile (``DonorProfileForm``). Rows are then handled
+in batches. Each batch needs one query to find usernames and emails that are
+already taken, and one multi-row insert per table (``COPY`` on PostgreSQL). A
+process pool hashes passwords while the next batch is being validated.
+
+Every batch commits on its own, so rows before a failure stay imported. Rows
+that cannot be imported are reported with their CSV line number and reason.
+"""
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+
+import click
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from forms import DonorProfileForm, RegistrationForm
+from models import DonorProfile, User, normalise_city, normalise_pin
+from stats import invalidate_tables
+
+COLUMNS = ['username', 'email', 'password', 'full_name', 'blood_type', 'phone', 'address',
+           'city', 'state', 'zip_code', 'date_of_birth', 'medical_conditions']
+REQUIRED_COLUMNS = [name for name in COLUMNS if name != 'medical_conditions']
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportFileError(ValueError):
+    """Raised when a file cannot be imported at all, e.g. missing columns"""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: how many rows went in and why the others did not"""
+    imported: int = 0
+    errors: list = field(default_factory=list)  # (line, username, message)
+
+    def add_error(self, line, username, message):
+        self.errors.append((line, username, message))
+
+    def write_csv(self, out):
+        writer = csv.writer(out)
+        writer.writerow(['line', 'username', 'error'])
+        writer.writerows(sorted(self.errors))
+
+
+@dataclass
+class _Row:
+    line: int
+    user: dict
+    profile: dict
+    password: str
+
+
+def _form_errors(*forms):
+    return '; '.join(f'{name}: {message}'
+                     for form in forms
+                     for name, messages in form.errors.items()
+                     for message in messages)
+
+
+def validate_row(line, raw):
+    """A ``_Row`` ready to insert, or an error message for the report"""
+    values = {name: (raw.get(name) or '').strip() for name in COLUMNS}
+    formdata = MultiDict(dict(values, confirm_password=values['password'], role='donor'))
+    registration = RegistrationForm(formdata=formdata, meta={'csrf': False})
+    profile_form = DonorProfileForm(formdata=formdata, meta={'csrf': False})
+    # validate() both, so one message lists every problem with the row
+    if not all([registration.validate(), profile_form.validate()]):
+        return _form_errors(registration, profile_form)
+    now = datetime.utcnow()
+    return _Row(
+        line=line,
+        user={'username': registration.username.data, 'email': registration.email.data, 'role': 'donor',
+              'created_at': now, 'is_active': True, 'unread_notifications': 0},
+        profile={'full_name': profile_form.full_name.data, 'blood_type': profile_form.blood_type.data,
+                 'phone': profile_form.phone.data, 'address': profile_form.address.data,
+                 'city': profile_form.city.data, 'city_key': normalise_city(profile_form.city.data),
+                 'state': profile_form.state.data,
+                 'zip_code': profile_form.zip_code.data, 'pin_key': normalise_pin(profile_form.zip_code.data),
+                 'date_of_birth': profile_form.date_of_birth.data,
+                 'medical_conditions': profile_form.medical_conditions.data or None,
+                 'is_available': True, 'updated_at': now},
+        password=registration.password.data
+    )
+
+
+def _taken(rows):
+    """Usernames and emails from ``rows`` that already belong to someone, in one query"""
+    usernames = [row.user['username'] for row in rows]
+    emails = [row.user['email'] for row in rows]
+    existing = db.session.execute(
+        db.select(User.username, User.email)
+        .where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    ).all()
+    return {username for username, _ in existing}, {email for _, email in existing}
+
+
+def _drop_taken(rows, report):
+    taken_usernames, taken_emails = _taken(rows)
+    kept = []
+    for row in rows:
+        if row.user['username'] in taken_usernames:
+            report.add_error(row.line, row.user['username'], 'username: Username already exists.')
+        elif row.user['email'] in taken_emails:
+            report.add_error(row.line, row.user['username'], 'email: Email already exists.')
+        else:
+            kept.append(row)
+    return kept
+
+
+def _copy_rows(table, columns, rows):
+    """PostgreSQL ``COPY ... FROM STDIN`` on the session's connection"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[name] for name in columns] for row in rows)
+    buffer.seek(0)
+    connection = db.session.connection()
+    quoted = connection.dialect.identifier_preparer
+    statement = (f'COPY {quoted.format_table(table)} ({", ".join(quoted.quote(name) for name in columns)}) '
+                 f'FROM STDIN WITH (FORMAT csv)')
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(statement, buffer)
+
+
+def _insert_users(users):
+    """Insert user rows and return ``{username: id}``"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy_rows(User.__table__, list(users[0]), users)
+        return dict(db.session.execute(
+            db.select(User.username, User.id).where(User.username.in_([user['username'] for user in users]))
+        ).all())
+    # insertmanyvalues: multi-row INSERT ... VALUES ... RETURNING
+    return dict(db.session.execute(insert(User).returning(User.username, User.id), users).all())
+
+
+def _insert_profiles(profiles):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy_rows(DonorProfile.__table__, list(profiles[0]), profiles)
+    else:
+        db.session.execute(insert(DonorProfile), profiles)
+
+
+def _write_batch(rows, hashes, report):
+    """Insert validated rows whose password hashes are ready; returns the count inserted"""
+    for attempt in range(2):
+        rows = _drop_taken(rows, report)
+        if not rows:
+            return 0
+        try:
+            users = [dict(row.user, password_hash=hashes[row.line]) for row in rows]
+            ids = _insert_users(users)
+            _insert_profiles([dict(row.profile, user_id=ids[row.user['username']]) for row in rows])
+            db.session.commit()
+            # Bulk inserts and COPY skip the flush hooks the stats cache listens to
+            invalidate_tables(User.__tablename__, DonorProfile.__tablename__)
+            return len(rows)
+        except IntegrityError:
+            # Someone registered one of these names since the lookup; look again
+            db.session.rollback()
+            if attempt:
+                raise
+    return 0
+
+
+def import_donors(lines, batch_size=DEFAULT_BATCH_SIZE, workers=None, password_method=None):
+    """Import donors from CSV text lines (a file object works); returns an ImportReport.
+
+    ``workers`` sets the password-hashing process pool size (default: one per
+    CPU). ``password_method`` is passed to ``generate_password_hash``; leave
+    it unset to hash the same way as registration does.
+    """
+    reader = csv.DictReader(lines)
+    missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFileError(f'Missing column(s): {", ".join(missing)}')
+
+    hasher = partial(generate_password_hash, method=password_method) if password_method else generate_password_hash
+    report = ImportReport()
+    seen_usernames, seen_emails = set(), set()
+    pending = None  # (rows, future hashes) for the batch whose hashes are being computed
+    workers = workers or os.cpu_count() or 1
+    # spawn: the pool only runs werkzeug's hasher and must not inherit DB connections or threads
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+
+        def flush(batch):
+            nonlocal pending
+            if pending is not None:
+                rows, hashes = pending
+                report.imported += _write_batch(rows, dict(zip((row.line for row in rows), hashes)), report)
+            chunksize = max(1, len(batch) // (4 * workers))
+            pending = (batch, pool.map(hasher, [row.password for row in batch], chunksize=chunksize)) if batch else None
+
+        batch = []
+        # Line 1 is the header
+        for line, raw in enumerate(reader, start=2):
+            row = validate_row(line, raw)
+            if isinstance(row, str):
+                report.add_error(line, (raw.get('username') or '').strip(), row)
+                continue
+            if row.user['username'] in seen_usernames:
+                report.add_error(line, row.user['username'], 'username: Repeated earlier in the file.')
+                continue
+            if row.user['email'] in seen_emails:
+                report.add_error(line, row.user['username'], 'email: Repeated earlier in the file.')
+                continue
+            seen_usernames.add(row.user['username'])
+            seen_emails.add(row.user['email'])
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        flush(batch)
+        flush([])
+    return report
+
+
+def init_app(app):
+    """Register the ``flask donors import`` command"""
+
+    @app.cli.group('donors')
+    def donors():
+        """Donor administration."""
+
+    @donors.command('import')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--report', 'report_file', type=click.File('w'),
+                  help='Write rows that were not imported, with reasons, to this CSV file.')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+    @click.option('--workers', type=int, help='Password hashing processes (default: one per CPU).')
+    def import_command(csv_file, report_file, batch_size, workers):
+        """Create donor accounts and profiles from a CSV file.
+
+        Columns: username, email, password, full_name, blood_type, phone,
+        address, city, state, zip_code, date_of_birth (YYYY-MM-DD) and
+        optionally medical_conditions.
+        """
+        try:
+            report = import_donors(csv_file, batch_size=batch_size, workers=workers)
+        except ImportFileError as exc:
+            raise click.ClickException(str(exc))
+        if report_file is not None:
+            report.write_csv(report_file)
+        click.echo(f'Imported {report.imported} donor(s); {len(report.errors)} row(s) rejected.')
+        if report.errors and report_file is None:
+            for line, username, message in sorted(report.errors)[:20]:
+                click.echo(f'  line {line} ({username or "?"}): {message}')
+            if len(report.errors) > 20:
+                click.echo(f'  ... and {len(report.errors) - 20} more; use --report to get them all.')
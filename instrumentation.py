@@ -0,0 +1,200 @@
+"""Per-request SQL instrumentation.
+
+Engine events count and time every statement run while serving a request.
+Each response carries a ``Server-Timing`` header with the database and total
+time, which browser dev tools show next to the request. A statement that runs
+``N_PLUS_ONE_THRESHOLD`` or more times in one request is logged as a likely
+N+1. A rolling per-process log keeps the latest requests for each endpoint
+and the statements that cost the most, for the admin performance page.
+
+Recording a statement costs two clock reads and a dict update, so the layer
+can stay on in production. Set ``SQL_INSTRUMENTATION = False`` to turn it
+off.
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+N_PLUS_ONE_THRESHOLD = 5
+SLOW_REQUEST_MS = 1000
+SAMPLES_PER_ENDPOINT = 500
+MAX_STATEMENTS = 200
+RECENT_N_PLUS_ONE = 50
+
+logger = logging.getLogger(__name__)
+
+# Expanded IN lists: "(?, ?, ?)" or "(%(id_1)s, %(id_2)s)" become "(?, ...)"
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s)\s*,)+\s*(?:\?|%\(\w+\)s)\s*\)')
+
+
+def normalise_statement(statement):
+    """One line per statement, with IN lists of any length written the same way"""
+    return _PLACEHOLDER_LIST.sub('(?, ...)', ' '.join(statement.split()))
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RequestStats:
+    """Statements run while serving one request"""
+    __slots__ = ('started', 'queries', 'db_seconds', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = {}  # raw statement -> [count, seconds, slowest seconds]
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def by_statement(self):
+        """``{normalised statement: [count, seconds, slowest seconds]}``"""
+        merged = {}
+        for statement, (count, seconds, slowest) in self.statements.items():
+            entry = merged.setdefault(normalise_statement(statement), [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+            entry[2] = max(entry[2], slowest)
+        return merged
+
+
+class PerformanceLog:
+    """Rolling record of recent requests per endpoint and the costliest statements"""
+
+    def __init__(self, samples_per_endpoint=SAMPLES_PER_ENDPOINT, max_statements=MAX_STATEMENTS):
+        self.samples_per_endpoint = samples_per_endpoint
+        self.max_statements = max_statements
+        self._requests = {}  # endpoint -> deque of (total ms, db ms, queries)
+        self._statements = {}  # normalised statement -> [executions, total ms, max ms, endpoint]
+        self._n_plus_one = deque(maxlen=RECENT_N_PLUS_ONE)  # (datetime, endpoint, count, statement)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, total_ms, stats, statements, suspects):
+        with self._lock:
+            samples = self._requests.get(endpoint)
+            if samples is None:
+                samples = self._requests[endpoint] = deque(maxlen=self.samples_per_endpoint)
+            samples.append((total_ms, stats.db_seconds * 1000, stats.queries))
+            for statement, (count, seconds, slowest) in statements.items():
+                entry = self._statements.get(statement)
+                if entry is None:
+                    if len(self._statements) >= self.max_statements:
+                        # Make room by forgetting the statement that has cost the least so far
+                        del self._statements[min(self._statements, key=lambda key: self._statements[key][1])]
+                    entry = self._statements[statement] = [0, 0.0, 0.0, endpoint]
+                entry[0] += count
+                entry[1] += seconds * 1000
+                entry[2] = max(entry[2], slowest * 1000)
+            for statement, count in suspects:
+                self._n_plus_one.append((datetime.utcnow(), endpoint, count, statement))
+
+    def endpoints(self):
+        """Latency and query percentiles per endpoint, slowest p95 first"""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._requests.items()}
+        rows = []
+        for endpoint, samples in snapshot.items():
+            durations = sorted(total for total, _, _ in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'p50_ms': _percentile(durations, 0.50),
+                'p95_ms': _percentile(durations, 0.95),
+                'max_ms': durations[-1],
+                'db_ms': sum(db_ms for _, db_ms, _ in samples) / len(samples),
+                'queries': sum(queries for _, _, queries in samples) / len(samples),
+                'max_queries': max(queries for _, _, queries in samples),
+            })
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+    def statements(self, limit=50):
+        """Statements with the most total time, costliest first"""
+        with self._lock:
+            rows = [{'statement': statement, 'executions': count, 'total_ms': total, 'max_ms': slowest,
+                     'mean_ms': total / count, 'endpoint': endpoint}
+                    for statement, (count, total, slowest, endpoint) in self._statements.items()]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)[:limit]
+
+    def n_plus_one(self):
+        """Recent likely N+1 statements, newest first"""
+        with self._lock:
+            return list(reversed(self._n_plus_one))
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+            self._statements.clear()
+            self._n_plus_one.clear()
+
+
+performance_log = PerformanceLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and 'sql_stats' in g:
+        context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is not None and has_request_context():
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+
+def _start_request():
+    g.sql_stats = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None or request.endpoint == 'static':
+        return response
+    total_ms = (time.perf_counter() - stats.started) * 1000
+    db_ms = stats.db_seconds * 1000
+    response.headers['Server-Timing'] = (f'db;dur={db_ms:.1f};desc="{stats.queries} queries", '
+                                         f'app;dur={total_ms:.1f}')
+
+    statements = stats.by_statement()
+    threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+    suspects = [(statement, count) for statement, (count, _, _) in statements.items() if count >= threshold]
+    endpoint = request.endpoint or 'unmatched'
+    for statement, count in suspects:
+        logger.warning('Likely N+1 in %s: %d executions of %s', endpoint, count, statement[:300])
+    if total_ms >= current_app.config['SLOW_REQUEST_MS']:
+        logger.warning('Slow request %s %s: %.0f ms, %d queries taking %.0f ms',
+                       request.method, request.path, total_ms, stats.queries, db_ms)
+    performance_log.add(endpoint, total_ms, stats, statements, suspects)
+    return response
+
+
+def init_app(app):
+    """Time each request's SQL and add Server-Timing headers, unless ``SQL_INSTRUMENTATION`` is off"""
+    if not app.config.setdefault('SQL_INSTRUMENTATION', True):
+        return
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    app.config.setdefault('SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    # Registered before the other modules' hooks, so their queries are counted too
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,352 @@
+"""Blood stock held per (blood type, location), reserved against requests.
+
+Every balance change is a compare-and-set UPDATE on the inventory row's
+``version`` plus an ``InventoryLedgerEntry`` insert, committed together.
+Movements for a request also compare-and-set the request's
+``stock_version``, so two locations cannot both cover the same shortfall. On
+PostgreSQL the row is also taken with ``SELECT ... FOR UPDATE`` so concurrent
+writers queue instead of retrying; on SQLite a lost compare-and-set (or a
+busy database) is retried. Either way a balance can never go negative, so
+concurrent hospital requests cannot oversell a location.
+
+Units move ``available -> reserved`` on reserve, back on release, and leave
+the books on consume. What a request still holds at a location is the sum of
+its ledger entries there.
+"""
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, event, func, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from cache import TTLCache
+from extensions import db
+from models import BloodInventory, BloodRequest, InventoryLedgerEntry
+from stats import invalidate_tables_on_commit
+from utils import get_compatible_blood_types, is_transient_db_error
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+MAX_ATTEMPTS = 20
+DEFAULT_STOCK_TTL = 10
+
+# Signed effect of each ledger entry on what a request holds
+HELD_DELTA = {'reserve': 1, 'release': -1, 'consume': -1}
+
+stock_cache = TTLCache(DEFAULT_STOCK_TTL)
+
+
+class InventoryError(ValueError):
+    """Raised when a stock movement is not allowed"""
+
+
+class InsufficientStock(InventoryError):
+    """Raised when a location has fewer free units than asked for"""
+
+
+class InventoryConflict(InventoryError):
+    """Raised when a movement kept losing to concurrent writers"""
+
+
+# Statements are built once; the movement path runs several per call and
+# rebuilding them costs more than executing them on SQLite
+_HELD_UNITS = func.coalesce(func.sum(case(
+    *((InventoryLedgerEntry.entry_type == entry_type, InventoryLedgerEntry.units * sign)
+      for entry_type, sign in HELD_DELTA.items()),
+    else_=0
+)), 0)
+
+_CONSUMED_UNITS = func.coalesce(func.sum(case(
+    (InventoryLedgerEntry.entry_type == 'consume', InventoryLedgerEntry.units),
+    else_=0
+)), 0)
+
+_LOCK_INVENTORY = (
+    db.select(BloodInventory.id, BloodInventory.blood_type, BloodInventory.units_available,
+              BloodInventory.units_reserved, BloodInventory.version)
+    .where(BloodInventory.id == bindparam('inventory_id'))
+    .with_for_update()
+)
+
+_LOCK_REQUEST = (
+    db.select(BloodRequest.id, BloodRequest.blood_type, BloodRequest.units_needed, BloodRequest.status,
+              BloodRequest.stock_version)
+    .where(BloodRequest.id == bindparam('request_id'))
+    .with_for_update()
+)
+
+_REQUEST_TOTALS = (
+    db.select(_HELD_UNITS, _CONSUMED_UNITS)
+    .where(InventoryLedgerEntry.blood_request_id == bindparam('request_id'))
+)
+
+_HELD_AT_LOCATION = (
+    db.select(_HELD_UNITS)
+    .where(InventoryLedgerEntry.blood_request_id == bindparam('request_id'),
+           InventoryLedgerEntry.inventory_id == bindparam('inventory_id'))
+)
+
+_SWAP_BALANCES = (
+    BloodInventory.__table__.update()
+    .where(BloodInventory.id == bindparam('inventory_id'),
+           BloodInventory.version == bindparam('expected_version'))
+    .values(units_available=bindparam('available_after'),
+            units_reserved=bindparam('reserved_after'),
+            version=BloodInventory.version + 1,
+            last_updated=bindparam('now'))
+)
+
+_SWAP_REQUEST_VERSION = (
+    BloodRequest.__table__.update()
+    .where(BloodRequest.id == bindparam('request_id'),
+           BloodRequest.stock_version == bindparam('expected_version'),
+           BloodRequest.status == bindparam('expected_status'))
+    .values(stock_version=BloodRequest.stock_version + 1)
+)
+
+_APPEND_LEDGER = InventoryLedgerEntry.__table__.insert()
+
+
+def _request_totals(request_id):
+    """``(held, consumed)`` units for a request across all locations"""
+    return tuple(db.session.execute(_REQUEST_TOTALS, {'request_id': request_id}).one())
+
+
+def _held_at_location(request_id, inventory_id):
+    """Units a request holds at one location (reserved, not yet released or consumed)"""
+    return db.session.scalar(_HELD_AT_LOCATION, {'request_id': request_id, 'inventory_id': inventory_id})
+
+
+def _apply(inventory_id, entry_type, plan, request_id=None, user_id=None):
+    """Apply one stock movement in the current transaction without committing.
+
+    ``plan(inventory, blood_request)`` checks the current state and returns
+    ``(units, available_delta, reserved_delta)``, or raises InventoryError.
+    Returns the new ledger entry id, or None when a concurrent writer won the
+    compare-and-set and the caller must roll back and try again.
+    """
+    # Lock the request first so every writer takes locks in the same order
+    blood_request = None
+    if request_id is not None:
+        blood_request = db.session.execute(_LOCK_REQUEST, {'request_id': request_id}).one()
+    inventory = db.session.execute(_LOCK_INVENTORY, {'inventory_id': inventory_id}).one()
+    units, available_delta, reserved_delta = plan(inventory, blood_request)
+    available_after = inventory.units_available + available_delta
+    reserved_after = inventory.units_reserved + reserved_delta
+    if available_after < 0 or reserved_after < 0:
+        raise InsufficientStock(
+            f'{inventory.blood_type} has {inventory.units_available} free units at this location')
+
+    now = datetime.utcnow()
+    swapped = db.session.execute(_SWAP_BALANCES, {
+        'inventory_id': inventory_id,
+        'expected_version': inventory.version,
+        'available_after': available_after,
+        'reserved_after': reserved_after,
+        'now': now
+    }).rowcount
+    if swapped == 1 and blood_request is not None:
+        # The plan read the request's totals across every location; another
+        # location moving stock for it since then makes the plan stale
+        swapped = db.session.execute(_SWAP_REQUEST_VERSION, {
+            'request_id': request_id,
+            'expected_version': blood_request.stock_version,
+            'expected_status': blood_request.status
+        }).rowcount
+    if swapped != 1:
+        return None
+    entry_id = db.session.execute(_APPEND_LEDGER, {
+        'inventory_id': inventory_id,
+        'blood_request_id': request_id,
+        'entry_type': entry_type,
+        'units': units,
+        'available_after': available_after,
+        'reserved_after': reserved_after,
+        'user_id': user_id,
+        'created_at': now
+    }).inserted_primary_key[0]
+    if entry_type == 'consume' and blood_request is not None:
+        _mark_fulfilled(blood_request)
+    return entry_id
+
+
+def _move(inventory_id, entry_type, plan, request_id=None, user_id=None):
+    """Apply and commit one stock movement, retrying when a concurrent writer wins.
+
+    Returns the committed ledger entry id.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            entry_id = _apply(inventory_id, entry_type, plan, request_id=request_id, user_id=user_id)
+            if entry_id is None:
+                db.session.rollback()
+                continue
+            db.session.commit()
+            stock_cache.clear()
+            return entry_id
+        except OperationalError as exc:
+            db.session.rollback()
+            if not is_transient_db_error(exc):
+                raise
+            time.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+        except Exception:
+            db.session.rollback()
+            raise
+    raise InventoryConflict(f'Could not update inventory {inventory_id} after {MAX_ATTEMPTS} attempts')
+
+
+def _mark_fulfilled(blood_request):
+    _, consumed = _request_totals(blood_request.id)
+    if consumed >= blood_request.units_needed:
+        fulfilled = db.session.execute(update(BloodRequest)
+                                       .where(BloodRequest.id == blood_request.id, BloodRequest.status == 'active')
+                                       .values(status='fulfilled')).rowcount
+        if fulfilled:
+            # Bulk updates skip the flush hooks the stats cache listens to
+            invalidate_tables_on_commit(BloodRequest.__tablename__)
+
+
+def get_or_create_inventory(blood_type, location):
+    """The inventory row for a blood type at a location, created empty if missing"""
+    if blood_type not in BLOOD_TYPES:
+        raise InventoryError(f'Unknown blood type {blood_type!r}')
+    for _ in range(2):
+        inventory = BloodInventory.query.filter_by(blood_type=blood_type, location=location).first()
+        if inventory is not None:
+            return inventory
+        try:
+            inventory = BloodInventory(blood_type=blood_type, location=location, units_available=0,
+                                       units_reserved=0, version=0)
+            db.session.add(inventory)
+            db.session.commit()
+            return inventory
+        except IntegrityError:
+            # Another writer created it first
+            db.session.rollback()
+    raise InventoryConflict(f'Could not create inventory for {blood_type} at {location}')
+
+
+def receive(blood_type, location, units, user_id=None):
+    """Add donated or delivered units to a location's free stock"""
+    if units <= 0:
+        raise InventoryError('Units received must be positive')
+    inventory = get_or_create_inventory(blood_type, location)
+    return _move(inventory.id, 'receive', lambda inv, req: (units, units, 0), user_id=user_id)
+
+
+def reserve(blood_request, inventory_id, units=None, user_id=None):
+    """Hold free units at one location for a request.
+
+    ``units`` defaults to what the request still needs. Raises
+    InsufficientStock when the location cannot cover it.
+    """
+    def plan(inventory, request_row):
+        if request_row.status != 'active':
+            raise InventoryError(f'Request {request_row.id} is {request_row.status}')
+        if inventory.blood_type not in get_compatible_blood_types(request_row.blood_type):
+            raise InventoryError(f'{inventory.blood_type} cannot be given for a {request_row.blood_type} request')
+        held, consumed = _request_totals(request_row.id)
+        outstanding = request_row.units_needed - held - consumed
+        wanted = outstanding if units is None else units
+        if wanted <= 0 or wanted > outstanding:
+            raise InventoryError(f'Request {request_row.id} needs {max(outstanding, 0)} more units')
+        return wanted, -wanted, wanted
+
+    return _move(inventory_id, 'reserve', plan, request_id=blood_request.id, user_id=user_id)
+
+
+def _release_plan(units=None):
+    def plan(inventory, request_row):
+        held = _held_at_location(request_row.id, inventory.id)
+        released = held if units is None else units
+        if released <= 0 or released > held:
+            raise InventoryError(f'Request {request_row.id} holds {held} units at this location')
+        return released, released, -released
+    return plan
+
+
+def release(blood_request, inventory_id, units=None, user_id=None):
+    """Return units a request holds at a location to free stock (all by default)"""
+    return _move(inventory_id, 'release', _release_plan(units), request_id=blood_request.id, user_id=user_id)
+
+
+def release_held(request_ids, user_id=None):
+    """Release everything these requests hold, in the caller's transaction.
+
+    Used when requests close without using their stock. The caller commits
+    and then clears ``stock_cache``; if a concurrent writer wins a
+    compare-and-set this raises InventoryConflict, and the caller rolls the
+    whole transaction back. Returns the units released.
+    """
+    if not request_ids:
+        return 0
+    holdings = db.session.execute(
+        db.select(InventoryLedgerEntry.blood_request_id, InventoryLedgerEntry.inventory_id, _HELD_UNITS)
+        .where(InventoryLedgerEntry.blood_request_id.in_(request_ids))
+        .group_by(InventoryLedgerEntry.blood_request_id, InventoryLedgerEntry.inventory_id)
+    ).all()
+    released = 0
+    for request_id, inventory_id, held in holdings:
+        if not held:
+            continue
+        if _apply(inventory_id, 'release', _release_plan(held), request_id=request_id, user_id=user_id) is None:
+            raise InventoryConflict(f'Inventory {inventory_id} changed while releasing request {request_id}')
+        released += held
+    return released
+
+
+def consume(blood_request, inventory_id, units=None, user_id=None):
+    """Issue held units to the patient; the request is fulfilled once all are used"""
+    def plan(inventory, request_row):
+        held = _held_at_location(request_row.id, inventory.id)
+        used = held if units is None else units
+        if used <= 0 or used > held:
+            raise InventoryError(f'Request {request_row.id} holds {held} units at this location')
+        return used, 0, -used
+
+    return _move(inventory_id, 'consume', plan, request_id=blood_request.id, user_id=user_id)
+
+
+def reservations_for_request(request_id):
+    """``{inventory_id: units held}`` for every location a request holds stock at"""
+    rows = db.session.execute(
+        db.select(InventoryLedgerEntry.inventory_id, _HELD_UNITS)
+        .where(InventoryLedgerEntry.blood_request_id == request_id)
+        .group_by(InventoryLedgerEntry.inventory_id)
+    ).all()
+    return {inventory_id: held for inventory_id, held in rows if held}
+
+
+def stock_by_type():
+    """Free and reserved units per blood type across all locations.
+
+    One grouped query served from the inventory covering index, cached for
+    ``INVENTORY_STOCK_TTL`` seconds and dropped whenever this process moves
+    stock.
+    """
+    def compute():
+        stock = OrderedDict((bt, {'available': 0, 'reserved': 0, 'locations': 0}) for bt in BLOOD_TYPES)
+        rows = db.session.execute(
+            db.select(BloodInventory.blood_type,
+                      func.coalesce(func.sum(BloodInventory.units_available), 0),
+                      func.coalesce(func.sum(BloodInventory.units_reserved), 0),
+                      func.count(case((BloodInventory.units_available > 0, 1))))
+            .group_by(BloodInventory.blood_type)
+        ).all()
+        for blood_type, available, reserved, locations in rows:
+            if blood_type in stock:
+                stock[blood_type] = {'available': available, 'reserved': reserved, 'locations': locations}
+        return stock
+    return stock_cache.get_or_set('inventory:stock', compute)
+
+
+@event.listens_for(InventoryLedgerEntry, 'before_update')
+@event.listens_for(InventoryLedgerEntry, 'before_delete')
+def _ledger_is_append_only(mapper, connection, target):
+    raise InventoryError('Inventory ledger entries cannot be changed or deleted')
+
+
+def init_app(app):
+    """Configure how long the stock read model may be served from cache"""
+    stock_cache.ttl = app.config.setdefault('INVENTORY_STOCK_TTL', DEFAULT_STOCK_TTL)
@@ -0,0 +1,329 @@
+"""Ranked donor matching for blood requests.
+
+Donors are held in a compact column-oriented NumPy snapshot (one array per
+attribute, one slot per donor) so a request is scored against every donor
+with a handful of vectorised operations instead of a query per candidate.
+The snapshot is refreshed incrementally from ``DonorProfile.updated_at``
+and new ``BloodRequestResponse`` ids, so a large donor base is only read in
+full once per process. Donors are placed at their PIN code's centroid (see
+``geo``) so candidates can be scored, and optionally limited, by distance
+from the hospital.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from extensions import db
+from geo import UnknownPinCode, get_pin_directory, haversine_km
+from models import BloodRequestResponse, DonorProfile, User
+from utils import get_blood_type_urgency_score, get_compatible_blood_types
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+BLOOD_TYPE_INDEX = {blood_type: i for i, blood_type in enumerate(BLOOD_TYPES)}
+UNKNOWN_TYPE = len(BLOOD_TYPES)
+
+# Bit i stands for donor blood type BLOOD_TYPES[i]; the unknown slot never matches
+DONOR_TYPE_BITS = np.array([1 << i for i in range(len(BLOOD_TYPES))] + [0], dtype=np.uint8)
+
+# Recipient blood type -> bitmask of the donor blood types it can receive
+COMPATIBILITY_MASKS = {
+    recipient: sum(1 << BLOOD_TYPE_INDEX[donor] for donor in get_compatible_blood_types(recipient))
+    for recipient in BLOOD_TYPES
+}
+
+# Rarer donor types score lower so common compatible donors are asked first
+RARITY = np.array([get_blood_type_urgency_score(bt) for bt in BLOOD_TYPES] + [0], dtype=np.float32) / 8
+
+URGENCY_MULTIPLIERS = {'low': 0.5, 'medium': 1.0, 'high': 1.5, 'critical': 2.0}
+
+WEIGHTS = {
+    'exact_type': 1.0,
+    'eligible_now': 2.0,
+    'same_pin': 1.5,
+    'same_city': 1.0,
+    'same_state': 0.4,
+    'response_rate': 1.0,
+    'rarity': 0.5,
+}
+
+# Distance at which being close to the hospital stops adding to a donor's score
+NEARBY_KM = 50
+
+DEFAULT_REFRESH_INTERVAL = 30
+# Re-read rows this far behind the watermark so a transaction that commits
+# late with an older updated_at is still picked up
+REFRESH_OVERLAP = timedelta(seconds=60)
+NO_LOCATION = -1
+
+
+def normalise_location(value):
+    return ' '.join((value or '').lower().split())
+
+
+def pin_code(value):
+    digits = ''.join(ch for ch in (value or '') if ch.isdigit())
+    return int(digits) if digits else NO_LOCATION
+
+
+class DonorSnapshot:
+    """Column arrays describing every donor, indexed by slot"""
+
+    COLUMNS = (
+        DonorProfile.id, DonorProfile.blood_type, DonorProfile.city, DonorProfile.state,
+        DonorProfile.zip_code, DonorProfile.next_eligible_date, DonorProfile.is_available,
+        User.is_active, DonorProfile.updated_at
+    )
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.blood_type = np.empty(0, dtype=np.uint8)
+        self.next_eligible = np.empty(0, dtype=np.int32)  # date ordinal, 0 when never donated
+        self.pin = np.empty(0, dtype=np.int64)
+        self.latitude = np.empty(0, dtype=np.float32)  # PIN centroid, NaN when unknown
+        self.longitude = np.empty(0, dtype=np.float32)
+        self.city = np.empty(0, dtype=np.int32)
+        self.state = np.empty(0, dtype=np.int32)
+        self.active = np.empty(0, dtype=bool)  # available and account active
+        self.accepted = np.empty(0, dtype=np.float32)
+        self.responses = np.empty(0, dtype=np.float32)
+        self._slots = {}
+        self._city_codes = {}
+        self._state_codes = {}
+        self.directory = None
+        self.updated_watermark = None
+        self.response_watermark = 0
+        self.refreshed_at = 0.0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, directory=None):
+        """Build a snapshot of every donor from the database"""
+        snapshot = cls()
+        snapshot.directory = directory
+        snapshot._apply_donor_rows(snapshot._donor_rows())
+        snapshot._apply_response_counts()
+        snapshot.refreshed_at = time.monotonic()
+        return snapshot
+
+    def refresh(self):
+        """Pull donors changed and responses added since the last refresh"""
+        with self.lock:
+            self._apply_donor_rows(self._donor_rows(since=self.updated_watermark))
+            self._apply_response_counts()
+            self.refreshed_at = time.monotonic()
+
+    def use_directory(self, directory):
+        """Re-place every donor using a newly loaded PIN directory"""
+        with self.lock:
+            self.directory = directory
+            self.latitude, self.longitude = (values.astype(np.float32)
+                                             for values in directory.coordinates(self.pin))
+
+    def _donor_rows(self, since=None):
+        query = db.select(*self.COLUMNS).join(User, User.id == DonorProfile.user_id)
+        if since is not None:
+            # Applying a row twice is harmless, so overlapping reads are fine
+            query = query.where(DonorProfile.updated_at >= since - REFRESH_OVERLAP)
+        return db.session.execute(query.execution_options(yield_per=10000)).all()
+
+    def _code(self, codes, value):
+        key = normalise_location(value)
+        if not key:
+            return NO_LOCATION
+        return codes.setdefault(key, len(codes))
+
+    def _apply_donor_rows(self, rows):
+        if not rows:
+            return
+        count = len(rows)
+        encoded = {
+            'blood_type': np.empty(count, dtype=np.uint8),
+            'next_eligible': np.empty(count, dtype=np.int32),
+            'pin': np.empty(count, dtype=np.int64),
+            'city': np.empty(count, dtype=np.int32),
+            'state': np.empty(count, dtype=np.int32),
+            'active': np.empty(count, dtype=bool),
+        }
+        ids = np.empty(count, dtype=np.int64)
+        for i, (donor_id, blood_type, city, state, zip_code, next_eligible_date,
+                is_available, is_active, updated_at) in enumerate(rows):
+            ids[i] = donor_id
+            encoded['blood_type'][i] = BLOOD_TYPE_INDEX.get(blood_type, UNKNOWN_TYPE)
+            encoded['next_eligible'][i] = next_eligible_date.toordinal() if next_eligible_date else 0
+            encoded['pin'][i] = pin_code(zip_code)
+            encoded['city'][i] = self._code(self._city_codes, city)
+            encoded['state'][i] = self._code(self._state_codes, state)
+            encoded['active'][i] = bool(is_available) and bool(is_active)
+            if updated_at is not None and (self.updated_watermark is None or updated_at > self.updated_watermark):
+                self.updated_watermark = updated_at
+
+        if self.directory is not None:
+            encoded['latitude'], encoded['longitude'] = (values.astype(np.float32)
+                                                         for values in self.directory.coordinates(encoded['pin']))
+        else:
+            encoded['latitude'] = np.full(count, np.nan, dtype=np.float32)
+            encoded['longitude'] = np.full(count, np.nan, dtype=np.float32)
+
+        slots = np.fromiter((self._slots.get(int(donor_id), -1) for donor_id in ids), dtype=np.int64, count=count)
+        known = slots >= 0
+        for name, values in encoded.items():
+            getattr(self, name)[slots[known]] = values[known]
+
+        new = ~known
+        if new.any():
+            first_slot = len(self.ids)
+            new_ids = ids[new]
+            self.ids = np.concatenate([self.ids, new_ids])
+            for name, values in encoded.items():
+                setattr(self, name, np.concatenate([getattr(self, name), values[new]]))
+            self.accepted = np.concatenate([self.accepted, np.zeros(len(new_ids), dtype=np.float32)])
+            self.responses = np.concatenate([self.responses, np.zeros(len(new_ids), dtype=np.float32)])
+            for offset, donor_id in enumerate(new_ids.tolist()):
+                self._slots[donor_id] = first_slot + offset
+
+    def _apply_response_counts(self):
+        rows = db.session.execute(
+            db.select(BloodRequestResponse.donor_id,
+                      func.count(BloodRequestResponse.id),
+                      func.count(db.case((BloodRequestResponse.status == 'accepted', 1))),
+                      func.max(BloodRequestResponse.id))
+            .where(BloodRequestResponse.id > self.response_watermark)
+            .group_by(BloodRequestResponse.donor_id)
+        ).all()
+        for donor_id, total, accepted, max_id in rows:
+            self.response_watermark = max(self.response_watermark, max_id)
+            slot = self._slots.get(donor_id)
+            if slot is not None:
+                self.responses[slot] += total
+                self.accepted[slot] += accepted
+
+    def _origin(self, zip_code):
+        if self.directory is None:
+            return None
+        try:
+            return self.directory.locate(zip_code)
+        except UnknownPinCode:
+            return None
+
+    def rank(self, blood_type, urgency_level, city, state, zip_code, needed_by=None, limit=20, today=None,
+             radius_km=None):
+        """Score every donor for a request and return the best ``limit``.
+
+        Returns a list of ``(donor_id, score, eligible_now, distance_km)``
+        tuples, best first; ``distance_km`` is None when either PIN code has
+        no known location. Donors who are unavailable, incompatible or still
+        in their wait period on the ``needed_by`` date are never returned, nor
+        are donors beyond ``radius_km`` when the hospital's PIN is located.
+        A ``limit`` below 1 returns nothing.
+        """
+        if limit < 1:
+            return []
+        today = (today or date.today()).toordinal()
+        deadline = needed_by.toordinal() if needed_by else today
+        mask = COMPATIBILITY_MASKS.get(blood_type, 0)
+        origin = self._origin(zip_code)
+
+        with self.lock:
+            candidates = ((DONOR_TYPE_BITS[self.blood_type] & mask) != 0) & self.active
+            candidates &= self.next_eligible <= max(deadline, today)
+            slots = np.flatnonzero(candidates)
+            distance = None
+            if origin is not None:
+                distance = haversine_km(np.float32(origin[0]), np.float32(origin[1]),
+                                        self.latitude[slots], self.longitude[slots])
+                if radius_km is not None:
+                    # NaN (unknown location) compares False, so those donors drop out too
+                    within = distance <= radius_km
+                    slots, distance = slots[within], distance[within]
+            if not len(slots):
+                return []
+
+            donor_type = self.blood_type[slots]
+            eligible_now = self.next_eligible[slots] <= today
+            urgency_multiplier = URGENCY_MULTIPLIERS.get(urgency_level, 1.0)
+            city_code = self._city_codes.get(normalise_location(city), NO_LOCATION - 1)
+            state_code = self._state_codes.get(normalise_location(state), NO_LOCATION - 1)
+            pin = pin_code(zip_code)
+
+            same_pin = self.pin[slots] == pin if pin != NO_LOCATION else np.zeros(len(slots), dtype=bool)
+            same_city = self.city[slots] == city_code
+            same_state = self.state[slots] == state_code
+            # Closest match only: PIN beats city beats state
+            location = np.where(same_pin, WEIGHTS['same_pin'],
+                                np.where(same_city, WEIGHTS['same_city'],
+                                         np.where(same_state, WEIGHTS['same_state'], 0.0)))
+            if distance is not None:
+                # Close donors in another city or state still count as close; fmax skips unknown (NaN) distances
+                nearby = WEIGHTS['same_pin'] * np.clip(1 - distance / NEARBY_KM, 0, None)
+                location = np.fmax(location, nearby)
+            # Laplace-smoothed acceptance rate, 0.5 for donors with no history
+            response_rate = (self.accepted[slots] + 1) / (self.responses[slots] + 2)
+
+            scores = (
+                WEIGHTS['exact_type'] * (donor_type == BLOOD_TYPE_INDEX.get(blood_type, UNKNOWN_TYPE))
+                + WEIGHTS['eligible_now'] * eligible_now * urgency_multiplier
+                + location * urgency_multiplier
+                + WEIGHTS['response_rate'] * response_rate
+                - WEIGHTS['rarity'] * RARITY[donor_type]
+            ).astype(np.float32)
+
+            if len(scores) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(self.ids[slots[i]]), float(scores[i]), bool(eligible_now[i]),
+                     None if distance is None or np.isnan(distance[i]) else round(float(distance[i]), 1))
+                    for i in top]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The process-wide snapshot, loaded on first use and refreshed when stale"""
+    global _snapshot
+    interval = current_app.config.get('MATCHING_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+    directory = get_pin_directory()
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = DonorSnapshot.load(directory)
+        elif time.monotonic() - _snapshot.refreshed_at >= interval:
+            _snapshot.refresh()
+        if _snapshot.directory is not directory:
+            _snapshot.use_directory(directory)
+        return _snapshot
+
+
+def rank_donors(blood_request, limit=20, radius_km=None):
+    """Top candidate donors for a blood request.
+
+    Returns a list of ``(DonorProfile, score, eligible_now, distance_km)``
+    tuples, best first. ``radius_km`` keeps only donors that close to the
+    hospital's PIN code, when that PIN has a known location.
+    """
+    hospital = blood_request.hospital
+    ranked = get_snapshot().rank(
+        blood_request.blood_type,
+        blood_request.urgency_level,
+        hospital.city,
+        hospital.state,
+        hospital.zip_code,
+        needed_by=blood_request.needed_by.date() if blood_request.needed_by else None,
+        limit=limit,
+        radius_km=radius_km
+    )
+    if not ranked:
+        return []
+    profiles = {profile.id: profile for profile in
+                DonorProfile.query.filter(DonorProfile.id.in_([donor_id for donor_id, _, _, _ in ranked]))}
+    return [(profiles[donor_id], score, eligible_now, distance_km)
+            for donor_id, score, eligible_now, distance_km in ranked if donor_id in profiles]
@@ -0,0 +1,390 @@
+"""Schema commands; the app never creates or alters tables on its own.
+
+``flask schema create`` builds a new database. ``db.create_all()`` only
+creates missing tables, so columns and indexes added to the models never
+reach a database whose tables already exist: ``flask schema upgrade``
+creates missing tables, adds missing columns, then indexes (dropping any
+they replace), then the donor text search index (see ``fulltext``).
+``flask schema indexes`` creates missing indexes only, and ``flask schema
+check-plans`` EXPLAINs the hot route queries and fails if one falls back to
+a full scan.
+"""
+import json
+from datetime import date, datetime
+
+import click
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.schema import CreateIndex
+
+import fulltext
+from extensions import db
+from models import (User, DonorProfile, HospitalProfile, OrganizationProfile, BloodRequest,
+                    BloodRequestResponse, Donation, DonationEvent, EventRegistration, Notification,
+                    NotificationJob, BloodInventory, InventoryLedgerEntry, DONATION_INTERVAL_DAYS,
+                    normalise_city, normalise_pin)
+
+
+def declared_indexes():
+    """Every index declared on the models, in table order"""
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            yield index
+
+
+def _backfill_next_eligible_date(conn):
+    if conn.dialect.name == 'postgresql':
+        next_eligible = DonorProfile.last_donation_date + DONATION_INTERVAL_DAYS
+    else:
+        next_eligible = func.date(DonorProfile.last_donation_date, f'+{DONATION_INTERVAL_DAYS} days')
+    conn.execute(db.update(DonorProfile.__table__)
+                 .where(DonorProfile.last_donation_date.isnot(None))
+                 .values(next_eligible_date=next_eligible))
+
+
+def _backfill_updated_at(conn):
+    # A bound utcnow() matches what the model writes; CURRENT_TIMESTAMP is
+    # stored in a different text format on SQLite and compares wrongly
+    conn.execute(db.update(DonorProfile.__table__)
+                 .where(DonorProfile.updated_at.is_(None))
+                 .values(updated_at=datetime.utcnow()))
+
+
+def _backfill_unread_notifications(conn):
+    unread = (db.select(func.count(Notification.id))
+              .where(Notification.user_id == User.id, Notification.is_read == False)
+              .scalar_subquery())
+    conn.execute(db.update(User.__table__).values(unread_notifications=unread))
+
+
+def _backfill_normalised(table, source, target, normalise, batch=5000):
+    """Backfill ``target`` as ``normalise(source)`` in Python, so it matches what the model writes"""
+    def backfill(conn):
+        last_id = 0
+        while True:
+            rows = conn.execute(db.select(table.c.id, table.c[source])
+                                .where(table.c.id > last_id).order_by(table.c.id).limit(batch)).all()
+            if not rows:
+                return
+            conn.execute(db.update(table).where(table.c.id == db.bindparam('row_id'))
+                         .values({target: db.bindparam('key')}),
+                         [{'row_id': row_id, 'key': normalise(value)} for row_id, value in rows])
+            last_id = rows[-1].id
+    return backfill
+
+
+def _backfill_response_counts(conn):
+    def count(status):
+        return (db.select(func.count(BloodRequestResponse.id))
+                .where(BloodRequestResponse.request_id == BloodRequest.id, BloodRequestResponse.status == status)
+                .scalar_subquery())
+    conn.execute(db.update(BloodRequest.__table__).values(accepted_count=count('accepted'),
+                                                         declined_count=count('declined')))
+
+
+def _drop_duplicate_responses(conn):
+    """Keep each donor's first response to a request, then recount, so the unique index can be built"""
+    first = (db.select(func.min(BloodRequestResponse.id))
+             .group_by(BloodRequestResponse.request_id, BloodRequestResponse.donor_id))
+    removed = conn.execute(db.delete(BloodRequestResponse.__table__)
+                           .where(BloodRequestResponse.id.not_in(first))).rowcount
+    if removed:
+        _backfill_response_counts(conn)
+
+
+# Columns derived from existing data, filled in right after they are added
+BACKFILLS = {
+    'donor_profile.next_eligible_date': _backfill_next_eligible_date,
+    'donor_profile.city_key': _backfill_normalised(DonorProfile.__table__, 'city', 'city_key', normalise_city),
+    'donor_profile.pin_key': _backfill_normalised(DonorProfile.__table__, 'zip_code', 'pin_key', normalise_pin),
+    'donor_profile.updated_at': _backfill_updated_at,
+    'user.unread_notifications': _backfill_unread_notifications,
+    'blood_request.accepted_count': _backfill_response_counts,
+}
+
+# Unique indexes whose existing rows must be cleaned up before they can be built
+BEFORE_INDEX = {
+    'uq_blood_request_response_request_donor': _drop_duplicate_responses,
+}
+
+# Indexes replaced by newer declarations: (table, index name)
+RETIRED_INDEXES = [
+    ('blood_request_response', 'ix_blood_request_response_request_donor'),
+    ('blood_request', 'ix_blood_request_status_type_requested'),
+]
+
+
+def add_missing_columns(engine):
+    """ALTER existing tables to add model columns they lack, returning their names.
+
+    Columns are added nullable unless they carry a server default, since
+    existing rows have no value for them. On PostgreSQL a NOT NULL column is
+    made NOT NULL once its backfill has filled those rows; SQLite cannot
+    change an existing column, so there it stays nullable.
+    """
+    inspector = db.inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f'ALTER TABLE {preparer.format_table(table)} '
+                       f'ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}')
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    default = default.text if hasattr(default, 'text') else f"'{default}'"
+                    ddl += f' DEFAULT {default}'
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                conn.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+        for name in added:
+            if name not in BACKFILLS:
+                continue
+            BACKFILLS[name](conn)
+            table_name, column_name = name.split('.')
+            table = db.metadata.tables[table_name]
+            column = table.c[column_name]
+            if engine.dialect.name == 'postgresql' and not column.nullable and column.server_default is None:
+                conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} '
+                                  f'ALTER COLUMN {preparer.format_column(column)} SET NOT NULL'))
+    return added
+
+
+def apply_indexes(engine, concurrently=False):
+    """Create declared indexes that are missing, returning their names.
+
+    Duplicate rows that would break a new unique index are removed first
+    (see ``BEFORE_INDEX``).
+
+    On PostgreSQL ``concurrently`` builds them with CREATE INDEX CONCURRENTLY
+    so writes to large tables are not blocked while the index builds.
+    """
+    existing = {}
+    inspector = db.inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            existing[table.name] = {ix['name'] for ix in inspector.get_indexes(table.name)}
+
+    created = []
+    # CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for index in declared_indexes():
+            if index.table.name not in existing or index.name in existing[index.table.name]:
+                continue
+            if index.name in BEFORE_INDEX:
+                with engine.begin() as cleanup:
+                    BEFORE_INDEX[index.name](cleanup)
+            ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+            if concurrently and engine.dialect.name == 'postgresql':
+                ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                ddl = ddl.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+            conn.execute(text(ddl))
+            created.append(index.name)
+        if created:
+            # Refresh planner statistics so the new indexes get picked up
+            conn.execute(text('ANALYZE'))
+    return created
+
+
+def drop_retired_indexes(engine):
+    """Drop indexes listed in ``RETIRED_INDEXES`` that still exist, returning their names"""
+    inspector = db.inspect(engine)
+    dropped = []
+    with engine.begin() as conn:
+        for table, name in RETIRED_INDEXES:
+            if inspector.has_table(table) and name in {ix['name'] for ix in inspector.get_indexes(table)}:
+                conn.execute(text(f'DROP INDEX {engine.dialect.identifier_preparer.quote(name)}'))
+                dropped.append(name)
+    return dropped
+
+
+def hot_queries():
+    """The filters behind the busiest routes, keyed by a short name"""
+    today = date.today()
+    return {
+        'donor_dashboard.donations': db.select(Donation)
+            .where(Donation.donor_id == 1)
+            .order_by(Donation.donation_date.desc()).limit(5),
+        'donor_dashboard.blood_requests': db.select(BloodRequest)
+            .where(BloodRequest.blood_type.in_(['O+', 'O-']), BloodRequest.status == 'active')
+            .order_by(BloodRequest.requested_at.desc()).limit(5),
+        'donor_dashboard.upcoming_events': db.select(DonationEvent)
+            .where(DonationEvent.event_date >= today, DonationEvent.status == 'upcoming')
+            .order_by(DonationEvent.event_date.asc()).limit(5),
+        'hospital_dashboard.blood_requests': db.select(BloodRequest)
+            .where(BloodRequest.hospital_id == 1)
+            .order_by(BloodRequest.requested_at.desc()).limit(10),
+        'organization_dashboard.events': db.select(DonationEvent)
+            .where(DonationEvent.organization_id == 1)
+            .order_by(DonationEvent.event_date.desc()).limit(10),
+        'request_blood.matching_donors': db.select(DonorProfile.id, DonorProfile.user_id)
+            .where(DonorProfile.blood_type.in_(['O+', 'O-']), DonorProfile.is_available == True),
+        'search_donors.blood_type': db.select(DonorProfile).join(User)
+            .where(User.is_active == True, DonorProfile.blood_type == 'O-'),
+        'search_donors.city': db.select(DonorProfile.id)
+            .where(DonorProfile.state == 'Tamil Nadu', DonorProfile.city_key == 'chennai')
+            .order_by(DonorProfile.full_name, DonorProfile.id).limit(20),
+        'search_donors.pin': db.select(DonorProfile.id)
+            .where(DonorProfile.pin_key.in_(['600001', '600002']))
+            .order_by(DonorProfile.id).limit(20),
+        'expire_requests.overdue': db.select(BloodRequest.id, BloodRequest.blood_type)
+            .where(BloodRequest.status == 'active', BloodRequest.needed_by < datetime(today.year, today.month, today.day))
+            .order_by(BloodRequest.needed_by, BloodRequest.id).limit(500),
+        'signups.next_in_line': db.select(EventRegistration.id)
+            .where(EventRegistration.event_id == 1, EventRegistration.status == 'waitlisted')
+            .order_by(EventRegistration.created_at, EventRegistration.id).limit(1),
+        'signups.donor_statuses': db.select(EventRegistration.event_id, EventRegistration.status)
+            .where(EventRegistration.donor_id == 1, EventRegistration.event_id.in_([1, 2, 3])),
+        'respond_to_request.existing_response': db.select(BloodRequestResponse)
+            .where(BloodRequestResponse.request_id == 1, BloodRequestResponse.donor_id == 1),
+        'get_user_profile.donor': db.select(DonorProfile).where(DonorProfile.user_id == 1),
+        'get_user_profile.hospital': db.select(HospitalProfile).where(HospitalProfile.user_id == 1),
+        'get_user_profile.organization': db.select(OrganizationProfile)
+            .where(OrganizationProfile.user_id == 1),
+        'admin_dashboard.role_count': db.select(func.count(User.id)).where(User.role == 'donor'),
+        'admin_dashboard.active_requests': db.select(func.count(BloodRequest.id))
+            .where(BloodRequest.status == 'active'),
+        'admin_analytics.registrations': db.select(User.id, User.role, User.created_at)
+            .where(User.created_at >= datetime(today.year, today.month, today.day)),
+        'admin_lists.by_role': db.select(User).where(User.role == 'donor')
+            .order_by(User.created_at.desc()),
+        'manage_users.page': db.select(User).where(User.role == 'donor')
+            .order_by(User.created_at.desc(), User.id.desc()).limit(20),
+        'notifications.by_user': db.select(Notification).where(Notification.user_id == 1)
+            .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(20),
+        'notifications.unread_by_user': db.select(Notification.id)
+            .where(Notification.user_id == 1, Notification.is_read == False, Notification.id <= 1000),
+        'notifications.pending_jobs': db.select(NotificationJob.id)
+            .where(NotificationJob.status == 'pending'),
+        'inventory.stock_by_type': db.select(BloodInventory.blood_type, func.sum(BloodInventory.units_available),
+                                             func.sum(BloodInventory.units_reserved))
+            .group_by(BloodInventory.blood_type),
+        'inventory.held_by_request': db.select(InventoryLedgerEntry.entry_type, InventoryLedgerEntry.units)
+            .where(InventoryLedgerEntry.blood_request_id == 1, InventoryLedgerEntry.inventory_id == 1),
+    }
+
+
+def _sqlite_full_scans(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    rows = conn.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    # "SCAN t" without an index is a full table scan; "SCAN t USING INDEX"
+    # walks an index in order, "SEARCH" is an index lookup and "SCAN t
+    # VIRTUAL TABLE" is answered by the virtual table's own (FTS) index.
+    return [row[-1] for row in rows
+            if row[-1].startswith('SCAN') and 'USING' not in row[-1] and 'VIRTUAL TABLE' not in row[-1]]
+
+
+def _postgresql_full_scans(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    # Small tables make a sequential scan the cheapest plan; penalising it
+    # shows whether an index could serve the query at all.
+    conn.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = conn.execute(text(f'EXPLAIN (FORMAT JSON) {compiled}')).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def _sqlite_schema_only(engine):
+    """In-memory copy of a SQLite database's tables and indexes, without rows.
+
+    SQLite has no way to penalise full scans, and once ANALYZE has run on a
+    small database it correctly prefers scanning. Planning against the bare
+    schema shows whether the live indexes can serve each query.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END"
+        )).all()
+    # Virtual tables create their own shadow tables
+    virtual = [name for _, name, sql in rows if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    schema_engine = create_engine('sqlite://')
+    with schema_engine.begin() as conn:
+        for kind, name, sql in rows:
+            if kind == 'table' and any(name.startswith(f'{parent}_') for parent in virtual):
+                continue
+            conn.execute(text(sql))
+    return schema_engine
+
+
+def check_query_plans(engine):
+    """EXPLAIN each hot query, returning {name: [full scan descriptions]}"""
+    if engine.dialect.name == 'postgresql':
+        inspect_plan = _postgresql_full_scans
+    else:
+        inspect_plan = _sqlite_full_scans
+        engine = _sqlite_schema_only(engine)
+    failures = {}
+    for name, statement in hot_queries().items():
+        with engine.connect() as conn:
+            scans = inspect_plan(conn, statement)
+            conn.rollback()
+        if scans:
+            failures[name] = scans
+    return failures
+
+
+def init_app(app):
+    """Register the ``flask schema`` command group"""
+
+    @app.cli.group('schema')
+    def schema():
+        """Database schema maintenance."""
+
+    @schema.command('create')
+    def create_command():
+        """Create the tables, indexes and donor text search index on a new database."""
+        db.create_all()
+        click.echo('Tables created.')
+
+    @schema.command('upgrade')
+    @click.option('--concurrently', is_flag=True,
+                  help='PostgreSQL: build indexes with CREATE INDEX CONCURRENTLY.')
+    def upgrade_command(concurrently):
+        """Create missing tables, then add missing columns and indexes to existing ones."""
+        db.create_all()
+        for name in add_missing_columns(db.engine):
+            click.echo(f'Added column {name}')
+        for name in apply_indexes(db.engine, concurrently=concurrently):
+            click.echo(f'Created {name}')
+        for name in drop_retired_indexes(db.engine):
+            click.echo(f'Dropped {name}')
+        with db.engine.begin() as conn:
+            if fulltext.install(conn):
+                click.echo('Created the donor text search index')
+        click.echo('Schema is up to date.')
+
+    @schema.command('indexes')
+    @click.option('--concurrently', is_flag=True,
+                  help='PostgreSQL: build with CREATE INDEX CONCURRENTLY.')
+    def indexes_command(concurrently):
+        """Create declared indexes missing from existing tables."""
+        created = apply_indexes(db.engine, concurrently=concurrently)
+        for name in created:
+            click.echo(f'Created {name}')
+        for name in drop_retired_indexes(db.engine):
+            click.echo(f'Dropped {name}')
+        click.echo(f'{len(created)} index(es) created.')
+
+    @schema.command('check-plans')
+    def check_plans_command():
+        """Fail if a hot route query falls back to a sequential scan."""
+        failures = check_query_plans(db.engine)
+        for name in hot_queries():
+            status = 'FULL SCAN: ' + '; '.join(failures[name]) if name in failures else 'ok'
+            click.echo(f'{name:<45} {status}')
+        if failures:
+            raise click.ClickException(f'{len(failures)} hot query(ies) use a sequential scan.')
@@ -1,8 +1,30 @@
-#from app import db
+import re
 from extensions import db    #added
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from sqlalchemy import or_
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Minimum days between whole-blood donations
+DONATION_INTERVAL_DAYS = 56
+
+def normalise_city(city):
+    """Lowercase a city name and reduce punctuation and runs of spaces to single spaces"""
+    return ' '.join(re.findall(r'[^\W_]+', (city or '').casefold()))
+
+def normalise_pin(zip_code):
+    """The six-digit PIN code in a free-text value, or None"""
+    digits = ''.join(ch for ch in (zip_code or '') if ch.isdigit())
+    return digits if len(digits) == 6 else None
+
+# Column defaults for bulk Core inserts, which skip the @validates hooks below
+def _default_city_key(context):
+    return normalise_city(context.get_current_parameters().get('city'))
+
+def _default_pin_key(context):
+    return normalise_pin(context.get_current_parameters().get('zip_code'))
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -11,11 +33,18 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # donor, hospital, organization, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # Denormalised so the unread badge never counts rows; maintained by notifications.py
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     donor_profile = db.relationship('DonorProfile', backref='user', uselist=False)
     hospital_profile = db.relationship('HospitalProfile', backref='user', uselist=False)
     organization_profile = db.relationship('OrganizationProfile', backref='user', uselist=False)
+
+    __table_args__ = (
+        db.Index('ix_user_role_created_at', 'role', 'created_at'),
+        db.Index('ix_user_created_at', 'created_at'),
+    )
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -31,15 +60,63 @@ class DonorProfile(db.Model):
     phone = db.Column(db.String(20), nullable=False)
     address = db.Column(db.Text, nullable=False)
     city = db.Column(db.String(50), nullable=False)
+    city_key = db.Column(db.String(50), default=_default_city_key)  # normalise_city(city), kept in sync on write
     state = db.Column(db.String(50), nullable=False)
     zip_code = db.Column(db.String(10), nullable=False)
+    pin_key = db.Column(db.String(6), default=_default_pin_key)  # normalise_pin(zip_code), locates the donor
     date_of_birth = db.Column(db.Date, nullable=False)
     last_donation_date = db.Column(db.Date)
+    next_eligible_date = db.Column(db.Date)  # last_donation_date + DONATION_INTERVAL_DAYS, NULL if never donated
     medical_conditions = db.Column(db.Text)
     is_available = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)  # drives incremental matching snapshots
     
     # Relationships
     donations = db.relationship('Donation', backref='donor')
+    
+    @validates('city')
+    def _sync_city_key(self, key, city):
+        self.city_key = normalise_city(city)
+        return city
+    
+    @validates('zip_code')
+    def _sync_pin_key(self, key, zip_code):
+        self.pin_key = normalise_pin(zip_code)
+        return zip_code
+    
+    @validates('last_donation_date')
+    def _sync_next_eligible_date(self, key, last_donation_date):
+        self.next_eligible_date = (last_donation_date + timedelta(days=DONATION_INTERVAL_DAYS)
+                                   if last_donation_date else None)
+        return last_donation_date
+    
+    @hybrid_property
+    def is_eligible(self):
+        """Whether the donor's wait period since their last donation is over"""
+        return self.next_eligible_date is None or self.next_eligible_date <= date.today()
+    
+    @is_eligible.expression
+    def is_eligible(cls):
+        return or_(cls.next_eligible_date.is_(None), cls.next_eligible_date <= date.today())
+
+    __table_args__ = (
+        db.Index('ix_donor_profile_blood_type_available', 'blood_type', 'is_available'),
+        db.Index('ix_donor_profile_user_id', 'user_id'),
+        db.Index('ix_donor_profile_full_name', 'full_name', 'id'),
+        db.Index('ix_donor_profile_city', 'city', 'id'),
+        db.Index('ix_donor_profile_state_city_key', 'state', 'city_key', 'full_name', 'id'),
+        db.Index('ix_donor_profile_pin_key', 'pin_key', 'id'),
+        db.Index('ix_donor_profile_updated_at', 'updated_at'),
+        db.Index('ix_donor_profile_type_next_eligible', 'blood_type', 'next_eligible_date'),
+    )
+
+class PinCode(db.Model):
+    # Centroid of a PIN code area; reference data loaded with `flask pins load`
+    pin = db.Column(db.String(6), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    district = db.Column(db.String(100))
+    state = db.Column(db.String(50))
 
 class HospitalProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -56,6 +133,8 @@ class HospitalProfile(db.Model):
     # Relationships
     blood_requests = db.relationship('BloodRequest', backref='hospital')
 
+    __table_args__ = (db.Index('ix_hospital_profile_user_id', 'user_id'),)
+
 class OrganizationProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -71,6 +150,8 @@ class OrganizationProfile(db.Model):
     # Relationships
     events = db.relationship('DonationEvent', backref='organization')
 
+    __table_args__ = (db.Index('ix_organization_profile_user_id', 'user_id'),)
+
 class BloodRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     hospital_id = db.Column(db.Integer, db.ForeignKey('hospital_profile.id'), nullable=False)
@@ -78,13 +159,28 @@ class BloodRequest(db.Model):
     units_needed = db.Column(db.Integer, nullable=False)
     urgency_level = db.Column(db.String(20), nullable=False)  # low, medium, high, critical
     description = db.Column(db.Text)
-    status = db.Column(db.String(20), default='active')  # active, fulfilled, cancelled
+    status = db.Column(db.String(20), default='active')  # active, fulfilled, cancelled, expired
     requested_at = db.Column(db.DateTime, default=datetime.utcnow)
     needed_by = db.Column(db.DateTime, nullable=False)
+    # Denormalised so totals never count responses; maintained by utils.record_response
+    accepted_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    declined_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped by every stock movement for the request; see inventory.py
+    stock_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     responses = db.relationship('BloodRequestResponse', backref='request')
 
+    __table_args__ = (
+        # Partial indexes over open requests only; the expiry sweeper keeps them small
+        db.Index('ix_blood_request_active_type_requested', 'blood_type', 'requested_at',
+                 sqlite_where=db.text("status = 'active'"), postgresql_where=db.text("status = 'active'")),
+        db.Index('ix_blood_request_active_needed_by', 'needed_by',
+                 sqlite_where=db.text("status = 'active'"), postgresql_where=db.text("status = 'active'")),
+        db.Index('ix_blood_request_hospital_requested', 'hospital_id', 'requested_at'),
+        db.Index('ix_blood_request_requested_at', 'requested_at'),
+    )
+
 class BloodRequestResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'), nullable=False)
@@ -96,6 +192,13 @@ class BloodRequestResponse(db.Model):
     # Relationships
     donor = db.relationship('DonorProfile', backref='request_responses')
 
+    __table_args__ = (
+        # One response per donor per request; record_response's upsert relies on it
+        db.Index('uq_blood_request_response_request_donor', 'request_id', 'donor_id', unique=True),
+        db.Index('ix_blood_request_response_donor_id', 'donor_id'),
+        db.Index('ix_blood_request_response_date', 'response_date'),
+    )
+
 class Donation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     donor_id = db.Column(db.Integer, db.ForeignKey('donor_profile.id'), nullable=False)
@@ -105,6 +208,11 @@ class Donation(db.Model):
     location = db.Column(db.String(200))
     notes = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_donation_donor_date', 'donor_id', 'donation_date'),
+        db.Index('ix_donation_date', 'donation_date'),
+    )
+
 class DonationEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization_profile.id'), nullable=False)
@@ -119,15 +227,73 @@ class DonationEvent(db.Model):
     state = db.Column(db.String(50), nullable=False)
     max_participants = db.Column(db.Integer)
     status = db.Column(db.String(20), default='upcoming')  # upcoming, ongoing, completed, cancelled
+    # Seats taken; only ever moved by a conditional UPDATE (see signups.py)
+    registered_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_donation_event_status_date', 'status', 'event_date'),
+        db.Index('ix_donation_event_organization_date', 'organization_id', 'event_date'),
+    )
+
+    @property
+    def seats_left(self):
+        if self.max_participants is None:
+            return None
+        return max(0, self.max_participants - self.registered_count)
+
+class EventRegistration(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('donation_event.id'), nullable=False)
+    donor_id = db.Column(db.Integer, db.ForeignKey('donor_profile.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # registered, waitlisted, cancelled
+    # Signed up, or last re-joined after cancelling; the waitlist is served in this order
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    event = db.relationship('DonationEvent', backref='registrations')
+    donor = db.relationship('DonorProfile', backref='event_registrations')
+
+    __table_args__ = (
+        # One registration per donor per event; register()'s upsert relies on it
+        db.Index('uq_event_registration_event_donor', 'event_id', 'donor_id', unique=True),
+        db.Index('ix_event_registration_event_status_created', 'event_id', 'status', 'created_at'),
+        db.Index('ix_event_registration_donor_id', 'donor_id'),
+    )
 
 class BloodInventory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     blood_type = db.Column(db.String(5), nullable=False)
-    units_available = db.Column(db.Integer, default=0)
+    units_available = db.Column(db.Integer, default=0)  # on hand and free to reserve
+    units_reserved = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     location = db.Column(db.String(200), nullable=False)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every balance change; writers compare-and-set on it (see inventory.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
-    __table_args__ = (db.UniqueConstraint('blood_type', 'location'),)
+    __table_args__ = (
+        db.UniqueConstraint('blood_type', 'location'),
+        db.Index('ix_blood_inventory_type_stock', 'blood_type', 'units_available', 'units_reserved'),
+    )
+
+class InventoryLedgerEntry(db.Model):
+    """Append-only record of every change to a BloodInventory balance"""
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, db.ForeignKey('blood_inventory.id'), nullable=False)
+    blood_request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'))
+    entry_type = db.Column(db.String(20), nullable=False)  # receive, reserve, release, consume
+    units = db.Column(db.Integer, nullable=False)
+    available_after = db.Column(db.Integer, nullable=False)
+    reserved_after = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Relationships
+    inventory = db.relationship('BloodInventory', backref='ledger_entries')
+
+    __table_args__ = (
+        db.Index('ix_inventory_ledger_inventory', 'inventory_id', 'id'),
+        db.Index('ix_inventory_ledger_request', 'blood_request_id', 'inventory_id'),
+    )
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -140,3 +306,36 @@ class Notification(db.Model):
     
     # Relationships
     user = db.relationship('User', backref='notifications')
+
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notification_user_unread', 'user_id', 'is_read'),
+    )
+
+class NotificationJob(db.Model):
+    """Queued fan-out of one notification to every matching donor"""
+    id = db.Column(db.Integer, primary_key=True)
+    blood_request_id = db.Column(db.Integer, db.ForeignKey('blood_request.id'))
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    notification_type = db.Column(db.String(50), nullable=False)
+    blood_types = db.Column(db.String(50), nullable=False)  # comma-separated donor blood types to notify
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    last_donor_id = db.Column(db.Integer, default=0)  # keyset cursor, lets a crashed job resume
+    notified_count = db.Column(db.Integer, default=0)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # Relationships
+    blood_request = db.relationship('BloodRequest')
+
+    __table_args__ = (db.Index('ix_notification_job_status', 'status'),)
+
+class SchedulerLease(db.Model):
+    """Which process may run a periodic job until ``expires_at``"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
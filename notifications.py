@@ -0,0 +1,355 @@
+"""Background fan-out of notifications to large donor sets.
+
+A blood request can match tens of thousands of donors, so the route only
+records a ``NotificationJob`` next to the ``BloodRequest`` and returns.
+Workers (threads inside the web process, or the ``notifications-worker``
+CLI command in a separate process) claim jobs and insert ``Notification``
+rows in chunks with a single multi-row INSERT per chunk.
+
+Each user's unread count is stored on ``User.unread_notifications`` and
+moved in the same transaction as the rows it counts, so the inbox badge
+rendered on every page is a column read rather than a ``COUNT(*)``.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import click
+from flask import session
+from sqlalchemy import insert, tuple_, update
+
+from extensions import db
+from models import DonorProfile, Notification, NotificationJob, User
+from search import decode_cursor, encode_cursor, InvalidCursor
+from utils import get_compatible_blood_types, load_identity
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_WORKER_THREADS = 2
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_STALE_AFTER = 300
+MAX_ATTEMPTS = 3
+INBOX_PAGE_SIZE = 25
+
+
+def donor_blood_types_for_request(blood_type):
+    """Donor blood types that should be notified about a request"""
+    compatible_types = [blood_type]
+    if blood_type != 'O-':
+        compatible_types.extend(get_compatible_blood_types(blood_type))
+    return sorted(set(compatible_types))
+
+
+def enqueue_fanout(title, message, notification_type, blood_types, blood_request=None):
+    """Queue a notification for every available donor of the given blood types.
+
+    The job is only added to the session; it is committed together with the
+    caller's own changes so a request is never saved without its fan-out.
+    """
+    job = NotificationJob(
+        blood_request=blood_request,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        blood_types=','.join(blood_types),
+        status='pending',
+        last_donor_id=0,
+        notified_count=0,
+        attempts=0
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue_blood_request_fanout(blood_request, hospital_name):
+    """Queue the donor notifications for a new blood request"""
+    return enqueue_fanout(
+        f'Blood Request - {blood_request.blood_type}',
+        f'{hospital_name} needs {blood_request.units_needed} units of {blood_request.blood_type} blood. '
+        f'Urgency: {blood_request.urgency_level.title()}',
+        'blood_request',
+        donor_blood_types_for_request(blood_request.blood_type),
+        blood_request=blood_request
+    )
+
+
+def claim_next_job(stale_after=DEFAULT_STALE_AFTER):
+    """Atomically claim the oldest runnable job, or return None.
+
+    Jobs left 'running' by a worker that stopped heart-beating are picked up
+    again and resume from their saved cursor.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=stale_after)
+    runnable = db.or_(
+        NotificationJob.status == 'pending',
+        db.and_(NotificationJob.status == 'running',
+                NotificationJob.heartbeat_at < stale_before)
+    )
+    candidates = db.session.execute(
+        db.select(NotificationJob.id, NotificationJob.status, NotificationJob.attempts)
+        .where(runnable, NotificationJob.attempts < MAX_ATTEMPTS)
+        .order_by(NotificationJob.id)
+        .limit(10)
+    ).all()
+
+    for job_id, status, attempts in candidates:
+        # Compare-and-set on the state we just read so only one worker wins
+        claimed = db.session.execute(
+            update(NotificationJob)
+            .where(NotificationJob.id == job_id,
+                   NotificationJob.status == status,
+                   NotificationJob.attempts == attempts)
+            .values(status='running', heartbeat_at=now, attempts=NotificationJob.attempts + 1)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            return db.session.get(NotificationJob, job_id)
+    return None
+
+
+def run_job(job, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Insert the job's notifications chunk by chunk, returning rows inserted.
+
+    Each chunk's INSERT and the cursor advance commit in one transaction, so
+    a resumed job never notifies the same donor twice.
+    """
+    blood_types = job.blood_types.split(',')
+    job_id, attempts = job.id, job.attempts
+    title, message, notification_type = job.title, job.message, job.notification_type
+    cursor = job.last_donor_id or 0
+    inserted = 0
+
+    try:
+        while True:
+            rows = db.session.execute(
+                db.select(DonorProfile.id, DonorProfile.user_id)
+                .where(DonorProfile.blood_type.in_(blood_types),
+                       DonorProfile.is_available == True,
+                       DonorProfile.id > cursor)
+                .order_by(DonorProfile.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            now = datetime.utcnow()
+            db.session.execute(insert(Notification), [
+                {
+                    'user_id': user_id,
+                    'title': title,
+                    'message': message,
+                    'notification_type': notification_type,
+                    'is_read': False,
+                    'created_at': now
+                }
+                for _, user_id in rows
+            ])
+            db.session.execute(
+                update(User)
+                .where(User.id.in_([user_id for _, user_id in rows]))
+                .values(unread_notifications=User.unread_notifications + 1)
+            )
+            cursor = rows[-1][0]
+            inserted += len(rows)
+            db.session.execute(
+                update(NotificationJob)
+                .where(NotificationJob.id == job_id)
+                .values(last_donor_id=cursor,
+                        notified_count=NotificationJob.notified_count + len(rows),
+                        heartbeat_at=now)
+            )
+            db.session.commit()
+
+        db.session.execute(
+            update(NotificationJob)
+            .where(NotificationJob.id == job_id)
+            .values(status='done', finished_at=datetime.utcnow(), error=None)
+        )
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        logger.exception('Notification job %s failed', job_id)
+        db.session.execute(
+            update(NotificationJob)
+            .where(NotificationJob.id == job_id)
+            .values(status='failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                    error=str(exc))
+        )
+        db.session.commit()
+        raise
+    return inserted
+
+
+def run_pending_jobs(chunk_size=DEFAULT_CHUNK_SIZE, stale_after=DEFAULT_STALE_AFTER):
+    """Drain the queue in the current app context, returning jobs processed"""
+    processed = 0
+    while True:
+        job = claim_next_job(stale_after)
+        if job is None:
+            return processed
+        try:
+            run_job(job, chunk_size)
+        except Exception:
+            # Already logged and re-queued by run_job; keep draining
+            pass
+        processed += 1
+
+
+def inbox_page(user_id, cursor=None, unread_only=False, per_page=INBOX_PAGE_SIZE):
+    """One page of a user's notifications, newest first.
+
+    Returns ``(notifications, next_cursor)``; ``next_cursor`` is None on the
+    last page. Raises ``InvalidCursor`` for a cursor that cannot be decoded.
+    """
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.is_read == False)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+        query = query.filter(tuple_(Notification.created_at, Notification.id) < tuple_(created_at, last_id))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(per_page + 1).all()
+    notifications = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = notifications[-1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), last.id])
+    return notifications, next_cursor
+
+
+def mark_read(user_id, notification_ids=None, up_to=None):
+    """Mark notifications read with one UPDATE and adjust the unread counter.
+
+    Marks the given ids, or every unread notification up to and including
+    ``up_to`` when no ids are given, so rows that arrive while the user is
+    reading stay unread. Returns the number of notifications marked.
+    """
+    query = update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        query = query.where(Notification.id.in_(notification_ids))
+    elif up_to is not None:
+        query = query.where(Notification.id <= up_to)
+    marked = db.session.execute(query.values(is_read=True)).rowcount
+    if marked:
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(unread_notifications=db.case(
+                (User.unread_notifications > marked, User.unread_notifications - marked), else_=0))
+        )
+    db.session.commit()
+    return marked
+
+
+class NotificationWorkerPool:
+    """Threads that drain the notification queue inside one process"""
+
+    def __init__(self, app, threads=DEFAULT_WORKER_THREADS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.threads):
+                worker = threading.Thread(target=self._run, name=f'notification-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def wake(self):
+        """Signal that a job was queued, starting the threads if they are not running yet"""
+        self.start()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _run(self):
+        chunk_size = self.app.config['NOTIFICATION_FANOUT_CHUNK_SIZE']
+        stale_after = self.app.config['NOTIFICATION_JOB_STALE_AFTER']
+        while not self._stopping.is_set():
+            # Drain first, so jobs queued before this process started (or left
+            # behind by a crashed worker) do not wait for the next new request
+            try:
+                with self.app.app_context():
+                    run_pending_jobs(chunk_size, stale_after)
+            except Exception:
+                logger.exception('Notification worker loop failed')
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+def notify_workers():
+    """Wake the in-process pool after a job has been committed"""
+    from flask import current_app
+    pool = current_app.extensions.get('notification_workers')
+    if pool is not None:
+        pool.wake()
+
+
+def init_app(app):
+    """Configure the fan-out pipeline and register its CLI command.
+
+    ``NOTIFICATION_WORKER_MODE`` is 'thread' (default) to run workers in the
+    web process, or 'external' when ``flask notifications-worker`` runs them.
+    """
+    app.config.setdefault('NOTIFICATION_WORKER_MODE', os.environ.get('NOTIFICATION_WORKER_MODE', 'thread'))
+    app.config.setdefault('NOTIFICATION_WORKER_THREADS',
+                          int(os.environ.get('NOTIFICATION_WORKER_THREADS', DEFAULT_WORKER_THREADS)))
+    app.config.setdefault('NOTIFICATION_FANOUT_CHUNK_SIZE',
+                          int(os.environ.get('NOTIFICATION_FANOUT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)))
+    app.config.setdefault('NOTIFICATION_JOB_STALE_AFTER', DEFAULT_STALE_AFTER)
+
+    if app.config['NOTIFICATION_WORKER_MODE'] == 'thread':
+        pool = NotificationWorkerPool(app, threads=app.config['NOTIFICATION_WORKER_THREADS'])
+        app.extensions['notification_workers'] = pool
+        # Started by the first request, so it runs in each forked worker rather than a preloading master
+        app.before_request(pool.start)
+
+    @app.context_processor
+    def inject_unread_notifications():
+        # The identity is cached on flask.g, so the badge costs no extra query
+        # on pages that already loaded it
+        user = load_identity() if session.get('user_id') else None
+        return {'unread_notifications': user.unread_notifications if user else 0}
+
+    @app.cli.command('notifications-worker')
+    @click.option('--threads', default=DEFAULT_WORKER_THREADS, show_default=True, help='Worker threads to run.')
+    @click.option('--once', is_flag=True, help='Drain the queue once and exit.')
+    def notifications_worker(threads, once):
+        """Run the notification fan-out workers in this process."""
+        if once:
+            processed = run_pending_jobs(app.config['NOTIFICATION_FANOUT_CHUNK_SIZE'],
+                                         app.config['NOTIFICATION_JOB_STALE_AFTER'])
+            click.echo(f'Processed {processed} notification job(s).')
+            return
+        pool = NotificationWorkerPool(app, threads=threads)
+        pool.start()
+        click.echo(f'Notification workers running ({threads} thread(s), pid {os.getpid()}). Ctrl+C to stop.')
+        try:
+            while True:
+                threading.Event().wait(3600)
+        except KeyboardInterrupt:
+            pool.stop(timeout=10)
@@ -0,0 +1,527 @@
+"""Server push of new notifications, donor responses and count deltas.
+
+Each web process runs one ``EventBroker`` thread that polls the database for
+rows newer than its watermarks and hands them to the in-memory queues of the
+connections subscribed to them. However many browsers are connected, the
+database sees one cheap primary-key range query per table per poll interval
+and process, and an open connection holds no database session at all.
+
+Connections are served as Server-Sent Events (``/events/stream``) with a
+long-poll fallback (``/events/poll``). Run gunicorn with the gevent worker
+(``-k gevent``) so each open connection costs a greenlet rather than a worker.
+
+A cursor ``"<notification id>.<response id>"`` travels with every event as the
+SSE ``id``; a client that reconnects with it first gets what it missed from
+the database, so dropping a slow client never loses events.
+
+On PostgreSQL ids come from a sequence, so a transaction can commit a row
+below a watermark the broker has already passed. The broker remembers the
+ids it skipped over and looks them up again on each poll for
+``PUSH_GAP_TIMEOUT`` seconds, so such late rows are still pushed live. A
+late row that commits while a client is disconnected is not replayed on
+reconnect; the next page load shows it.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+
+from extensions import db
+from models import BloodRequest, BloodRequestResponse, DonorProfile, Notification, User
+from utils import get_response_counts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_HEARTBEAT = 15
+DEFAULT_LONG_POLL_TIMEOUT = 25
+DEFAULT_QUEUE_SIZE = 200
+DEFAULT_START_TIMEOUT = 5
+DEFAULT_GAP_TIMEOUT = 30
+MAX_GAPS = 1000
+POLL_BATCH = 5000
+CATCH_UP_LIMIT = 100
+
+
+class PushUnavailable(RuntimeError):
+    """Raised when the broker could not read its starting watermarks in time"""
+
+
+def parse_cursor(cursor):
+    """``(notification_id, response_id)`` from a cursor string, or None"""
+    try:
+        notification_id, response_id = (int(part) for part in (cursor or '').split('.'))
+    except ValueError:
+        return None
+    if notification_id < 0 or response_id < 0:
+        return None
+    return notification_id, response_id
+
+
+def format_cursor(notification_id, response_id):
+    return f'{notification_id}.{response_id}'
+
+
+def user_channels(user):
+    """Channels a logged-in user receives events on"""
+    channels = [f'user:{user.id}']
+    if user.role == 'hospital' and user.hospital_profile:
+        channels.append(f'hospital:{user.hospital_profile.id}')
+    return channels
+
+
+def notification_event(row):
+    notification_id, user_id, title, message, notification_type, created_at = row
+    return ('notification', notification_id, {
+        'id': notification_id,
+        'title': title,
+        'message': message,
+        'notification_type': notification_type,
+        'created_at': created_at.isoformat() if created_at else None
+    })
+
+
+def response_event(row):
+    response_id, request_id, status, hospital_id, donor_name, blood_type = row
+    return ('response', response_id, {
+        'id': response_id,
+        'request_id': request_id,
+        'status': status,
+        'donor_name': donor_name,
+        'blood_type': blood_type
+    })
+
+
+def _notification_rows():
+    return db.select(Notification.id, Notification.user_id, Notification.title, Notification.message,
+                     Notification.notification_type, Notification.created_at)
+
+
+def _response_rows():
+    return (db.select(BloodRequestResponse.id, BloodRequestResponse.request_id, BloodRequestResponse.status,
+                      BloodRequest.hospital_id, DonorProfile.full_name, DonorProfile.blood_type)
+            .join(BloodRequest, BloodRequest.id == BloodRequestResponse.request_id)
+            .join(DonorProfile, DonorProfile.id == BloodRequestResponse.donor_id))
+
+
+class Subscriber:
+    """One open connection's bounded event queue"""
+
+    def __init__(self, channels, maxsize=DEFAULT_QUEUE_SIZE):
+        self.channels = channels
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # The client reconnects and catches up from the database
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """Polls for new rows and fans them out to this process's subscribers"""
+
+    def __init__(self, app, poll_interval=DEFAULT_POLL_INTERVAL, start_timeout=DEFAULT_START_TIMEOUT,
+                 gap_timeout=DEFAULT_GAP_TIMEOUT):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.start_timeout = start_timeout
+        self.gap_timeout = gap_timeout
+        self.notification_id = None
+        self.response_id = None
+        # Skipped ids below each watermark -> when they were first skipped
+        self._notification_gaps = {}
+        self._response_gaps = {}
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._started = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start polling; raises PushUnavailable if the starting watermarks are not read in time"""
+        if self._stopping.is_set():
+            raise PushUnavailable('Push broker is stopped')
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='push-broker', daemon=True)
+                self._thread.start()
+        # Callers need the initial watermarks, so wait for them even if another request started us,
+        # but not forever: with the database down every logged-in page would hang here
+        if not self._started.wait(self.start_timeout):
+            raise PushUnavailable('Push broker could not read its starting watermarks')
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def cursor(self):
+        """Cursor for a client starting now; nothing older than it is pushed"""
+        self.start()
+        return format_cursor(self.notification_id, self.response_id)
+
+    def gap_ids(self):
+        """``(notification ids, response ids)`` skipped below the watermarks that may still commit"""
+        # dict.copy() is atomic, so the poll thread can keep changing the gaps
+        return set(self._notification_gaps.copy()), set(self._response_gaps.copy())
+
+    def subscribe(self, channels, maxsize=DEFAULT_QUEUE_SIZE):
+        self.start()
+        subscriber = Subscriber(channels, maxsize)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for channel in subscriber.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscriber for subscribers in self._channels.values() for subscriber in subscribers})
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def _run(self):
+        while not self._started.is_set():
+            try:
+                with self.app.app_context():
+                    try:
+                        self._reset_watermarks()
+                    finally:
+                        db.session.remove()
+                self._started.set()
+            except Exception:
+                logger.exception('Push broker could not read its starting watermarks')
+                if self._stopping.wait(self.poll_interval):
+                    return
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                logger.exception('Push broker poll failed')
+
+    def _reset_watermarks(self):
+        self._notification_gaps.clear()
+        self._response_gaps.clear()
+        self.notification_id = db.session.scalar(db.select(func.coalesce(func.max(Notification.id), 0)))
+        self.response_id = db.session.scalar(db.select(func.coalesce(func.max(BloodRequestResponse.id), 0)))
+
+    def poll(self):
+        """Deliver rows committed since the last poll"""
+        try:
+            with self._lock:
+                if not self._channels:
+                    # Nobody to deliver to; skip the backlog rather than read it later.
+                    # Holding the lock keeps a new subscriber from slipping in between.
+                    self._reset_watermarks()
+                    return
+            self._poll_notifications()
+            self._poll_responses()
+        finally:
+            db.session.remove()
+
+    def _track_gaps(self, gaps, watermark, rows):
+        """Remember ids skipped between ``watermark`` and ``rows``; they may still commit"""
+        now = time.monotonic()
+        for row in rows:
+            if row.id - watermark - 1 <= MAX_GAPS:
+                for missing in range(watermark + 1, row.id):
+                    gaps.setdefault(missing, now)
+            watermark = row.id
+        # Oldest first, as inserted
+        for row_id in list(gaps)[:max(len(gaps) - MAX_GAPS, 0)]:
+            del gaps[row_id]
+
+    def _late_rows(self, gaps, rows, column):
+        """Rows that committed into a gap since the last poll; gaps past ``gap_timeout`` are given up"""
+        cutoff = time.monotonic() - self.gap_timeout
+        for row_id in [row_id for row_id, skipped_at in gaps.items() if skipped_at < cutoff]:
+            del gaps[row_id]
+        if not gaps:
+            return []
+        late = db.session.execute(rows.where(column.in_(list(gaps))).order_by(column)).all()
+        for row in late:
+            del gaps[row.id]
+        return late
+
+    def _poll_notifications(self):
+        touched_users = set()
+
+        def deliver(rows):
+            for row in rows:
+                channel = f'user:{row.user_id}'
+                if channel in self._channels:
+                    self.publish(channel, notification_event(row))
+                    touched_users.add(row.user_id)
+
+        deliver(self._late_rows(self._notification_gaps, _notification_rows(), Notification.id))
+        while True:
+            rows = db.session.execute(
+                _notification_rows()
+                .where(Notification.id > self.notification_id)
+                .order_by(Notification.id)
+                .limit(POLL_BATCH)
+            ).all()
+            deliver(rows)
+            if rows:
+                self._track_gaps(self._notification_gaps, self.notification_id, rows)
+                self.notification_id = rows[-1].id
+            if len(rows) < POLL_BATCH:
+                break
+
+        if touched_users:
+            for user_id, unread in db.session.execute(
+                db.select(User.id, User.unread_notifications).where(User.id.in_(touched_users))
+            ):
+                self.publish(f'user:{user_id}', ('unread', None, {'count': unread}))
+
+    def _poll_responses(self):
+        touched_requests = {}
+
+        def deliver(rows):
+            for row in rows:
+                channel = f'hospital:{row.hospital_id}'
+                if channel in self._channels:
+                    self.publish(channel, response_event(row))
+                    touched_requests[row.request_id] = channel
+
+        deliver(self._late_rows(self._response_gaps, _response_rows(), BloodRequestResponse.id))
+        while True:
+            rows = db.session.execute(
+                _response_rows()
+                .where(BloodRequestResponse.id > self.response_id)
+                .order_by(BloodRequestResponse.id)
+                .limit(POLL_BATCH)
+            ).all()
+            deliver(rows)
+            if rows:
+                self._track_gaps(self._response_gaps, self.response_id, rows)
+                self.response_id = rows[-1].id
+            if len(rows) < POLL_BATCH:
+                break
+
+        if touched_requests:
+            counts = get_response_counts(list(touched_requests))
+            for request_id, channel in touched_requests.items():
+                self.publish(channel, ('stats', None, {'request_id': request_id, 'counts': counts[request_id]}))
+
+
+def catch_up(user_id, hospital_id, cursor):
+    """Events a client missed since ``cursor``, oldest first.
+
+    Returns None when more than ``CATCH_UP_LIMIT`` rows were missed; the
+    client should then reload the page instead of replaying them.
+    """
+    notification_id, response_id = cursor
+    events = [notification_event(row) for row in db.session.execute(
+        _notification_rows()
+        .where(Notification.user_id == user_id, Notification.id > notification_id)
+        .order_by(Notification.id)
+        .limit(CATCH_UP_LIMIT + 1)
+    )]
+    if len(events) > CATCH_UP_LIMIT:
+        return None
+    if events:
+        unread = db.session.scalar(db.select(User.unread_notifications).where(User.id == user_id))
+        events.append(('unread', None, {'count': unread}))
+
+    if hospital_id is not None:
+        responses = [response_event(row) for row in db.session.execute(
+            _response_rows()
+            .where(BloodRequest.hospital_id == hospital_id, BloodRequestResponse.id > response_id)
+            .order_by(BloodRequestResponse.id)
+            .limit(CATCH_UP_LIMIT + 1)
+        )]
+        if len(responses) > CATCH_UP_LIMIT:
+            return None
+        if responses:
+            request_ids = sorted({payload['request_id'] for _, _, payload in responses})
+            counts = get_response_counts(request_ids)
+            events.extend(responses)
+            events.extend(('stats', None, {'request_id': request_id, 'counts': counts[request_id]})
+                          for request_id in request_ids)
+    return events
+
+
+class EventStream:
+    """Tracks one connection's cursor while it is sent events"""
+
+    def __init__(self, cursor, late_ids=((), ())):
+        self.notification_id, self.response_id = cursor
+        # At or below the starting cursor only ids that may still commit late (see the module
+        # docstring) are new; above it, ids already sent are remembered instead
+        self._floor = {'notification': self.notification_id, 'response': self.response_id}
+        self._late = {'notification': set(late_ids[0]), 'response': set(late_ids[1])}
+        self._sent = {'notification': set(), 'response': set()}
+
+    @property
+    def cursor(self):
+        return format_cursor(self.notification_id, self.response_id)
+
+    def accept(self, event):
+        """Advance the cursor, returning False for an event already sent"""
+        kind, row_id, _ = event
+        if kind not in self._sent:
+            return True
+        if row_id <= self._floor[kind]:
+            if row_id not in self._late[kind]:
+                return False
+            self._late[kind].discard(row_id)
+            return True
+        sent = self._sent[kind]
+        if row_id in sent:
+            return False
+        sent.add(row_id)
+        if len(sent) > 2 * MAX_GAPS:
+            # Duplicates and late rows land near the cursor; the oldest ids are not needed again
+            for old_id in sorted(sent)[:MAX_GAPS]:
+                sent.discard(old_id)
+        if kind == 'notification':
+            self.notification_id = max(self.notification_id, row_id)
+        else:
+            self.response_id = max(self.response_id, row_id)
+        return True
+
+    def format_sse(self, event):
+        kind, _, payload = event
+        return f'id: {self.cursor}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n'
+
+    def as_dict(self, event):
+        kind, _, payload = event
+        return {'event': kind, 'data': payload}
+
+
+def get_broker():
+    return current_app.extensions['push_broker']
+
+
+def _subscribe_and_catch_up(app, user, cursor):
+    """Subscribe before reading missed rows so nothing falls in between"""
+    broker = app.extensions['push_broker']
+    channels = user_channels(user)
+    hospital_id = user.hospital_profile.id if user.role == 'hospital' and user.hospital_profile else None
+    # Give back the connection the identity was loaded on; a burst of new
+    # connections must not hold the pool while the broker starts
+    db.session.close()
+    # Gaps filled while subscribing were queued for us, and new ones may open; take both
+    late_notifications, late_responses = broker.gap_ids()
+    subscriber = broker.subscribe(channels, app.config['PUSH_QUEUE_SIZE'])
+    try:
+        notification_gaps, response_gaps = broker.gap_ids()
+        stream = EventStream(cursor or parse_cursor(broker.cursor()),
+                             (late_notifications | notification_gaps, late_responses | response_gaps))
+        missed = catch_up(user.id, hospital_id, cursor) if cursor else []
+    except Exception:
+        broker.unsubscribe(subscriber)
+        raise
+    finally:
+        # Release the pooled connection before waiting on the queue
+        db.session.close()
+    return broker, subscriber, stream, missed
+
+
+def stream_events(user, cursor=None):
+    """SSE body for ``user``: missed events, then live ones with heartbeats"""
+    app = current_app._get_current_object()
+    heartbeat = app.config['PUSH_HEARTBEAT']
+    broker, subscriber, stream, missed = _subscribe_and_catch_up(app, user, cursor)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            if missed is None:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            yield stream.format_sse(('ready', None, {'cursor': stream.cursor}))
+            for event in missed:
+                if stream.accept(event):
+                    yield stream.format_sse(event)
+            while True:
+                event = subscriber.get(timeout=heartbeat)
+                if event is None:
+                    if subscriber.overflowed:
+                        # Drained everything queued before the drop; resume from the cursor
+                        return
+                    yield ': keep-alive\n\n'
+                elif stream.accept(event):
+                    yield stream.format_sse(event)
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return generate()
+
+
+def poll_events(user, cursor=None, timeout=None):
+    """Long-poll fallback: wait for events after ``cursor``.
+
+    Returns ``{'events': [...], 'cursor': ...}``, or ``{'reload': True}``
+    when too much was missed to replay.
+    """
+    app = current_app._get_current_object()
+    if timeout is None:
+        timeout = app.config['PUSH_LONG_POLL_TIMEOUT']
+    broker, subscriber, stream, missed = _subscribe_and_catch_up(app, user, cursor)
+    try:
+        if missed is None:
+            return {'reload': True}
+        events = [event for event in missed if stream.accept(event)]
+        if not events and not subscriber.overflowed:
+            event = subscriber.get(timeout=timeout)
+            while event is not None:
+                if stream.accept(event):
+                    events.append(event)
+                event = subscriber.get(timeout=0)
+        return {'events': [stream.as_dict(event) for event in events], 'cursor': stream.cursor}
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+def init_app(app):
+    """Configure server push and create this process's broker"""
+    app.config.setdefault('PUSH_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    app.config.setdefault('PUSH_HEARTBEAT', DEFAULT_HEARTBEAT)
+    app.config.setdefault('PUSH_LONG_POLL_TIMEOUT', DEFAULT_LONG_POLL_TIMEOUT)
+    app.config.setdefault('PUSH_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+    app.config.setdefault('PUSH_START_TIMEOUT', DEFAULT_START_TIMEOUT)
+    app.config.setdefault('PUSH_GAP_TIMEOUT', DEFAULT_GAP_TIMEOUT)
+    app.extensions['push_broker'] = EventBroker(app, poll_interval=app.config['PUSH_POLL_INTERVAL'],
+                                                start_timeout=app.config['PUSH_START_TIMEOUT'],
+                                                gap_timeout=app.config['PUSH_GAP_TIMEOUT'])
+
+    def push_cursor():
+        try:
+            return app.extensions['push_broker'].cursor()
+        except PushUnavailable:
+            # Render the page without live updates rather than hang or fail it
+            return ''
+
+    @app.context_processor
+    def inject_push_cursor():
+        # Called from base.html only for logged-in users, so anonymous pages never start the broker
+        return {'push_cursor': push_cursor}
@@ -0,0 +1,251 @@
+"""Donor search with SQL-side filtering and keyset pagination.
+
+Results are paged by a cursor on a stable ``(sort key, id)`` pair instead of
+OFFSET, so fetching page N costs the same as fetching page 1 and rows
+inserted while a user scrolls never shift or duplicate results.
+
+Free text goes through the indexed, ranked search in ``fulltext``; searches
+of a single word are listed in the chosen order rather than ranked. The city
+filter compares normalised ``city_key`` values, so "New  Delhi" and
+"new delhi" match each other, and uses the (state, city_key, full_name)
+index.
+
+The admin user listing pages the same way, with its role, status and
+username/email filters applied in SQL.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, or_, tuple_
+
+from extensions import db
+from fulltext import donor_match_ids, donor_matches, is_common_word, match_query, search_terms
+from geo import get_pin_directory
+from models import DonorProfile, User, normalise_city
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+RARE_BLOOD_TYPES = ['AB-', 'AB+', 'B-', 'A-']
+
+# Sort name -> (key column, descending). Every key is paired with the
+# primary key as a tie-breaker so the ordering is total.
+DONOR_SORTS = {
+    'name': (DonorProfile.full_name, False),
+    'city': (DonorProfile.city, False),
+    'recent': (DonorProfile.id, True),
+}
+USER_SORTS = {
+    'newest': (User.created_at, True),
+    'username': (User.username, False),
+    'email': (User.email, False),
+}
+USER_ROLES = ('donor', 'hospital', 'organization', 'admin')
+USER_STATUSES = ('active', 'inactive')
+# Orders by text search rank; only valid for queries built with a ``text``
+# that ``ranked_search`` accepts
+RELEVANCE = 'relevance'
+# PIN codes per query when walking outwards from a proximity search origin
+PROXIMITY_PIN_BATCH = 64
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list) or len(values) != 2:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def page_size(requested=None):
+    """Clamp a requested page size to the configured bounds"""
+    default = current_app.config.get('DONOR_SEARCH_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = current_app.config.get('DONOR_SEARCH_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    if not requested:
+        return default
+    return max(1, min(int(requested), maximum))
+
+
+def _dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def ranked_search(text):
+    """True if a ``donor_search_query`` for ``text`` can be sorted by RELEVANCE.
+
+    One word ranks by little more than which column it hit, so it is not
+    worth ranking every profile that contains it.
+    """
+    return len(search_terms(text)) > 1
+
+
+def donor_search_query(blood_type=None, city=None, state=None, available_only=False, rare_only=False,
+                       eligible_only=False, text=None):
+    """Active donors matching the filters, all applied in SQL.
+
+    ``text`` is matched against name, city, state and PIN code; words that
+    are all punctuation are ignored.
+    """
+    query = DonorProfile.query.join(User).filter(User.is_active == True)
+    terms = search_terms(text)
+    if terms:
+        dialect_name = _dialect_name()
+        if is_common_word(terms, dialect_name):
+            # ``id + 0`` keeps the planner from driving the query from the
+            # matches, so it walks profiles in page order and stops at a full page
+            query = query.filter((DonorProfile.id + 0).in_(donor_match_ids()))
+        else:
+            matches = donor_matches(dialect_name)
+            query = query.join(matches, matches.c.id == DonorProfile.id)
+        query = query.params(search_text=match_query(terms, dialect_name))
+    if blood_type:
+        query = query.filter(DonorProfile.blood_type == blood_type)
+    if rare_only:
+        query = query.filter(DonorProfile.blood_type.in_(RARE_BLOOD_TYPES))
+    if available_only:
+        query = query.filter(DonorProfile.is_available == True)
+    if eligible_only:
+        query = query.filter(DonorProfile.is_eligible)
+    city_key = normalise_city(city)
+    if city_key:
+        query = query.filter(DonorProfile.city_key == city_key)
+    if state:
+        query = query.filter(DonorProfile.state == state)
+    return query
+
+
+def keyset_page(query, sort='name', cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Fetch one page of ``query`` after ``cursor``.
+
+    Returns ``(donors, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    ranked = sort == RELEVANCE
+    if ranked:
+        key, descending = donor_matches(_dialect_name()).c.rank, False
+        # The rank is not a profile attribute, so fetch it alongside each row
+        query = query.add_columns(key)
+    else:
+        key, descending = DONOR_SORTS.get(sort, DONOR_SORTS['name'])
+    single_key = key is DonorProfile.id
+
+    if cursor:
+        last_key, last_id = decode_cursor(cursor)
+        if single_key:
+            query = query.filter(DonorProfile.id < last_id if descending else DonorProfile.id > last_id)
+        elif descending:
+            query = query.filter(tuple_(key, DonorProfile.id) < tuple_(last_key, last_id))
+        else:
+            query = query.filter(tuple_(key, DonorProfile.id) > tuple_(last_key, last_id))
+
+    if single_key:
+        order = [key.desc() if descending else key.asc()]
+    else:
+        order = [key.desc(), DonorProfile.id.desc()] if descending else [key.asc(), DonorProfile.id.asc()]
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    donors = [row[0] for row in rows[:per_page]] if ranked else rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = donors[-1]
+        last_key = rows[per_page - 1][1] if ranked else getattr(last, key.key)
+        next_cursor = encode_cursor([last_key, last.id])
+    return donors, next_cursor
+
+
+def user_search_query(role=None, status=None, text=None):
+    """Users matching the filters; ``text`` is a case-insensitive substring of username or email"""
+    query = User.query
+    if role:
+        query = query.filter(User.role == role)
+    if status in USER_STATUSES:
+        query = query.filter(User.is_active == (status == 'active'))
+    text = (text or '').strip()
+    if text:
+        pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        query = query.filter(or_(User.username.ilike(pattern, escape='\\'),
+                                 User.email.ilike(pattern, escape='\\')))
+    return query
+
+
+def user_page(query, sort='newest', cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Fetch one page of a ``user_search_query`` after ``cursor``.
+
+    Returns ``(users, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    key, descending = USER_SORTS.get(sort, USER_SORTS['newest'])
+    dated = key is User.created_at
+    if cursor:
+        last_key, last_id = decode_cursor(cursor)
+        if dated:
+            try:
+                last_key = datetime.fromisoformat(last_key)
+            except (TypeError, ValueError) as exc:
+                raise InvalidCursor(cursor) from exc
+        if descending:
+            query = query.filter(tuple_(key, User.id) < tuple_(last_key, last_id))
+        else:
+            query = query.filter(tuple_(key, User.id) > tuple_(last_key, last_id))
+
+    order = [key.desc(), User.id.desc()] if descending else [key.asc(), User.id.asc()]
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    users = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last_key = getattr(users[-1], key.key)
+        next_cursor = encode_cursor([last_key.isoformat() if dated else last_key, users[-1].id])
+    return users, next_cursor
+
+
+def proximity_page(query, pin, radius_km, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """Fetch one page of ``query`` restricted to donors within ``radius_km`` of ``pin``, nearest first.
+
+    Donors are placed at their PIN code's centroid, so the PIN codes in range
+    are ordered by distance and read in batches until the page is full. Each
+    returned donor has a ``distance_km`` attribute. The cursor is the last
+    donor's ``(pin_key, id)``. Raises ``geo.UnknownPinCode`` if ``pin`` has no
+    known location.
+    """
+    directory = get_pin_directory()
+    pins, distances = directory.within(*directory.locate(pin), radius_km)
+    start, after_id = 0, None
+    if cursor:
+        last_pin, after_id = decode_cursor(cursor)
+        if last_pin not in pins:
+            raise InvalidCursor(cursor)
+        start = pins.index(last_pin)
+
+    donors = []
+    position = start
+    while position < len(pins) and len(donors) <= per_page:
+        batch = pins[position:position + PROXIMITY_PIN_BATCH]
+        batch_query = query.filter(DonorProfile.pin_key.in_(batch))
+        if position == start and after_id is not None:
+            batch_query = batch_query.filter(or_(DonorProfile.pin_key != pins[start], DonorProfile.id > after_id))
+        nearest = case({batch_pin: i for i, batch_pin in enumerate(batch)}, value=DonorProfile.pin_key)
+        # Fetch one extra row to learn whether another page exists
+        donors += batch_query.order_by(nearest, DonorProfile.id).limit(per_page + 1 - len(donors)).all()
+        position += len(batch)
+
+    distance_of = dict(zip(pins[start:position], distances[start:position].tolist()))
+    for donor in donors:
+        donor.distance_km = round(distance_of[donor.pin_key], 1)
+    next_cursor = None
+    if len(donors) > per_page:
+        donors = donors[:per_page]
+        next_cursor = encode_cursor([donors[-1].pin_key, donors[-1].id])
+    return donors, next_cursor
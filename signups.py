@@ -0,0 +1,222 @@
+"""Donor sign-ups for donation events, with capacity and a waitlist.
+
+A seat is taken with one conditional UPDATE on the event's
+``registered_count`` (``... WHERE registered_count < max_participants``), so
+however many donors sign up at once the count can never pass the limit and
+nobody has to count rows first. A donor who misses a seat is waitlisted in
+the same transaction. Cancelling a seat hands it to the oldest waitlisted
+donor, again in one transaction, so the count only drops when the waitlist
+is empty.
+
+On PostgreSQL every sign-up and cancellation first takes the event row with
+``SELECT ... FOR UPDATE``, so a waitlist entry can never be written while a
+cancellation frees a seat. SQLite serialises writers anyway; a busy
+database is retried.
+"""
+import random
+import time
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, func, or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import DonationEvent, EventRegistration
+from utils import is_transient_db_error
+
+MAX_ATTEMPTS = 20
+OPEN_STATUSES = ('registered', 'waitlisted')
+
+_events = DonationEvent.__table__
+_registrations = EventRegistration.__table__
+
+
+class RegistrationError(ValueError):
+    """Raised when a sign-up or cancellation is not allowed"""
+
+
+class EventClosed(RegistrationError):
+    """Raised when an event no longer takes sign-ups"""
+
+
+class AlreadyRegistered(RegistrationError):
+    """Raised when the donor already holds a seat or a waitlist place"""
+
+    def __init__(self, status):
+        super().__init__(f'Already {status}')
+        self.status = status
+
+
+class NotRegistered(RegistrationError):
+    """Raised when there is no seat or waitlist place to cancel"""
+
+
+class RegistrationConflict(RegistrationError):
+    """Raised when a sign-up kept losing to concurrent writers"""
+
+
+_LOCK_EVENT = (
+    db.select(_events.c.id)
+    .where(_events.c.id == bindparam('event'))
+    .with_for_update()
+)
+
+# Core statements: seat counts are not part of anything the cached feeds show
+_TAKE_SEAT = (
+    _events.update()
+    .where(_events.c.id == bindparam('event'),
+           or_(_events.c.max_participants.is_(None), _events.c.registered_count < _events.c.max_participants))
+    .values(registered_count=_events.c.registered_count + 1)
+)
+
+_FREE_SEAT = (
+    _events.update()
+    .where(_events.c.id == bindparam('event'))
+    .values(registered_count=_events.c.registered_count - 1)
+)
+
+_NEXT_IN_LINE = (
+    db.select(_registrations.c.id)
+    .where(_registrations.c.event_id == bindparam('event'), _registrations.c.status == 'waitlisted')
+    .order_by(_registrations.c.created_at, _registrations.c.id)
+    .limit(1)
+    .scalar_subquery()
+)
+
+_PROMOTE = (
+    _registrations.update()
+    .where(_registrations.c.id == _NEXT_IN_LINE)
+    .values(status='registered')
+    .returning(_registrations.c.donor_id)
+)
+
+
+def _withdraw(status):
+    return (_registrations.update()
+            .where(_registrations.c.event_id == bindparam('event'),
+                   _registrations.c.donor_id == bindparam('donor'),
+                   _registrations.c.status == status)
+            .values(status='cancelled'))
+
+
+_WITHDRAW_REGISTERED = _withdraw('registered')
+_WITHDRAW_WAITLISTED = _withdraw('waitlisted')
+
+
+def _upsert_registration(event_id, donor_id, status):
+    """Insert the donor's registration, or revive a cancelled one at the back of the line"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(_registrations).values(event_id=event_id, donor_id=donor_id, status=status,
+                                              created_at=datetime.utcnow())
+    return db.session.execute(statement.on_conflict_do_update(
+        index_elements=['event_id', 'donor_id'],
+        set_={'status': statement.excluded.status, 'created_at': statement.excluded.created_at},
+        where=_registrations.c.status == 'cancelled'
+    )).rowcount
+
+
+def _retrying(action, event_id):
+    """Run ``action()`` in its own transaction, retrying when the database is busy"""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            db.session.execute(_LOCK_EVENT, {'event': event_id})
+            result = action()
+            db.session.commit()
+            return result
+        except OperationalError as exc:
+            db.session.rollback()
+            if not is_transient_db_error(exc):
+                raise
+            time.sleep(random.uniform(0, 0.002 * (attempt + 1)))
+        except Exception:
+            db.session.rollback()
+            raise
+    raise RegistrationConflict(f'Could not update event {event_id} after {MAX_ATTEMPTS} attempts')
+
+
+def is_open(event):
+    return event.status == 'upcoming' and event.event_date >= date.today()
+
+
+def register(event, donor_id):
+    """Sign a donor up for an event; returns 'registered' or 'waitlisted'.
+
+    Raises EventClosed if the event is not upcoming, and AlreadyRegistered
+    if the donor already holds a seat or a waitlist place.
+    """
+    if not is_open(event):
+        raise EventClosed(f'{event.event_name} is not taking sign-ups')
+    event_id = event.id
+
+    def sign_up():
+        seated = db.session.execute(_TAKE_SEAT, {'event': event_id}).rowcount == 1
+        status = 'registered' if seated else 'waitlisted'
+        if not _upsert_registration(event_id, donor_id, status):
+            # Already signed up (a double click, say); the rollback gives the seat back
+            raise AlreadyRegistered(None)
+        return status
+
+    try:
+        return _retrying(sign_up, event_id)
+    except AlreadyRegistered:
+        raise AlreadyRegistered(registration_status(event_id, donor_id))
+
+
+def cancel(event_id, donor_id):
+    """Give up a seat or waitlist place.
+
+    A freed seat goes to the oldest waitlisted donor, whose donor id is
+    returned; otherwise returns None. Raises NotRegistered if the donor has
+    nothing to cancel.
+    """
+    def withdraw():
+        if db.session.execute(_WITHDRAW_REGISTERED, {'event': event_id, 'donor': donor_id}).rowcount:
+            promoted = db.session.execute(_PROMOTE, {'event': event_id}).scalar()
+            if promoted is None:
+                db.session.execute(_FREE_SEAT, {'event': event_id})
+            return promoted
+        if not db.session.execute(_WITHDRAW_WAITLISTED, {'event': event_id, 'donor': donor_id}).rowcount:
+            raise NotRegistered(f'Donor {donor_id} is not signed up for event {event_id}')
+        return None
+
+    return _retrying(withdraw, event_id)
+
+
+def registration_status(event_id, donor_id):
+    """'registered', 'waitlisted', 'cancelled' or None"""
+    return db.session.scalar(db.select(EventRegistration.status)
+                             .where(EventRegistration.event_id == event_id,
+                                    EventRegistration.donor_id == donor_id))
+
+
+def donor_statuses(donor_id, event_ids):
+    """The donor's open registrations among ``event_ids``, as {event id: status}"""
+    if not event_ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(EventRegistration.event_id, EventRegistration.status)
+        .where(EventRegistration.donor_id == donor_id, EventRegistration.event_id.in_(event_ids),
+               EventRegistration.status.in_(OPEN_STATUSES))).all())
+
+
+def waitlist_counts(event_ids):
+    """{event id: waitlisted donors} for events that have a waitlist"""
+    if not event_ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(EventRegistration.event_id, func.count(EventRegistration.id))
+        .where(EventRegistration.event_id.in_(event_ids), EventRegistration.status == 'waitlisted')
+        .group_by(EventRegistration.event_id)).all())
+
+
+def roster(event_id):
+    """``(registered, waitlisted)`` registrations with their donors, each in sign-up order"""
+    rows = (EventRegistration.query.options(joinedload(EventRegistration.donor))
+            .filter(EventRegistration.event_id == event_id, EventRegistration.status.in_(OPEN_STATUSES))
+            .order_by(EventRegistration.created_at, EventRegistration.id).all())
+    return ([row for row in rows if row.status == 'registered'],
+            [row for row in rows if row.status == 'waitlisted'])
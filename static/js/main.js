@@ -339,26 +339,127 @@ function animateCounters() {
 
 /**
  * Initialize real-time updates
+ *
+ * Subscribes to the server push channel with Server-Sent Events, falling back
+ * to long-polling when EventSource is unavailable or keeps failing.
  */
 function initializeRealTimeUpdates() {
-    // This would typically set up WebSocket connections or periodic AJAX calls
-    // For now, we'll just set up periodic page updates for critical sections
-    
-    if (window.location.pathname.includes('dashboard')) {
-        // Refresh dashboard stats every 5 minutes
-        setInterval(() => {
-            refreshDashboardStats();
-        }, 300000);
+    const cursor = document.body.dataset.pushCursor;
+    if (!cursor) return;
+
+    if (!window.EventSource) {
+        longPollUpdates(cursor);
+        return;
+    }
+
+    let opened = false;
+    let failures = 0;
+    const source = new EventSource('/events/stream?cursor=' + encodeURIComponent(cursor));
+    source.addEventListener('open', () => { opened = true; failures = 0; });
+    source.addEventListener('error', () => {
+        // The browser reconnects on its own with Last-Event-ID; give up on
+        // streaming only if it never manages to open (e.g. a buffering proxy)
+        failures += 1;
+        if (!opened && failures >= 3) {
+            source.close();
+            longPollUpdates(cursor);
+        }
+    });
+    source.addEventListener('reload', () => {
+        source.close();
+        window.location.reload();
+    });
+    ['notification', 'unread', 'response', 'stats'].forEach(kind => {
+        source.addEventListener(kind, event => handlePushEvent(kind, JSON.parse(event.data)));
+    });
+}
+
+/**
+ * Long-poll fallback for real-time updates
+ */
+function longPollUpdates(cursor) {
+    fetch('/events/poll?cursor=' + encodeURIComponent(cursor), { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) throw new Error('poll failed: ' + response.status);
+            return response.json();
+        })
+        .then(result => {
+            if (result.reload) {
+                window.location.reload();
+                return;
+            }
+            result.events.forEach(event => handlePushEvent(event.event, event.data));
+            longPollUpdates(result.cursor);
+        })
+        .catch(() => setTimeout(() => longPollUpdates(cursor), 5000));
+}
+
+/**
+ * Apply one pushed event to the page
+ */
+function handlePushEvent(kind, data) {
+    if (kind === 'unread') {
+        updateNotificationBadge(data.count);
+    } else if (kind === 'notification') {
+        showPushAlert(data.title, data.message, '/notifications');
+    } else if (kind === 'response') {
+        const verb = data.status === 'accepted' ? 'accepted' : 'declined';
+        showPushAlert('Donor response', data.donor_name + ' (' + data.blood_type + ') ' + verb + ' your request.');
+    } else if (kind === 'stats') {
+        refreshDashboardStats(data.request_id, data.counts);
     }
 }
 
 /**
- * Refresh dashboard statistics
+ * Update the navbar unread badge
+ */
+function updateNotificationBadge(count) {
+    const badge = document.getElementById('notificationBadge');
+    if (!badge) return;
+    badge.textContent = count < 100 ? count : '99+';
+    badge.classList.toggle('d-none', count === 0);
+}
+
+/**
+ * Show a dismissible alert for a pushed event
  */
-function refreshDashboardStats() {
-    // This would make an AJAX call to get updated statistics
-    console.log('Refreshing dashboard stats...');
-    // Implementation would depend on backend API
+function showPushAlert(title, message, link) {
+    const container = document.getElementById('flashMessages');
+    if (!container) return;
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-info alert-dismissible fade show';
+    alert.setAttribute('role', 'alert');
+    const heading = document.createElement('strong');
+    heading.textContent = title;
+    alert.appendChild(heading);
+    alert.appendChild(document.createTextNode(' ' + message + ' '));
+    if (link) {
+        const anchor = document.createElement('a');
+        anchor.href = link;
+        anchor.className = 'alert-link';
+        anchor.textContent = 'View';
+        alert.appendChild(anchor);
+    }
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'btn-close';
+    close.setAttribute('data-bs-dismiss', 'alert');
+    alert.appendChild(close);
+    container.prepend(alert);
+}
+
+/**
+ * Refresh dashboard statistics for one blood request
+ */
+function refreshDashboardStats(requestId, counts) {
+    const cell = document.querySelector('[data-response-counts="' + requestId + '"]');
+    if (!cell) return;
+    ['total', 'accepted', 'declined'].forEach(key => {
+        const value = cell.querySelector('[data-count="' + key + '"]');
+        if (value) value.textContent = counts[key];
+    });
+    const detail = cell.querySelector('[data-count-detail]');
+    if (detail) detail.classList.toggle('d-none', counts.total === 0);
 }
 
 /**
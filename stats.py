@@ -0,0 +1,280 @@
+"""Platform statistics for the admin screens.
+
+Each read model is one grouped aggregate query whose result is held in a
+TTL cache. Commits that touch users, donor profiles or blood requests drop
+the affected entries, so admins see fresh numbers without every refresh
+scanning whole tables. Bulk inserts and Core updates never reach the flush
+hooks, so the code issuing them calls ``invalidate_tables`` after committing,
+or ``invalidate_tables_on_commit`` inside its transaction.
+
+Set ``CACHE_URL`` to a Redis URL to share the statistics between gunicorn
+workers, as the dashboard feeds do; otherwise a write made in one worker
+reaches the others' copies only when they expire.
+"""
+import os
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import case, event, func, literal, union_all
+
+import cache as cache_store
+from extensions import db
+from models import BloodRequest, BloodRequestResponse, Donation, DonorProfile, User, normalise_city
+
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+DEFAULT_TTL = 300
+ANALYTICS_WINDOWS = (7, 30, 90, 365)
+ANALYTICS_BUCKETS = ('day', 'week', 'month')
+ACTIVITY_SERIES = ('donor', 'hospital', 'organization', 'requests', 'responses', 'donations')
+
+# Table name -> cache key prefixes computed from it
+INVALIDATES = {
+    User.__tablename__: ['stats:platform', 'stats:activity', 'stats:donors', 'stats:users'],
+    DonorProfile.__tablename__: ['stats:blood_types', 'stats:eligibility', 'stats:donors'],
+    BloodRequest.__tablename__: ['stats:platform', 'stats:activity'],
+    BloodRequestResponse.__tablename__: ['stats:activity'],
+    Donation.__tablename__: ['stats:activity'],
+}
+
+cache = cache_store.TTLCache(DEFAULT_TTL)
+
+
+def platform_counts():
+    """User totals per role and the active request count, in one query"""
+    def compute():
+        active_requests = (db.select(func.count(BloodRequest.id))
+                           .where(BloodRequest.status == 'active')
+                           .scalar_subquery())
+        row = db.session.execute(db.select(
+            func.count(User.id),
+            func.count(case((User.role == 'donor', 1))),
+            func.count(case((User.role == 'hospital', 1))),
+            func.count(case((User.role == 'organization', 1))),
+            active_requests
+        )).one()
+        return {
+            'total_users': row[0],
+            'total_donors': row[1],
+            'total_hospitals': row[2],
+            'total_organizations': row[3],
+            'active_requests': row[4]
+        }
+    return cache.get_or_set('stats:platform', compute)
+
+
+def user_totals():
+    """Account counts for the manage-users screen, in one query.
+
+    Returns ``total``, ``active``, ``inactive``, ``new_this_week`` and
+    ``active_admins``; the last decides whether an admin may be deactivated.
+    """
+    def compute():
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        row = db.session.execute(db.select(
+            func.count(User.id),
+            func.count(case((User.is_active == True, 1))),
+            func.count(case((User.created_at >= week_ago, 1))),
+            func.count(case(((User.role == 'admin') & (User.is_active == True), 1)))
+        )).one()
+        return {
+            'total': row[0],
+            'active': row[1],
+            'inactive': row[0] - row[1],
+            'new_this_week': row[2],
+            'active_admins': row[3]
+        }
+    return cache.get_or_set('stats:users', compute)
+
+
+def blood_type_distribution():
+    """Donor count per blood type, in the usual blood type order"""
+    def compute():
+        counts = OrderedDict((bt, 0) for bt in BLOOD_TYPES)
+        rows = db.session.execute(
+            db.select(DonorProfile.blood_type, func.count(DonorProfile.id))
+            .group_by(DonorProfile.blood_type)
+        ).all()
+        for blood_type, count in rows:
+            if blood_type in counts:
+                counts[blood_type] = count
+        return counts
+    return cache.get_or_set('stats:blood_types', compute)
+
+
+def donor_totals(blood_type=None, availability=None, city=None):
+    """Active donor counts for the manage-donors screen, in one query.
+
+    ``availability`` is 'available', 'not-available' or None for everyone.
+    Returns ``total``, ``available``, ``universal`` (O-) and ``first_time``
+    counts for donors matching the filters.
+    """
+    city_key = normalise_city(city)
+
+    def compute():
+        query = (db.select(func.count(DonorProfile.id),
+                           func.count(case((DonorProfile.is_available == True, 1))),
+                           func.count(case((DonorProfile.blood_type == 'O-', 1))),
+                           func.count(case((DonorProfile.last_donation_date.is_(None), 1))))
+                 .join(User, User.id == DonorProfile.user_id)
+                 .where(User.is_active == True))
+        if blood_type:
+            query = query.where(DonorProfile.blood_type == blood_type)
+        if availability:
+            query = query.where(DonorProfile.is_available == (availability == 'available'))
+        if city_key:
+            query = query.where(DonorProfile.city_key == city_key)
+        total, available, universal, first_time = db.session.execute(query).one()
+        return {'total': total, 'available': available, 'universal': universal, 'first_time': first_time}
+    return cache.get_or_set(f'stats:donors:{blood_type or ""}:{availability or ""}:{city_key}', compute)
+
+
+def eligibility_breakdown():
+    """Donor counts by blood type and state, split by current eligibility.
+
+    Returns a list of dicts with ``blood_type``, ``state``, ``eligible`` and
+    ``waiting`` keys, sorted by state then blood type.
+    """
+    today = date.today()
+
+    def compute():
+        rows = db.session.execute(
+            db.select(DonorProfile.blood_type,
+                      DonorProfile.state,
+                      func.count(case((DonorProfile.is_eligible, 1))),
+                      func.count(DonorProfile.id))
+            .group_by(DonorProfile.blood_type, DonorProfile.state)
+        ).all()
+        order = {bt: i for i, bt in enumerate(BLOOD_TYPES)}
+        breakdown = [
+            {'blood_type': blood_type, 'state': state, 'eligible': eligible_count,
+             'waiting': total - eligible_count}
+            for blood_type, state, eligible_count, total in rows
+        ]
+        breakdown.sort(key=lambda r: (r['state'], order.get(r['blood_type'], len(order))))
+        return breakdown
+    # Eligibility shifts at midnight even if nothing is written
+    return cache.get_or_set(f'stats:eligibility:{today.isoformat()}', compute)
+
+
+def date_bucket(column, bucket):
+    """SQL expression truncating ``column`` to its bucket start as 'YYYY-MM-DD'.
+
+    Weeks start on Monday on both databases.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(bucket, column), 'YYYY-MM-DD')
+    if bucket == 'week':
+        # Step back six days, then forward to the next Monday (or stay on it)
+        return func.date(column, '-6 days', 'weekday 1')
+    if bucket == 'month':
+        return func.strftime('%Y-%m-01', column)
+    return func.strftime('%Y-%m-%d', column)
+
+
+def bucket_start(day, bucket):
+    """Python counterpart of ``date_bucket`` for a single date"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_labels(start, end, bucket):
+    """Every bucket start from ``start`` to ``end`` inclusive, as ISO strings"""
+    labels = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        labels.append(current.isoformat())
+        if bucket == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if bucket == 'week' else 1)
+    return labels
+
+
+def activity_series(window_days=7, bucket='day'):
+    """Registrations per role, requests, responses and donations per bucket.
+
+    Every series is grouped by the database in a single UNION ALL query, so
+    the cost follows the number of buckets rather than the number of rows.
+    Returns ``{'labels': [...], 'series': {name: [counts...]}}``.
+    """
+    today = date.today()
+    start = bucket_start(today - timedelta(days=window_days - 1), bucket)
+
+    def compute():
+        since = datetime.combine(start, datetime.min.time())
+        registrations = User.created_at
+        requests = BloodRequest.requested_at
+        responses = BloodRequestResponse.response_date
+        donations = Donation.donation_date
+        query = union_all(
+            db.select(User.role, date_bucket(registrations, bucket), func.count(User.id))
+            .where(registrations >= since)
+            .group_by(User.role, date_bucket(registrations, bucket)),
+            db.select(literal('requests'), date_bucket(requests, bucket), func.count(BloodRequest.id))
+            .where(requests >= since)
+            .group_by(date_bucket(requests, bucket)),
+            db.select(literal('responses'), date_bucket(responses, bucket), func.count(BloodRequestResponse.id))
+            .where(responses >= since)
+            .group_by(date_bucket(responses, bucket)),
+            db.select(literal('donations'), date_bucket(donations, bucket), func.count(Donation.id))
+            .where(donations >= start)
+            .group_by(date_bucket(donations, bucket)),
+        )
+        labels = bucket_labels(start, today, bucket)
+        position = {label: i for i, label in enumerate(labels)}
+        series = {name: [0] * len(labels) for name in ACTIVITY_SERIES}
+        for name, label, count in db.session.execute(query):
+            if name in series and label in position:
+                series[name][position[label]] = count
+        return {'labels': labels, 'series': series}
+    return cache.get_or_set(f'stats:activity:{today.isoformat()}:{window_days}:{bucket}', compute)
+
+
+def invalidate(*prefixes):
+    """Drop cached statistics; with no arguments, drop everything"""
+    if not prefixes:
+        cache.clear()
+    for prefix in prefixes:
+        cache.delete_prefix(prefix)
+
+
+def invalidate_tables(*tables):
+    """Drop the statistics computed from these tables (by name)"""
+    for table in tables:
+        invalidate(*INVALIDATES.get(table, ()))
+
+
+def invalidate_tables_on_commit(*tables):
+    """Drop the statistics computed from these tables when the current transaction commits"""
+    db.session.info.setdefault('stats_changed_tables', set()).update(tables)
+
+
+def _collect_changed_tables(session, flush_context, instances):
+    changed = session.info.setdefault('stats_changed_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table in INVALIDATES:
+            changed.add(table)
+
+
+def _invalidate_after_commit(session):
+    invalidate_tables(*session.info.pop('stats_changed_tables', ()))
+
+
+def _discard_after_rollback(session):
+    session.info.pop('stats_changed_tables', None)
+
+
+def init_app(app):
+    """Pick the statistics store, configure its TTL and invalidate on committed model changes"""
+    global cache
+    ttl = app.config.setdefault('STATS_CACHE_TTL', DEFAULT_TTL)
+    url = app.config.setdefault('CACHE_URL', os.environ.get('CACHE_URL'))
+    cache = cache_store.from_url(url, ttl, namespace='blood-donation:')
+    if not event.contains(db.session, 'before_flush', _collect_changed_tables):
+        event.listen(db.session, 'before_flush', _collect_changed_tables)
+        event.listen(db.session, 'after_commit', _invalidate_after_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
@@ -1,7 +1,39 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
-from models import User, DonorProfile, HospitalProfile, OrganizationProfile, Notification    #modification
+from flask import session, redirect, url_for, flash, g
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import User, DonorProfile, HospitalProfile, OrganizationProfile, Notification, BloodRequest, BloodRequestResponse, DONATION_INTERVAL_DAYS    #modification
 from datetime import datetime, timedelta
+from stats import invalidate_tables
+
+def load_identity():
+    """Load the logged-in user and their profile once per request.
+
+    The user and all three profile relationships come back from a single
+    joined query and are kept on ``flask.g``. A user deactivated since they
+    logged in is treated as logged out.
+    """
+    if '_identity_loaded' not in g:
+        g._identity_loaded = True
+        g.current_user = None
+        user_id = session.get('user_id')
+        if user_id is not None:
+            user = db.session.get(User, user_id, options=[
+                joinedload(User.donor_profile),
+                joinedload(User.hospital_profile),
+                joinedload(User.organization_profile)
+            ])
+            if user and user.is_active:
+                g.current_user = user
+            else:
+                session.clear()
+    return g.current_user
+
+
+def clear_identity():
+    """Forget the identity cached for this request so the next lookup reloads it"""
+    g.pop('_identity_loaded', None)
+    g.pop('current_user', None)
 
 
 def login_required(f):
@@ -9,9 +41,9 @@ def login_required(f):
 
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if load_identity() is None:
             flash('Please log in to access this page.', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
 
     return decorated_function
@@ -24,15 +56,15 @@ def role_required(roles):
 
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
+            user = load_identity()
+            if user is None:
                 flash('Please log in to access this page.', 'warning')
-                return redirect(url_for('login'))
+                return redirect(url_for('auth.login'))
 
-            user = User.query.get(session['user_id'])
-            if not user or user.role not in roles:
+            if user.role not in roles:
                 flash('You do not have permission to access this page.',
                       'error')
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
             return f(*args, **kwargs)
 
         return decorated_function
@@ -42,30 +74,37 @@ def role_required(roles):
 
 def get_current_user():
     """Get the current logged-in user"""
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    return load_identity()
 
 
 def get_user_profile(user):
     """Get the profile for the current user based on their role"""
     if user.role == 'donor':
-        return DonorProfile.query.filter_by(user_id=user.id).first()
+        return user.donor_profile
     elif user.role == 'hospital':
-        return HospitalProfile.query.filter_by(user_id=user.id).first()
+        return user.hospital_profile
     elif user.role == 'organization':
-        return OrganizationProfile.query.filter_by(user_id=user.id).first()
+        return user.organization_profile
     return None
 
 
 def can_donate(donor_profile):
     """Check if a donor is eligible to donate (last donation > 56 days ago)"""
+    return donor_profile.is_eligible
+
+
+def days_since_last_donation(donor_profile):
+    """Days since the donor last gave blood, or None if they never have"""
     if not donor_profile.last_donation_date:
-        return True
+        return None
+    return (datetime.now().date() - donor_profile.last_donation_date).days
+
 
-    days_since_last_donation = (datetime.now().date() -
-                                donor_profile.last_donation_date).days
-    return days_since_last_donation >= 56
+def days_until_eligible(donor_profile):
+    """Days left in the donor's wait period, 0 when they can donate now"""
+    if not donor_profile.next_eligible_date:
+        return 0
+    return max(0, (donor_profile.next_eligible_date - datetime.now().date()).days)
 
 
 def create_notification(user_id, title, message, notification_type='system'):
@@ -74,9 +113,66 @@ def create_notification(user_id, title, message, notification_type='system'):
                                 title=title,
                                 message=message,
                                 notification_type=notification_type)
-    from app import db
     db.session.add(notification)
+    db.session.execute(db.update(User)
+                       .where(User.id == user_id)
+                       .values(unread_notifications=User.unread_notifications + 1))
+    db.session.commit()
+
+
+def get_response_counts(request_ids):
+    """Response totals per request, read from the denormalised counters.
+
+    Returns ``{request_id: {'accepted': n, 'declined': n, 'pending': n, 'total': n}}``.
+    """
+    counts = {request_id: {'accepted': 0, 'declined': 0, 'pending': 0, 'total': 0}
+              for request_id in request_ids}
+    if not request_ids:
+        return counts
+    rows = db.session.execute(
+        db.select(BloodRequest.id, BloodRequest.accepted_count, BloodRequest.declined_count)
+        .where(BloodRequest.id.in_(request_ids))).all()
+    for request_id, accepted, declined in rows:
+        counts[request_id].update(accepted=accepted, declined=declined, total=accepted + declined)
+    return counts
+
+
+def record_response(request_id, donor_id, status):
+    """Record a donor's accepted or declined response and bump the request's counter.
+
+    The insert is a single ``INSERT ... ON CONFLICT DO NOTHING`` against the
+    unique (request_id, donor_id) index, so double clicks and retried GETs
+    cannot create a second response. The counter moves in the same
+    transaction. Returns False if the donor had already responded.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    inserted = db.session.execute(
+        insert(BloodRequestResponse)
+        .values(request_id=request_id, donor_id=donor_id, status=status, response_date=datetime.utcnow())
+        .on_conflict_do_nothing()
+    ).rowcount
+    if inserted:
+        counter = 'accepted_count' if status == 'accepted' else 'declined_count'
+        # Core table update: a counter change does not touch anything the cached feeds show
+        table = BloodRequest.__table__
+        db.session.execute(db.update(table).where(table.c.id == request_id)
+                           .values({counter: table.c[counter] + 1}))
     db.session.commit()
+    if inserted:
+        # The upsert skips the flush hooks the stats cache listens to
+        invalidate_tables(BloodRequestResponse.__tablename__)
+    return bool(inserted)
+
+
+def is_transient_db_error(exc):
+    """True if an OperationalError is worth retrying: a busy database or a lost lock race"""
+    # SQLite reports a busy database instead of waiting on a row lock;
+    # PostgreSQL can pick a deadlock victim
+    message = str(exc.orig).lower()
+    return any(word in message for word in ('locked', 'busy', 'deadlock', 'could not serialize'))
 
 
 def get_compatible_blood_types(blood_type):
@@ -0,0 +1,13 @@
+"""Routes, one blueprint per role.
+
+URLs are the same as before the split; endpoints are namespaced by
+blueprint, so templates link with ``url_for('donor.dashboard')``.
+"""
+from . import admin, auth, donor, hospital, main, organization
+
+BLUEPRINTS = (main.bp, auth.bp, donor.bp, hospital.bp, organization.bp, admin.bp)
+
+
+def register_blueprints(app):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
@@ -0,0 +1,188 @@
+"""Admin pages: dashboard, user management, analytics, performance and exports"""
+from datetime import date, datetime, timedelta
+
+from flask import abort, Blueprint, current_app, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy import func
+
+import feeds
+import geo
+import inventory
+import stats
+from exports import EXPORT_FORMATS, EXPORTS, stream_export
+from extensions import db
+from instrumentation import performance_log
+from models import BloodRequest, DonationEvent, User
+from search import (InvalidCursor, page_size, user_page, USER_ROLES, user_search_query, USER_SORTS,
+                    USER_STATUSES)
+from stats import (activity_series, ANALYTICS_BUCKETS, ANALYTICS_WINDOWS,
+                   blood_type_distribution as stats_blood_type_distribution, eligibility_breakdown,
+                   platform_counts, user_totals)
+from utils import clear_identity, role_required
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/admin/dashboard')
+@role_required(['admin'])
+def dashboard():
+    """Admin dashboard"""
+    # Get system statistics
+    stats = platform_counts()
+    five_days_ago = datetime.utcnow() - timedelta(days=5)
+    return render_template('admin/dashboard.html', stats=stats, five_days_ago=five_days_ago)
+
+@bp.route('/admin/manage-users')
+@role_required(['admin'])
+def manage_users():
+    """Manage users, one page at a time with filters applied in SQL"""
+    role = request.args.get('role') if request.args.get('role') in USER_ROLES else None
+    status = request.args.get('status') if request.args.get('status') in USER_STATUSES else None
+    q = request.args.get('q', '').strip()
+    sort = request.args.get('sort') if request.args.get('sort') in USER_SORTS else 'newest'
+    try:
+        users, next_cursor = user_page(user_search_query(role, status, q), sort=sort,
+                                       cursor=request.args.get('cursor'),
+                                       per_page=page_size(request.args.get('per_page', type=int)))
+    except InvalidCursor:
+        abort(400)
+    filters = {'role': role, 'status': status, 'q': q or None, 'sort': sort}
+    return render_template('admin/manage_users.html', users=users, next_cursor=next_cursor,
+                           totals=user_totals(), filters=filters, roles=USER_ROLES, sorts=USER_SORTS)
+
+@bp.route('/admin/users/<int:user_id>.json')
+@role_required(['admin'])
+def user_detail(user_id):
+    """One user's account and profile details, fetched when their detail modal opens"""
+    user = User.query.get_or_404(user_id)
+    detail = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role.title(),
+        'is_active': user.is_active,
+        'created_at': user.created_at.strftime('%B %d, %Y at %I:%M %p'),
+        'days_registered': (datetime.utcnow() - user.created_at).days,
+        'donor': None,
+        'hospital': None,
+        'organization': None
+    }
+    if user.role == 'donor' and user.donor_profile:
+        donor = user.donor_profile
+        detail['donor'] = {
+            'full_name': donor.full_name,
+            'blood_type': donor.blood_type,
+            'phone': donor.phone,
+            'city': donor.city,
+            'state': donor.state,
+            'is_available': donor.is_available,
+            'last_donation_date': donor.last_donation_date.strftime('%m/%d/%Y') if donor.last_donation_date else None
+        }
+    elif user.role == 'hospital' and user.hospital_profile:
+        hospital = user.hospital_profile
+        detail['hospital'] = {
+            'hospital_name': hospital.hospital_name,
+            'license_number': hospital.license_number,
+            'contact_person': hospital.contact_person,
+            'phone': hospital.phone,
+            'city': hospital.city,
+            'state': hospital.state,
+            'blood_requests': db.session.scalar(
+                db.select(func.count(BloodRequest.id)).where(BloodRequest.hospital_id == hospital.id))
+        }
+    elif user.role == 'organization' and user.organization_profile:
+        organization = user.organization_profile
+        detail['organization'] = {
+            'organization_name': organization.organization_name,
+            'registration_number': organization.registration_number,
+            'contact_person': organization.contact_person,
+            'phone': organization.phone,
+            'city': organization.city,
+            'state': organization.state,
+            'events': db.session.scalar(
+                db.select(func.count(DonationEvent.id)).where(DonationEvent.organization_id == organization.id))
+        }
+    detail['profile_missing'] = user.role != 'admin' and not (detail['donor'] or detail['hospital']
+                                                              or detail['organization'])
+    return jsonify(detail)
+
+@bp.route('/admin/toggle-user/<int:user_id>')
+@role_required(['admin'])
+def toggle_user_status(user_id):
+    """Toggle user active status"""
+    user = User.query.get_or_404(user_id)
+    user.is_active = not user.is_active
+    if user.donor_profile:
+        # Matching snapshots pick up changed donors by updated_at
+        user.donor_profile.updated_at = datetime.utcnow()
+    db.session.commit()
+    # An admin may have just deactivated themselves
+    clear_identity()
+    
+    status = 'activated' if user.is_active else 'deactivated'
+    flash(f'User {user.username} has been {status}.', 'success')
+    return redirect(url_for('admin.manage_users'))
+
+@bp.route('/admin/analytics')
+@role_required(['admin'])
+def analytics():
+    window = request.args.get('window', 7, type=int)
+    bucket = request.args.get('bucket', 'day')
+    if window not in ANALYTICS_WINDOWS:
+        window = 7
+    if bucket not in ANALYTICS_BUCKETS:
+        bucket = 'day'
+    activity = activity_series(window, bucket)
+    series = activity['series']
+    return render_template('admin/analytics.html', days=activity['labels'], donor_counts=series['donor'],
+                           hospital_counts=series['hospital'], org_counts=series['organization'],
+                           request_counts=series['requests'], response_counts=series['responses'],
+                           donation_counts=series['donations'], window=window, bucket=bucket,
+                           windows=ANALYTICS_WINDOWS, buckets=ANALYTICS_BUCKETS)
+
+@bp.route('/admin/blood-type-distribution')
+@role_required(['admin'])
+def blood_type_distribution():
+    counts = stats_blood_type_distribution()
+    return render_template('admin/blood_type_distribution.html', blood_types=list(counts.keys()), counts=list(counts.values()),
+                           breakdown=eligibility_breakdown())
+
+@bp.route('/admin/performance')
+@role_required(['admin'])
+def performance():
+    """Slowest endpoints and costliest SQL statements seen by this worker process"""
+    caches = [('Dashboard feeds', feeds.cache), ('Admin statistics', stats.cache),
+              ('Blood stock', inventory.stock_cache), ('PIN directory', geo.directory_cache)]
+    return render_template('admin/performance.html', endpoints=performance_log.endpoints(),
+                           statements=performance_log.statements(), n_plus_one=performance_log.n_plus_one(),
+                           caches=[(name, store.counters()) for name, store in caches],
+                           enabled=current_app.config.get('SQL_INSTRUMENTATION'))
+
+@bp.route('/admin/donors')
+@role_required(['admin'])
+def list_donors():
+    donors = User.query.filter_by(role='donor').order_by(User.created_at.desc()).all()
+    return render_template('admin/list_donors.html', donors=donors)
+
+@bp.route('/admin/hospitals')
+@role_required(['admin'])
+def list_hospitals():
+    hospitals = User.query.filter_by(role='hospital').order_by(User.created_at.desc()).all()
+    return render_template('admin/list_hospitals.html', hospitals=hospitals)
+
+@bp.route('/admin/organizations')
+@role_required(['admin'])
+def list_organizations():
+    organizations = User.query.filter_by(role='organization').order_by(User.created_at.desc()).all()
+    return render_template('admin/list_organizations.html', organizations=organizations)
+
+@bp.route('/admin/<kind>/export.<fmt>')
+@role_required(['admin'])
+def export_users(kind, fmt):
+    """Stream every donor, hospital or organization as CSV or NDJSON"""
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    filename = f'{kind}-{date.today().isoformat()}.{fmt}'
+    return current_app.response_class(stream_export(db.engine, kind, fmt), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
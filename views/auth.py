@@ -0,0 +1,91 @@
+"""Login, registration and logout"""
+from flask import Blueprint, flash, redirect, render_template, session, url_for
+from sqlalchemy import or_
+
+from extensions import db
+from forms import LoginForm, RegistrationForm
+from models import User
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    """User login"""
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        if user and user.check_password(form.password.data) and user.is_active:
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
+            flash(f'Welcome back, {user.username}!', 'success')
+            return redirect(url_for('main.dashboard'))
+        flash('Invalid username or password.', 'error')
+    return render_template('auth/login.html', form=form)
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    """User registration"""
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        # Check if username or email already exists
+        existing_user = User.query.filter(
+            or_(User.username == form.username.data, User.email == form.email.data)
+        ).first()
+        if existing_user:
+            flash('Username or email already exists.', 'error')
+            return render_template('auth/register.html', form=form)
+        
+        # Create new user
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            role=form.role.data
+        )
+        user.set_password(form.password.data)
+        db.session.add(user)
+        db.session.commit()
+        
+        flash('Registration successful! Please complete your profile.', 'success')
+        session['user_id'] = user.id
+        session['username'] = user.username
+        session['role'] = user.role
+        
+        # Redirect to appropriate profile setup
+        if user.role == 'donor':
+            return redirect(url_for('donor.profile'))
+        elif user.role == 'hospital':
+            return redirect(url_for('hospital.profile'))
+        elif user.role == 'organization':
+            return redirect(url_for('organization.profile'))
+        
+    return render_template('auth/register.html', form=form)
+
+@bp.route('/logout')
+def logout():
+    """User logout"""
+    session.clear()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('main.index'))
+
+# Create admin user route (for initial setup)
+@bp.route('/create-admin')
+def create_admin():
+    """Create initial admin user - should be removed in production"""
+    existing_admin = User.query.filter_by(role='admin').first()
+    if existing_admin:
+        flash('Admin user already exists.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    admin = User(
+        username='admin',
+        email='admin@bloodbank.com',
+        role='admin'
+    )
+    admin.set_password('admin123')
+    db.session.add(admin)
+    db.session.commit()
+    
+    flash('Admin user created successfully! Username: admin, Password: admin123', 'success')
+    return redirect(url_for('auth.login'))
@@ -0,0 +1,175 @@
+"""Donor pages: dashboard, profile, donation event sign-ups and blood request responses"""
+from datetime import date
+
+from flask import Blueprint, flash, redirect, render_template, url_for
+
+import signups
+from extensions import db
+from feeds import request_feed, upcoming_events
+from forms import DonorProfileForm, EventRegistrationForm
+from models import BloodRequest, Donation, DonationEvent, DonorProfile
+from utils import (create_notification, get_compatible_blood_types, get_current_user, get_user_profile,
+                   record_response, role_required)
+
+bp = Blueprint('donor', __name__)
+
+
+@bp.route('/donor/dashboard')
+@role_required(['donor'])
+def dashboard():
+    """Donor dashboard"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    
+    # Get recent donations
+    recent_donations = []
+    if profile:
+        recent_donations = Donation.query.filter_by(donor_id=profile.id).order_by(Donation.donation_date.desc()).limit(5).all()
+    
+    # Blood requests for compatible blood types, shared by every donor of that type
+    blood_requests = []
+    if profile:
+        blood_requests = request_feed(get_compatible_blood_types(profile.blood_type))
+    
+    return render_template('donor/dashboard.html', 
+                         profile=profile, 
+                         recent_donations=recent_donations,
+                         blood_requests=blood_requests,
+                         upcoming_events=upcoming_events())
+
+@bp.route('/donor/profile', methods=['GET', 'POST'])
+@role_required(['donor'])
+def profile():
+    """Donor profile management"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    form = DonorProfileForm()
+    
+    if form.validate_on_submit():
+        if profile:
+            # Update existing profile
+            profile.full_name = form.full_name.data
+            profile.blood_type = form.blood_type.data
+            profile.phone = form.phone.data
+            profile.address = form.address.data
+            profile.city = form.city.data
+            profile.state = form.state.data
+            profile.zip_code = form.zip_code.data
+            profile.date_of_birth = form.date_of_birth.data
+            profile.medical_conditions = form.medical_conditions.data
+        else:
+            # Create new profile
+            profile = DonorProfile(
+                user_id=user.id,
+                full_name=form.full_name.data,
+                blood_type=form.blood_type.data,
+                phone=form.phone.data,
+                address=form.address.data,
+                city=form.city.data,
+                state=form.state.data,
+                zip_code=form.zip_code.data,
+                date_of_birth=form.date_of_birth.data,
+                medical_conditions=form.medical_conditions.data
+            )
+            db.session.add(profile)
+        
+        db.session.commit()
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('donor.dashboard'))
+    
+    # Populate form with existing data
+    if profile:
+        form.full_name.data = profile.full_name
+        form.blood_type.data = profile.blood_type
+        form.phone.data = profile.phone
+        form.address.data = profile.address
+        form.city.data = profile.city
+        form.state.data = profile.state
+        form.zip_code.data = profile.zip_code
+        form.date_of_birth.data = profile.date_of_birth
+        form.medical_conditions.data = profile.medical_conditions
+    
+    return render_template('donor/profile.html', form=form, profile=profile)
+
+@bp.route('/donor/events')
+@role_required(['donor'])
+def events():
+    """Upcoming donation events with seats left and the donor's sign-ups"""
+    profile = get_user_profile(get_current_user())
+    events = (DonationEvent.query
+              .filter(DonationEvent.event_date >= date.today(), DonationEvent.status == 'upcoming')
+              .order_by(DonationEvent.event_date.asc(), DonationEvent.id.asc()).limit(50).all())
+    event_ids = [event.id for event in events]
+    statuses = signups.donor_statuses(profile.id, event_ids) if profile else {}
+    return render_template('donor/events.html', profile=profile, events=events, statuses=statuses,
+                           waitlists=signups.waitlist_counts(event_ids), form=EventRegistrationForm())
+
+@bp.route('/donor/events/<int:event_id>/register', methods=['POST'])
+@role_required(['donor'])
+def register_for_event(event_id):
+    """Take a seat at an event, or a waitlist place when it is full"""
+    profile = get_user_profile(get_current_user())
+    if not profile:
+        flash('Please complete your profile first.', 'warning')
+        return redirect(url_for('donor.profile'))
+    event = DonationEvent.query.get_or_404(event_id)
+    if EventRegistrationForm().validate_on_submit():
+        try:
+            status = signups.register(event, profile.id)
+        except signups.AlreadyRegistered as exc:
+            flash(f'You are already {exc.status} for {event.event_name}.', 'warning')
+        except signups.RegistrationError as exc:
+            flash(str(exc), 'error')
+        else:
+            if status == 'registered':
+                flash(f'You are registered for {event.event_name}.', 'success')
+            else:
+                flash(f'{event.event_name} is full; you have been added to the waitlist.', 'info')
+    return redirect(url_for('donor.events'))
+
+@bp.route('/donor/events/<int:event_id>/cancel', methods=['POST'])
+@role_required(['donor'])
+def cancel_event_registration(event_id):
+    """Give up a seat or waitlist place; a freed seat goes to the first waitlisted donor"""
+    profile = get_user_profile(get_current_user())
+    event = DonationEvent.query.get_or_404(event_id)
+    if profile and EventRegistrationForm().validate_on_submit():
+        try:
+            promoted = signups.cancel(event.id, profile.id)
+        except signups.NotRegistered:
+            flash(f'You are not signed up for {event.event_name}.', 'warning')
+        except signups.RegistrationError as exc:
+            flash(str(exc), 'error')
+        else:
+            if promoted is not None:
+                create_notification(db.session.get(DonorProfile, promoted).user_id,
+                                    f'You have a seat at {event.event_name}',
+                                    f'A seat opened up at {event.event_name} on '
+                                    f'{event.event_date.strftime("%B %d, %Y")}; you are now registered.',
+                                    'event')
+            flash(f'Your registration for {event.event_name} has been cancelled.', 'success')
+    return redirect(url_for('donor.events'))
+
+@bp.route('/respond-to-request/<int:request_id>/<action>')
+@role_required(['donor'])
+def respond_to_request(request_id, action):
+    """Respond to blood request"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    
+    if not profile:
+        flash('Please complete your profile first.', 'warning')
+        return redirect(url_for('donor.profile'))
+    
+    blood_request = BloodRequest.query.get_or_404(request_id)
+    
+    if action in ['accept', 'decline']:
+        status = 'accepted' if action == 'accept' else 'declined'
+        if not record_response(blood_request.id, profile.id, status):
+            flash('You have already responded to this request.', 'warning')
+            return redirect(url_for('donor.dashboard'))
+        
+        message = 'accepted' if action == 'accept' else 'declined'
+        flash(f'You have {message} the blood request.', 'success')
+    
+    return redirect(url_for('donor.dashboard'))
@@ -0,0 +1,141 @@
+"""Hospital pages: dashboard, profile, blood requests and donor matches"""
+from datetime import datetime
+
+from flask import abort, Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy.orm import selectinload
+
+from extensions import db
+from forms import BloodRequestForm, HospitalProfileForm
+from matching import rank_donors
+from models import BloodRequest, BloodRequestResponse, HospitalProfile
+from notifications import enqueue_blood_request_fanout, notify_workers
+from utils import get_current_user, get_user_profile, role_required
+
+bp = Blueprint('hospital', __name__)
+
+
+@bp.route('/hospital/dashboard')
+@role_required(['hospital'])
+def dashboard():
+    """Hospital dashboard"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    
+    # Get hospital's blood requests, with responses and their donors loaded up front for the detail modals;
+    # the totals come from each request's counters
+    blood_requests = []
+    if profile:
+        blood_requests = BloodRequest.query.options(
+            selectinload(BloodRequest.responses).joinedload(BloodRequestResponse.donor)
+        ).filter_by(hospital_id=profile.id).order_by(BloodRequest.requested_at.desc()).limit(10).all()
+    
+    return render_template('hospital/dashboard.html', profile=profile, blood_requests=blood_requests)
+
+@bp.route('/hospital/profile', methods=['GET', 'POST'])
+@role_required(['hospital'])
+def profile():
+    """Hospital profile management"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    form = HospitalProfileForm()
+    
+    if form.validate_on_submit():
+        if profile:
+            # Update existing profile
+            profile.hospital_name = form.hospital_name.data
+            profile.license_number = form.license_number.data
+            profile.contact_person = form.contact_person.data
+            profile.phone = form.phone.data
+            profile.address = form.address.data
+            profile.city = form.city.data
+            profile.state = form.state.data
+            profile.zip_code = form.zip_code.data
+        else:
+            # Create new profile
+            profile = HospitalProfile(
+                user_id=user.id,
+                hospital_name=form.hospital_name.data,
+                license_number=form.license_number.data,
+                contact_person=form.contact_person.data,
+                phone=form.phone.data,
+                address=form.address.data,
+                city=form.city.data,
+                state=form.state.data,
+                zip_code=form.zip_code.data
+            )
+            db.session.add(profile)
+        
+        db.session.commit()
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('hospital.dashboard'))
+    
+    # Populate form with existing data
+    if profile:
+        form.hospital_name.data = profile.hospital_name
+        form.license_number.data = profile.license_number
+        form.contact_person.data = profile.contact_person
+        form.phone.data = profile.phone
+        form.address.data = profile.address
+        form.city.data = profile.city
+        form.state.data = profile.state
+        form.zip_code.data = profile.zip_code
+    
+    return render_template('hospital/request_blood.html', form=form, profile=profile, is_profile=True)
+
+@bp.route('/hospital/request-blood', methods=['GET', 'POST'])
+@role_required(['hospital'])
+def request_blood():
+    """Create blood request"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    
+    if not profile:
+        flash('Please complete your hospital profile first.', 'warning')
+        return redirect(url_for('hospital.profile'))
+    
+    form = BloodRequestForm()
+    if form.validate_on_submit():
+        blood_request = BloodRequest(
+            hospital_id=profile.id,
+            blood_type=form.blood_type.data,
+            units_needed=form.units_needed.data,
+            urgency_level=form.urgency_level.data,
+            description=form.description.data,
+            needed_by=datetime.combine(form.needed_by.data, datetime.min.time())
+        )
+        db.session.add(blood_request)
+        # Queue donor notifications in the same transaction; workers fan them out
+        enqueue_blood_request_fanout(blood_request, profile.hospital_name)
+        db.session.commit()
+        notify_workers()
+        
+        flash('Blood request created successfully!', 'success')
+        return redirect(url_for('hospital.dashboard'))
+    
+    return render_template('hospital/request_blood.html', form=form, profile=profile)
+
+@bp.route('/hospital/requests/<int:request_id>/matches')
+@role_required(['hospital'])
+def request_matches(request_id):
+    """Best-ranked candidate donors for one of this hospital's requests"""
+    profile = get_user_profile(get_current_user())
+    blood_request = BloodRequest.query.get_or_404(request_id)
+    if not profile or blood_request.hospital_id != profile.id:
+        abort(404)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    radius_km = request.args.get('radius_km', type=float)
+    return jsonify({
+        'request_id': blood_request.id,
+        'donors': [{
+            'id': donor.id,
+            'full_name': donor.full_name,
+            'blood_type': donor.blood_type,
+            'city': donor.city,
+            'state': donor.state,
+            'zip_code': donor.zip_code,
+            'eligible_now': eligible_now,
+            'distance_km': distance_km,
+            'score': round(score, 3)
+        } for donor, score, eligible_now, distance_km in rank_donors(blood_request, limit=limit,
+                                                                      radius_km=radius_km)]
+    })
@@ -0,0 +1,222 @@
+"""Pages shared by every role: home, dashboard redirect, donor search,
+notifications, live updates and downloads.
+"""
+from datetime import datetime, timedelta
+
+from flask import (abort, Blueprint, current_app, flash, jsonify, redirect, render_template, request,
+                   send_file, url_for)
+
+from forms import NotificationsReadForm, SearchForm
+from geo import UnknownPinCode
+from inventory import stock_by_type
+from models import DonorProfile, User
+from notifications import inbox_page, mark_read
+from push import parse_cursor, poll_events, PushUnavailable, stream_events
+from search import (donor_search_query, InvalidCursor, keyset_page, page_size, proximity_page, ranked_search,
+                    RELEVANCE)
+from utils import (calculate_age, can_donate, days_since_last_donation, days_until_eligible, get_current_user,
+                   get_user_profile, login_required, role_required)
+
+bp = Blueprint('main', __name__)
+
+
+@bp.route('/')
+def index():
+    """Home page"""
+    return render_template('index.html')
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    """Role-based dashboard"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    five_days_ago = datetime.utcnow() - timedelta(days=5)
+    if user.role == 'admin':
+        return redirect(url_for('admin.dashboard'))
+    elif user.role == 'donor':
+        return redirect(url_for('donor.dashboard'))
+    elif user.role == 'hospital':
+        return redirect(url_for('hospital.dashboard'))
+    elif user.role == 'organization':
+        return redirect(url_for('organization.dashboard'))
+    
+    return render_template(five_days_ago = datetime.utcnow() - timedelta(days=5))
+
+# Search routes
+def _donor_search_page():
+    """Run the donor search described by the request, one keyset page at a time"""
+    form = SearchForm(request.args if request.method == 'GET' else None)
+    submitted = request.method == 'POST' or bool(request.args)
+    donors, next_cursor = [], None
+    if submitted and form.validate():
+        near_pin = form.near_pin.data
+        query = donor_search_query(
+            blood_type=form.blood_type.data,
+            city=form.city.data,
+            # The radius, not the state, bounds a search near a PIN code
+            state=None if near_pin else form.state.data,
+            available_only=form.available_only.data,
+            rare_only=form.rare_only.data,
+            eligible_only=form.eligible_only.data,
+            text=form.q.data
+        )
+        # Without two or more search words there is little to rank by
+        sort = form.sort.data
+        if sort == RELEVANCE and not ranked_search(form.q.data):
+            sort = 'name'
+        per_page = page_size(request.args.get('per_page', type=int))
+        try:
+            if near_pin:
+                donors, next_cursor = proximity_page(query, near_pin, form.radius_km.data,
+                                                     cursor=request.args.get('cursor'), per_page=per_page)
+            else:
+                donors, next_cursor = keyset_page(query, sort=sort, cursor=request.args.get('cursor'),
+                                                  per_page=per_page)
+        except InvalidCursor:
+            abort(400)
+        except UnknownPinCode:
+            form.near_pin.errors.append('No location is known for this PIN code.')
+    return form, donors, next_cursor
+
+@bp.route('/search/donors', methods=['GET', 'POST'])
+@login_required
+def search_donors():
+    """Search for donors"""
+    form, donors, next_cursor = _donor_search_page()
+    return render_template('search/donors.html', form=form, donors=donors, next_cursor=next_cursor)
+
+@bp.route('/search/donors.json')
+@login_required
+def search_donors_json():
+    """Next page of donor search results for infinite scroll"""
+    form, donors, next_cursor = _donor_search_page()
+    return jsonify({
+        'donors': [{
+            'id': donor.id,
+            'full_name': donor.full_name,
+            'blood_type': donor.blood_type,
+            'city': donor.city,
+            'state': donor.state,
+            'is_available': donor.is_available,
+            'can_donate': can_donate(donor),
+            'distance_km': getattr(donor, 'distance_km', None)
+        } for donor in donors],
+        'html': render_template('search/_donor_cards.html', donors=donors),
+        'next_cursor': next_cursor
+    })
+
+@bp.route('/donors/<int:donor_id>.json')
+@login_required
+def donor_detail(donor_id):
+    """One donor's details, fetched when their detail modal opens"""
+    donor = DonorProfile.query.join(User).filter(DonorProfile.id == donor_id, User.is_active == True).first_or_404()
+    return jsonify({
+        'id': donor.id,
+        'full_name': donor.full_name,
+        'blood_type': donor.blood_type,
+        'date_of_birth': donor.date_of_birth.strftime('%B %d, %Y'),
+        'age': calculate_age(donor.date_of_birth),
+        'phone': donor.phone,
+        'address': donor.address,
+        'city': donor.city,
+        'state': donor.state,
+        'zip_code': donor.zip_code,
+        'is_available': donor.is_available,
+        'last_donation_date': donor.last_donation_date.strftime('%B %d, %Y') if donor.last_donation_date else None,
+        'days_since_last_donation': days_since_last_donation(donor),
+        'medical_conditions': donor.medical_conditions,
+        'can_donate': can_donate(donor),
+        'days_until_eligible': days_until_eligible(donor)
+    })
+
+# Notification inbox routes
+@bp.route('/notifications')
+@login_required
+def notifications_inbox():
+    """List the current user's notifications, newest first"""
+    user = get_current_user()
+    unread_only = request.args.get('filter') == 'unread'
+    try:
+        notifications, next_cursor = inbox_page(user.id, request.args.get('cursor'), unread_only)
+    except InvalidCursor:
+        abort(400)
+
+    # "Mark all read" only covers notifications up to the newest one shown on the first page
+    up_to = request.args.get('up_to', type=int)
+    if up_to is None and notifications:
+        up_to = notifications[0].id
+    form = NotificationsReadForm(up_to=up_to)
+    return render_template('notifications/inbox.html', notifications=notifications, next_cursor=next_cursor,
+                           unread_only=unread_only, up_to=up_to, form=form)
+
+@bp.route('/notifications/read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Mark selected, or all seen, notifications as read"""
+    user = get_current_user()
+    form = NotificationsReadForm()
+    if form.validate_on_submit():
+        if 'mark_all' in request.form:
+            up_to = int(form.up_to.data) if (form.up_to.data or '').isdigit() else None
+            marked = mark_read(user.id, up_to=up_to) if up_to else 0
+        else:
+            marked = mark_read(user.id, notification_ids=request.form.getlist('notification_ids', type=int))
+        if marked:
+            flash(f'Marked {marked} notification{"s" if marked != 1 else ""} as read.', 'success')
+    return redirect(url_for('main.notifications_inbox', filter=request.args.get('filter')))
+
+# Blood stock routes
+@bp.route('/inventory/stock')
+@role_required(['hospital', 'admin'])
+def inventory_stock():
+    """Free and reserved units per blood type across all locations"""
+    return jsonify(stock_by_type())
+
+# Server push routes
+def _push_unavailable():
+    """503 telling the client to retry later; the push broker cannot read the database"""
+    response = jsonify({'error': 'Live updates are unavailable'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+@bp.route('/events/stream')
+@login_required
+def event_stream():
+    """Server-Sent Events feed of the user's notifications and request responses"""
+    user = get_current_user()
+    cursor = parse_cursor(request.headers.get('Last-Event-ID') or request.args.get('cursor'))
+    try:
+        events = stream_events(user, cursor)
+    except PushUnavailable:
+        return _push_unavailable()
+    return current_app.response_class(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/events/poll')
+@login_required
+def event_poll():
+    """Long-poll fallback for clients that cannot keep an event stream open"""
+    user = get_current_user()
+    try:
+        return jsonify(poll_events(user, parse_cursor(request.args.get('cursor'))))
+    except PushUnavailable:
+        return _push_unavailable()
+
+
+@bp.route('/download-source')
+def download_source():
+    """Download the complete source code"""
+    return send_file('download.html')
+
+@bp.route('/blood_donation_platform_source.zip')
+def download_zip():
+    """Serve the ZIP file for download"""
+    try:
+        return send_file('blood_donation_platform_source.zip', as_attachment=True, download_name='blood_donation_platform_source.zip')
+    except FileNotFoundError:
+        flash('Download file not found', 'error')
+        return redirect(url_for('main.index'))
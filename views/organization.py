@@ -0,0 +1,151 @@
+"""Organization pages: dashboard, profile, donor list and donation events"""
+from datetime import date
+
+from flask import abort, Blueprint, flash, redirect, render_template, request, url_for
+
+import signups
+from extensions import db
+from forms import DonationEventForm, OrganizationProfileForm
+from models import DonationEvent, DonorProfile, OrganizationProfile
+from search import donor_search_query, InvalidCursor, keyset_page, page_size
+from stats import BLOOD_TYPES, donor_totals
+from utils import get_current_user, get_user_profile, role_required
+
+bp = Blueprint('organization', __name__)
+
+
+@bp.route('/organization/dashboard')
+@role_required(['organization'])
+def dashboard():
+    """Organization dashboard"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    
+    # Get organization's events
+    events = []
+    if profile:
+        events = DonationEvent.query.filter_by(organization_id=profile.id).order_by(DonationEvent.event_date.desc()).limit(10).all()
+    
+    return render_template('organization/dashboard.html', profile=profile, events=events)
+
+@bp.route('/organization/profile', methods=['GET', 'POST'])
+@role_required(['organization'])
+def profile():
+    """Organization profile management"""
+    user = get_current_user()
+    profile = get_user_profile(user)
+    form = OrganizationProfileForm()
+    
+    if form.validate_on_submit():
+        if profile:
+            # Update existing profile
+            profile.organization_name = form.organization_name.data
+            profile.registration_number = form.registration_number.data
+            profile.contact_person = form.contact_person.data
+            profile.phone = form.phone.data
+            profile.address = form.address.data
+            profile.city = form.city.data
+            profile.state = form.state.data
+            profile.zip_code = form.zip_code.data
+        else:
+            # Create new profile
+            profile = OrganizationProfile(
+                user_id=user.id,
+                organization_name=form.organization_name.data,
+                registration_number=form.registration_number.data,
+                contact_person=form.contact_person.data,
+                phone=form.phone.data,
+                address=form.address.data,
+                city=form.city.data,
+                state=form.state.data,
+                zip_code=form.zip_code.data
+            )
+            db.session.add(profile)
+        
+        db.session.commit()
+        flash('Profile updated successfully!', 'success')
+        return redirect(url_for('organization.dashboard'))
+    
+    # Populate form with existing data
+    if profile:
+        form.organization_name.data = profile.organization_name
+        form.registration_number.data = profile.registration_number
+        form.contact_person.data = profile.contact_person
+        form.phone.data = profile.phone
+        form.address.data = profile.address
+        form.city.data = profile.city
+        form.state.data = profile.state
+        form.zip_code.data = profile.zip_code
+    
+    return render_template('organization/manage_donors.html', form=form, profile=profile, is_profile=True)
+
+@bp.route('/organization/manage-donors')
+@role_required(['organization'])
+def manage_donors():
+    """Manage donors, one page at a time with filters applied in SQL"""
+    blood_type = request.args.get('blood_type') if request.args.get('blood_type') in BLOOD_TYPES else None
+    availability = request.args.get('availability')
+    if availability not in ('available', 'not-available'):
+        availability = None
+    city = request.args.get('city', '').strip()
+
+    query = donor_search_query(blood_type=blood_type, city=city, available_only=availability == 'available')
+    if availability == 'not-available':
+        query = query.filter(DonorProfile.is_available == False)
+    try:
+        donors, next_cursor = keyset_page(query, sort='name', cursor=request.args.get('cursor'),
+                                          per_page=page_size(request.args.get('per_page', type=int)))
+    except InvalidCursor:
+        abort(400)
+    filters = {'blood_type': blood_type, 'availability': availability, 'city': city or None}
+    return render_template('organization/manage_donors.html', donors=donors, next_cursor=next_cursor,
+                           totals=donor_totals(blood_type, availability, city), filters=filters,
+                           blood_types=BLOOD_TYPES)
+
+@bp.route('/organization/events/new', methods=['GET', 'POST'])
+@role_required(['organization'])
+def create_event():
+    """Create a donation event"""
+    profile = get_user_profile(get_current_user())
+    if not profile:
+        flash('Please complete your organization profile first.', 'warning')
+        return redirect(url_for('organization.profile'))
+
+    form = DonationEventForm()
+    if form.validate_on_submit():
+        if form.event_date.data < date.today():
+            flash('The event date cannot be in the past.', 'error')
+        elif form.end_time.data <= form.start_time.data:
+            flash('The event must end after it starts.', 'error')
+        else:
+            event = DonationEvent(
+                organization_id=profile.id,
+                event_name=form.event_name.data,
+                description=form.description.data,
+                event_date=form.event_date.data,
+                start_time=form.start_time.data,
+                end_time=form.end_time.data,
+                location=form.location.data,
+                address=form.address.data,
+                city=form.city.data,
+                state=form.state.data,
+                max_participants=form.max_participants.data
+            )
+            db.session.add(event)
+            db.session.commit()
+            flash('Donation event created successfully!', 'success')
+            return redirect(url_for('organization.event', event_id=event.id))
+
+    return render_template('organization/event_form.html', form=form, profile=profile)
+
+@bp.route('/organization/events/<int:event_id>')
+@role_required(['organization'])
+def event(event_id):
+    """One of this organization's events with its registered donors and waitlist"""
+    profile = get_user_profile(get_current_user())
+    event = DonationEvent.query.get_or_404(event_id)
+    if not profile or event.organization_id != profile.id:
+        abort(404)
+    registered, waitlisted = signups.roster(event.id)
+    return render_template('organization/event_detail.html', profile=profile, event=event,
+                           registered=registered, waitlisted=waitlisted)